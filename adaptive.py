@@ -0,0 +1,125 @@
+"""
+Adaptive Module
+Điều khiển độ trễ: đo thời gian xử lý mỗi frame và tự điều chỉnh skip_frames / input size của YOLO
+"""
+
+
+class LatencyController:
+    """
+    Giữ thời gian xử lý trong ngân sách độ trễ (latency budget)
+
+    Thời gian xử lý trung bình (EMA) được so với ngân sách của (skip + 1)
+    frame. Quá tải -> giảm input size của YOLO trước, hết mức thì tăng số
+    frame bỏ qua. Dư tải -> làm ngược lại (giảm skip trước, rồi tăng lại
+    input size). Sau mỗi lần thay đổi chờ cooldown frame để đo lại.
+    """
+
+    def __init__(self, budget_ms, skip_frames=0, max_skip_frames=4, imgsz=640, min_imgsz=640,
+                 adaptive=True, smoothing=0.2, cooldown=15, low_water=0.6):
+        """
+        Args:
+            budget_ms: Thời gian cho phép cho mỗi frame camera (ms)
+            skip_frames: Số frame bỏ qua cố định (mức thấp nhất khi điều chỉnh)
+            max_skip_frames: Số frame bỏ qua tối đa
+            imgsz: Input size YOLO mặc định (mức cao nhất)
+            min_imgsz: Input size nhỏ nhất (bằng imgsz = không đổi input size)
+            adaptive: False -> chỉ dùng skip_frames cố định
+            smoothing: Hệ số EMA của thời gian xử lý
+            cooldown: Số frame đo lại sau mỗi lần điều chỉnh
+            low_water: Tải dưới mức này (so với ngân sách) thì nới lỏng
+        """
+        self.budget_ms = budget_ms
+        self.base_skip = skip_frames
+        self.max_skip = max(skip_frames, max_skip_frames)
+        self.adaptive = adaptive
+        self.smoothing = smoothing
+        self.cooldown = cooldown
+        self.low_water = low_water
+
+        # Các mức input size (bội số của 32, giảm dần mỗi bước 1/4)
+        self.imgsz_levels = [imgsz]
+        while self.imgsz_levels[-1] > min_imgsz:
+            next_size = max(min_imgsz, int(self.imgsz_levels[-1] * 0.75) // 32 * 32)
+            if next_size >= self.imgsz_levels[-1]:
+                break
+            self.imgsz_levels.append(next_size)
+
+        self.skip = skip_frames
+        self.level = 0
+        self.avg_ms = None
+        self.frames_since_change = 0
+        self.frame_counters = {}  # camera_id -> số frame đã nhận
+
+        self.stats = {'processed': 0, 'skipped': 0, 'adjustments': 0}
+
+    @property
+    def imgsz(self):
+        """Input size YOLO hiện tại"""
+        return self.imgsz_levels[self.level]
+
+    def should_process(self, key=None):
+        """
+        Frame tiếp theo (của camera key) có cần xử lý không?
+
+        Xử lý 1 frame, bỏ qua `skip` frame tiếp theo.
+        """
+        count = self.frame_counters.get(key, 0)
+        self.frame_counters[key] = count + 1
+        if count % (self.skip + 1) == 0:
+            self.stats['processed'] += 1
+            return True
+        self.stats['skipped'] += 1
+        return False
+
+    def record(self, elapsed_ms):
+        """
+        Ghi nhận thời gian xử lý một frame và điều chỉnh nếu cần
+
+        Args:
+            elapsed_ms: Thời gian xử lý (ms) của một frame
+        """
+        if self.avg_ms is None:
+            self.avg_ms = elapsed_ms
+        else:
+            self.avg_ms += self.smoothing * (elapsed_ms - self.avg_ms)
+        self.frames_since_change += 1
+
+        if not self.adaptive or self.budget_ms <= 0 or self.frames_since_change < self.cooldown:
+            return
+
+        load = self.avg_ms / (self.budget_ms * (self.skip + 1))
+        if load > 1.0:
+            # Quá tải: giảm input size, rồi mới bỏ qua thêm frame
+            if self.level < len(self.imgsz_levels) - 1:
+                self.level += 1
+            elif self.skip < self.max_skip:
+                self.skip += 1
+            else:
+                return
+        elif load < self.low_water:
+            # Dư tải: bớt bỏ qua frame (nếu vẫn trong ngân sách), rồi tăng input size
+            if self.skip > self.base_skip and self.avg_ms < self.budget_ms * self.skip * 0.9:
+                self.skip -= 1
+            elif self.level > 0:
+                self.level -= 1
+            else:
+                return
+        else:
+            return
+
+        print(f"⚖️  Latency {self.avg_ms:.0f}ms / ngân sách {self.budget_ms:.0f}ms "
+              f"-> imgsz={self.imgsz}, skip_frames={self.skip}")
+        self.stats['adjustments'] += 1
+        self.avg_ms = None
+        self.frames_since_change = 0
+
+    def get_stats(self):
+        """Trạng thái hiện tại của controller"""
+        stats = dict(self.stats)
+        stats.update({
+            'avg_ms': round(self.avg_ms, 1) if self.avg_ms is not None else None,
+            'budget_ms': round(self.budget_ms, 1),
+            'imgsz': self.imgsz,
+            'skip_frames': self.skip
+        })
+        return stats
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark tìm vị trí biển số trong ảnh xe (LicensePlateDetector)
+So sánh cách cũ (bilateral + CLAHE + Canny + RETR_TREE trên ảnh gốc) với
+localize_plates ở chế độ "contour" (ảnh thu nhỏ) và "fast" (blackhat, contour ngoài)
+
+Sử dụng: python benchmark_plate_localization.py [ảnh_xe.jpg ...] [--repeat 50]
+Không có ảnh: dùng ảnh xe tổng hợp ở các độ phân giải 4K / 1080p / 720p
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+import yaml
+
+from license_plate import LicensePlateDetector
+
+
+def synthetic_vehicle(width, height, seed=0):
+    """Ảnh xe tổng hợp có một biển số (để chạy benchmark khi không có ảnh thật)"""
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width, 3), 90, np.uint8)
+    img = cv2.add(img, rng.integers(0, 30, (height, width, 3), dtype=np.uint8))
+    cv2.rectangle(img, (int(width * 0.2), int(height * 0.2)), (int(width * 0.8), int(height * 0.9)),
+                  (60, 60, 140), max(2, width // 200))
+
+    x, y = int(width * 0.4), int(height * 0.7)
+    plate_w, plate_h = int(width * 0.22), int(width * 0.05)
+    cv2.rectangle(img, (x, y), (x + plate_w, y + plate_h), (235, 235, 235), -1)
+    cv2.rectangle(img, (x, y), (x + plate_w, y + plate_h), (20, 20, 20), max(1, plate_h // 25))
+    cv2.putText(img, '29A-12345', (x + int(plate_w * 0.05), y + int(plate_h * 0.78)),
+                cv2.FONT_HERSHEY_SIMPLEX, plate_h / 40.0, (20, 20, 20), max(2, plate_h // 15))
+    return img
+
+
+def legacy_localize(detector, vehicle_img):
+    """Cách cũ: lọc + tìm contour trên ảnh xe ở độ phân giải gốc"""
+    _, edges = detector.preprocess_plate(vehicle_img)
+    return [bbox for _, bbox in detector._plate_contours(edges)]
+
+
+def time_method(func, img, repeat):
+    """Thời gian trung bình (ms) và số vùng biển số tìm được"""
+    result = func(img)  # Warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(img)
+    return (time.perf_counter() - start) / repeat * 1000, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark tìm vị trí biển số trong ảnh xe')
+    parser.add_argument('images', nargs='*', help='Ảnh xe (crop); bỏ trống = ảnh tổng hợp')
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    # Chỉ đo phần tìm vị trí, không cần OCR
+    config = dict(config, ocr=dict(config.get('ocr', {}), enabled=False))
+
+    contour = LicensePlateDetector(config)
+    contour.localize_mode = 'contour'
+    fast = LicensePlateDetector(config)
+    fast.localize_mode = 'fast'
+
+    if args.images:
+        samples = []
+        for path in args.images:
+            img = cv2.imread(path)
+            if img is None:
+                print(f"⚠️  Không đọc được ảnh: {path}")
+                continue
+            samples.append((path, img))
+    else:
+        samples = [
+            ('tổng hợp 4K (1600x1200)', synthetic_vehicle(1600, 1200)),
+            ('tổng hợp 1080p (800x600)', synthetic_vehicle(800, 600)),
+            ('tổng hợp 720p (480x360)', synthetic_vehicle(480, 360)),
+        ]
+
+    methods = [
+        ('cũ (ảnh gốc)', lambda img: legacy_localize(contour, img)),
+        ('contour (thu nhỏ)', contour.localize_plates),
+        ('fast', fast.localize_plates),
+    ]
+
+    print(f"\n📊 Tìm vị trí biển số, trung bình {args.repeat} lần (ms / số vùng tìm được)")
+    print(f"{'Ảnh':<28}" + ''.join(f"{name:>22}" for name, _ in methods))
+    for name, img in samples:
+        row = f"{name:<28}"
+        for _, func in methods:
+            ms, count = time_method(func, img, args.repeat)
+            row += f"{ms:>15.2f} ms / {count}"
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
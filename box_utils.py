@@ -0,0 +1,112 @@
+"""
+Box Utils Module
+Các phép tính trên bounding box (x1, y1, x2, y2) dạng vector hóa bằng NumPy
+"""
+import numpy as np
+
+
+def box_iou(boxes_a, boxes_b, metric='iou'):
+    """
+    Ma trận IoU giữa hai tập box
+
+    Args:
+        boxes_a: Array (N, 4) x1, y1, x2, y2
+        boxes_b: Array (M, 4) x1, y1, x2, y2
+        metric: 'iou' (giao / hợp) hoặc 'ios' (giao / box nhỏ hơn, dùng khi
+            gộp box bị cắt ở biên tile với box đầy đủ)
+
+    Returns:
+        Array (N, M) IoU
+    """
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]).clip(0) * (boxes_a[:, 3] - boxes_a[:, 1]).clip(0)
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]).clip(0) * (boxes_b[:, 3] - boxes_b[:, 1]).clip(0)
+
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    wh = (bottom_right - top_left).clip(0)
+    inter = wh[..., 0] * wh[..., 1]
+
+    if metric == 'ios':
+        smaller = np.minimum(area_a[:, None], area_b[None, :])
+        return inter / np.maximum(smaller, 1e-9)
+
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, 1e-9)
+
+
+def nms(boxes, scores, iou_threshold=0.5, classes=None, metric='iou'):
+    """
+    Non-maximum suppression (theo từng class nếu có classes)
+
+    Ma trận IoU được tính một lần cho tất cả box; vòng lặp chỉ duyệt các box
+    còn giữ lại theo thứ tự score giảm dần.
+
+    Args:
+        boxes: Array (N, 4) x1, y1, x2, y2
+        scores: Array (N,)
+        iou_threshold: Box trùng nhiều hơn ngưỡng này với box score cao hơn bị loại
+        classes: Array (N,) - chỉ loại box cùng class
+        metric: 'iou' hoặc 'ios'
+
+    Returns:
+        Array index các box được giữ (theo score giảm dần)
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    order = np.argsort(-np.asarray(scores))
+    if len(order) == 0:
+        return order
+
+    boxes = boxes[order]
+    overlap = box_iou(boxes, boxes, metric) > iou_threshold
+    if classes is not None:
+        classes = np.asarray(classes)[order]
+        overlap &= classes[:, None] == classes[None, :]
+    # Chỉ box score cao hơn (đứng trước) mới loại được box sau
+    overlap = np.triu(overlap, k=1)
+
+    keep = np.ones(len(order), dtype=bool)
+    for i in range(len(order)):
+        if keep[i]:
+            keep[i + 1:] &= ~overlap[i, i + 1:]
+    return order[keep]
+
+
+def make_tiles(width, height, tile_size=640, overlap=0.2, zones=None):
+    """
+    Chia frame thành các tile chồng lấn nhau
+
+    Args:
+        width, height: Kích thước frame
+        tile_size: Cạnh tile (pixel)
+        overlap: Tỷ lệ chồng lấn giữa hai tile liền kề
+        zones: List vùng quan tâm [x1, y1, x2, y2] theo tỷ lệ 0..1;
+            None/rỗng -> chia toàn bộ frame
+
+    Returns:
+        Array (T, 4) int x1, y1, x2, y2 của từng tile
+    """
+    zones = zones or [[0, 0, 1, 1]]
+    stride = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(start, end):
+        # Tile cuối được kéo lùi để không vượt quá biên vùng
+        length = end - start
+        if length <= tile_size:
+            return [start]
+        positions = list(range(start, end - tile_size, stride))
+        positions.append(end - tile_size)
+        return positions
+
+    tiles = []
+    for zx1, zy1, zx2, zy2 in zones:
+        x1, x2 = int(zx1 * width), int(zx2 * width)
+        y1, y2 = int(zy1 * height), int(zy2 * height)
+        for ty in starts(y1, y2):
+            for tx in starts(x1, x2):
+                tiles.append((tx, ty, min(tx + tile_size, x2), min(ty + tile_size, y2)))
+
+    # Bỏ tile trùng lặp (các zone chồng lên nhau)
+    return np.unique(np.array(tiles, dtype=np.int64).reshape(-1, 4), axis=0)
@@ -7,16 +7,28 @@ import torch
 from datetime import datetime
 import os
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from pathlib import Path
-from ultralytics import YOLO
+from inference_backend import load_model
+from stream_recorder import StreamRecorder, cleanup_old_recordings
+from tracker import ObjectTracker
+from plate_scheduler import PlateScheduler
+from box_utils import make_tiles, nms
+from motion_gate import MotionGate
+from adaptive import LatencyController
+from pipeline import Pipeline, Stage
+from ocr_pool import OCRWorkerPool
 
 # Chọn detector dựa trên config
 try:
     with open('config.yaml', 'r', encoding='utf-8') as f:
         _config = yaml.safe_load(f)
     
-    if _config.get('license_plate', {}).get('use_yolo', False):
+    from license_plate_yolo import use_yolo_plate
+    if use_yolo_plate(_config):
         from license_plate_yolo import YOLOLicensePlateDetector as LicensePlateDetector
         print("🎯 Sử dụng YOLO License Plate Detector")
     else:
@@ -28,15 +40,108 @@ except Exception as e:
 
 # Import FFMPEG camera nếu là RTSP
 try:
-    from ffmpeg_camera import FFMPEGCamera
+    from ffmpeg_camera import FFMPEGCamera, DualStreamCamera
     FFMPEG_AVAILABLE = True
 except ImportError:
     FFMPEG_AVAILABLE = False
     print("⚠️  FFMPEG camera module không có, sẽ dùng OpenCV")
 
+def open_camera(camera_config):
+    """
+    Mở kết nối tới một camera
+    
+    Args:
+        camera_config: Dict cấu hình camera (source, width, height, fps, buffer_size, pool_size, dual_stream)
+    
+    Returns:
+        Đối tượng capture (FFMPEGCamera, DualStreamCamera hoặc cv2.VideoCapture)
+    """
+    source = camera_config['source']
+    
+    # Kiểm tra nếu là RTSP URL
+    is_rtsp = isinstance(source, str) and source.startswith('rtsp://')
+    dual_config = camera_config.get('dual_stream') or {}
+    
+    if is_rtsp and FFMPEG_AVAILABLE and dual_config.get('enabled', False):
+        # Substream (source) cho detection, main stream chỉ decode khi có xe
+        print(f"📡 Phát hiện RTSP stream, dùng FFMPEG backend (2 stream)...")
+        cap = DualStreamCamera(
+            source,
+            dual_config.get('main_source') or source.replace('subtype=1', 'subtype=0'),
+            width=camera_config['width'],
+            height=camera_config['height'],
+            fps=camera_config['fps'],
+            pool_size=camera_config.get('pool_size', 4),
+            main_width=dual_config.get('main_width', 2560),
+            main_height=dual_config.get('main_height', 1440),
+            idle_timeout=dual_config.get('idle_timeout', 3.0),
+            max_offset=dual_config.get('max_offset', 0.2),
+            main_delay=dual_config.get('main_delay', 0.0),
+            history=dual_config.get('history', 5),
+            wait_ms=dual_config.get('wait_ms', 80)
+        )
+        
+        if not cap.start():
+            raise Exception(f"❌ Không thể kết nối RTSP stream: {source}")
+    elif is_rtsp and FFMPEG_AVAILABLE:
+        # Dùng FFMPEG camera cho RTSP (hoạt động tốt hơn trên macOS)
+        print(f"📡 Phát hiện RTSP stream, dùng FFMPEG backend...")
+        cap = FFMPEGCamera(
+            source,
+            width=camera_config['width'],
+            height=camera_config['height'],
+            fps=camera_config['fps'],
+            pool_size=camera_config.get('pool_size', 4)
+        )
+        
+        if not cap.start():
+            raise Exception(f"❌ Không thể kết nối RTSP stream: {source}")
+    else:
+        # Dùng OpenCV cho webcam hoặc RTSP (nếu FFMPEG không có)
+        if is_rtsp:
+            # Dùng FFMPEG backend cho RTSP
+            cap = cv2.VideoCapture(source, cv2.CAP_FFMPEG)
+            
+            # Set buffer size nếu có trong config (giảm độ trễ)
+            if 'buffer_size' in camera_config:
+                cap.set(cv2.CAP_PROP_BUFFERSIZE, camera_config['buffer_size'])
+                print(f"📦 Buffer size: {camera_config['buffer_size']}")
+        else:
+            cap = cv2.VideoCapture(source)
+        
+        if not cap.isOpened():
+            if is_rtsp:
+                print(f"⚠️  OpenCV không kết nối được RTSP, thử cài FFMPEG camera module")
+            raise Exception(f"❌ Không thể mở camera: {source}")
+        
+        # Set resolution
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, camera_config['width'])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, camera_config['height'])
+        cap.set(cv2.CAP_PROP_FPS, camera_config['fps'])
+    
+    print(f"📹 Camera đã kết nối: {source}")
+    return cap
+
+# Phân loại xe theo COCO class ID
+# 1: bicycle, 2: car, 3: motorcycle, 5: bus, 7: truck
+VEHICLE_TYPES = {
+    1: 'Xe đạp',
+    2: 'Ô tô',
+    3: 'Xe máy',
+    5: 'Xe buýt',
+    7: 'Xe tải'
+}
+
 class CameraAI:
-    def __init__(self, config_path='config.yaml'):
-        """Khởi tạo Camera AI System"""
+    def __init__(self, config_path='config.yaml', with_camera=True):
+        """
+        Khởi tạo Camera AI System
+        
+        Args:
+            config_path: Đường dẫn file config
+            with_camera: False = chỉ load model/database (dùng làm detector
+                chung cho nhiều camera, xem multi_camera.py)
+        """
         # Load config
         with open(config_path, 'r', encoding='utf-8') as f:
             self.config = yaml.safe_load(f)
@@ -47,30 +152,132 @@ class CameraAI:
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
         print(f"📱 Sử dụng device: {self.device}")
         
-        # Load YOLO models
+        # Load YOLO models (backend: torch / onnx / openvino)
+        perf_config = self.config.get('performance', {})
+        self.imgsz = perf_config.get('imgsz', 640)
         model_path = self.config['detection']['person_model']
         if not os.path.exists(model_path):
             print(f"⬇️  Đang tải YOLOv11 model...")
-            self.model = YOLO('yolo11n.pt')  # Tự động download
+            model_path = 'yolo11n.pt'  # Tự động download
             os.makedirs('models', exist_ok=True)
             # Model sẽ được tải tự động
-        else:
-            self.model = YOLO(model_path)
+        backend = perf_config.get('backend', 'torch')
+        # Batch động: gom nhiều frame (max_batch_size) hoặc nhiều tile
+        dynamic = (perf_config.get('max_batch_size', 1) > 1
+                   or self.config['detection'].get('tiling', {}).get('enabled', False))
+        self.model = load_model(
+            model_path,
+            backend=backend,
+            imgsz=self.imgsz,
+            dynamic=dynamic,
+            precision=perf_config.get('precision', 'fp32')
+        )
+        
+        # Resize frame trước khi xử lý (resize_frame / resize_width / resize_height)
+        self.resize_size = None
+        if perf_config.get('resize_frame', False):
+            self.resize_size = (perf_config.get('resize_width', 1280), perf_config.get('resize_height', 720))
+        # Detect trên frame đã resize, crop biển số từ frame gốc (độ phân giải đầy đủ)
+        self.full_res_plates = perf_config.get('full_res_plates', True)
+        
+        # Latency controller: skip_frames + tự giảm input size / bỏ qua frame khi quá tải
+        latency_config = perf_config.get('latency', {})
+        budget_ms = latency_config.get('budget_ms') or 1000.0 / max(1, self.config['camera'].get('fps', 25))
+        # Model export tĩnh (ONNX/OpenVINO không dynamic, INT8) chỉ chạy đúng một input size
+        resizable = backend in ('torch', 'pytorch') and perf_config.get('precision', 'fp32') != 'int8'
+        self.latency = LatencyController(
+            budget_ms=budget_ms,
+            skip_frames=perf_config.get('skip_frames', 0),
+            max_skip_frames=latency_config.get('max_skip_frames', 4),
+            imgsz=self.imgsz,
+            min_imgsz=latency_config.get('min_imgsz', 320) if resizable else self.imgsz,
+            adaptive=latency_config.get('adaptive', False)
+        )
+        
+        # Thread pool cho OCR biển số (nhiều xe trong cùng frame)
+        self.executor = None
+        if perf_config.get('use_threading', False) and perf_config.get('max_workers', 1) > 1:
+            self.executor = ThreadPoolExecutor(max_workers=perf_config['max_workers'])
+        
+        # Ngưỡng và class đã biên dịch sẵn (tránh tra dict lồng nhau mỗi box)
+        det_config = self.config['detection']
+        self.person_classes = np.array(det_config['person_classes'], dtype=np.int64)
+        self.vehicle_classes = np.array(det_config['vehicle_classes'], dtype=np.int64)
+        self.person_confidence = float(det_config['person_confidence'])
+        self.vehicle_confidence = float(det_config['vehicle_confidence'])
+        self.expand_ratio = float(self.config.get('license_plate', {}).get('expand_roi', 0.1))
+        
+        # Tiled inference: chia frame lớn (4K/dọc) thành tile chồng lấn
+        self.tiling_config = self.config['detection'].get('tiling', {})
+        self.tiling_enabled = self.tiling_config.get('enabled', False)
+        self.tile_cache = {}  # (width, height) -> array tile
+        
+        # Motion gate: bỏ qua YOLO khi cảnh đứng yên (mỗi camera một gate)
+        self.motion_config = perf_config.get('motion_gate', {})
+        self.motion_enabled = self.motion_config.get('enabled', False)
+        self.motion_gates = {}  # camera_id -> MotionGate
+        self.last_detections = {}  # camera_id -> detections của lần chạy gần nhất (frame bị bỏ qua dùng lại)
+        
+        # Tracking: ID ổn định cho người/xe qua các frame (mỗi camera một tracker)
+        track_config = self.config.get('tracking', {})
+        self.tracking_enabled = track_config.get('enabled', False)
+        self.track_config = track_config
+        self.trackers = {}  # (camera_id, 'persons' | 'vehicles') -> ObjectTracker
+        self.track_rows = {}  # (camera_id, track_id) -> {'row_id', 'plate'} của xe đã ghi DB
         
         # Khởi tạo License Plate Detector
         self.plate_detector = LicensePlateDetector(self.config)
         
+        # Lịch OCR biển số theo track: chỉ đọc vài crop tốt nhất rồi bỏ phiếu
+        # (plate_lock: OCR có thể chạy trên nhiều thread / stage của pipeline)
+        self.plate_lock = threading.Lock()
+        schedule_config = self.config.get('license_plate', {}).get('ocr_schedule', {})
+        self.plate_scheduler = PlateScheduler(
+            max_reads=schedule_config.get('max_reads', 5),
+            min_votes=schedule_config.get('min_votes', 3),
+            stable_count=schedule_config.get('stable_count', 2),
+            quality_gain=schedule_config.get('quality_gain', 1.2),
+            min_quality_ratio=schedule_config.get('min_quality_ratio', 0.7),
+            read_interval=schedule_config.get('read_interval', 3)
+        )
+        
+        # OCR bất đồng bộ trên process pool (chỉ cho xe có track)
+        self.ocr_pool = None
+        self.ended_plate_keys = set()  # Xe đã hết track nhưng còn job OCR đang chạy
+        self.ended_rows = {}  # (camera_id, track_id) -> row DB của xe đã hết track, chờ kết quả OCR
+        pool_config = self.config.get('ocr', {}).get('async_pool', {})
+        if pool_config.get('enabled', False):
+            if self.tracking_enabled:
+                self.ocr_pool = OCRWorkerPool(
+                    self.config,
+                    workers=pool_config.get('workers', 2),
+                    max_pending=pool_config.get('max_pending', 8)
+                )
+            else:
+                print("⚠️  OCR pool cần bật tracking, dùng OCR đồng bộ")
+        
         # Khởi tạo camera
         self.cap = None
-        self.setup_camera()
+        if with_camera:
+            self.setup_camera()
         
         # Khởi tạo database
         self.setup_database()
         
         # Recording settings
         self.video_writer = None
+        self.stream_recorder = None
         self.current_video_path = None
         
+        # Pipeline đang chạy (run / dashboard)
+        self.pipeline = None
+        
+        # Số thứ tự + timestamp của frame đang xử lý
+        self.frame_seq = 0
+        self.frame_timestamp = None
+        # Frame gốc (trước resize_frame) của frame đang xử lý, để crop biển số
+        self.full_frame = None
+        
         # Thống kê
         self.stats = {
             'total_persons': 0,
@@ -83,47 +290,43 @@ class CameraAI:
     
     def setup_camera(self):
         """Thiết lập kết nối camera"""
-        source = self.config['camera']['source']
+        camera_config = dict(self.config['camera'])
+        camera_config['pool_size'] = self.frame_pool_size()
+        self.cap = open_camera(camera_config)
+    
+    def read_frame(self, timeout=5.0):
+        """
+        Đọc frame MỚI từ camera (không xử lý lại frame đã xử lý)
         
-        # Kiểm tra nếu là RTSP URL
-        is_rtsp = isinstance(source, str) and source.startswith('rtsp://')
-        
-        if is_rtsp and FFMPEG_AVAILABLE:
-            # Dùng FFMPEG camera cho RTSP (hoạt động tốt hơn trên macOS)
-            print(f"📡 Phát hiện RTSP stream, dùng FFMPEG backend...")
-            self.cap = FFMPEGCamera(
-                source,
-                width=self.config['camera']['width'],
-                height=self.config['camera']['height'],
-                fps=self.config['camera']['fps']
-            )
-            
-            if not self.cap.start():
-                raise Exception(f"❌ Không thể kết nối RTSP stream: {source}")
-        else:
-            # Dùng OpenCV cho webcam hoặc RTSP (nếu FFMPEG không có)
-            if is_rtsp:
-                # Dùng FFMPEG backend cho RTSP
-                self.cap = cv2.VideoCapture(source, cv2.CAP_FFMPEG)
-                
-                # Set buffer size nếu có trong config (giảm độ trễ)
-                if 'buffer_size' in self.config['camera']:
-                    self.cap.set(cv2.CAP_PROP_BUFFERSIZE, self.config['camera']['buffer_size'])
-                    print(f"📦 Buffer size: {self.config['camera']['buffer_size']}")
-            else:
-                self.cap = cv2.VideoCapture(source)
-            
-            if not self.cap.isOpened():
-                if is_rtsp:
-                    print(f"⚠️  OpenCV không kết nối được RTSP, thử cài FFMPEG camera module")
-                raise Exception(f"❌ Không thể mở camera: {source}")
-            
-            # Set resolution
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.config['camera']['width'])
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.config['camera']['height'])
-            self.cap.set(cv2.CAP_PROP_FPS, self.config['camera']['fps'])
+        Camera có read_next (FFMPEG/HTTP) sẽ chờ frame mới tối đa timeout giây;
+        cv2.VideoCapture luôn trả frame mới sau mỗi lần read().
+        
+        Returns:
+            ret: True nếu có frame mới
+            frame: Frame mới (đã resize nếu bật resize_frame; frame gốc ở self.full_frame)
+        """
+        if hasattr(self.cap, 'read_next'):
+            ret, frame = self.cap.read_next(timeout=timeout)
+            if ret:
+                self.frame_seq = self.cap.frame_seq
+                self.frame_timestamp = self.cap.frame_timestamp
+                self.full_frame = frame
+                frame = self.prepare_frame(frame)
+            return ret, frame
         
-        print(f"📹 Camera đã kết nối: {source}")
+        ret, frame = self.cap.read()
+        if ret:
+            self.frame_seq += 1
+            self.frame_timestamp = datetime.now().timestamp()
+            self.full_frame = frame
+            frame = self.prepare_frame(frame)
+        return ret, frame
+    
+    def prepare_frame(self, frame):
+        """Resize frame về resize_width x resize_height (nếu bật resize_frame)"""
+        if self.resize_size is None or (frame.shape[1], frame.shape[0]) == self.resize_size:
+            return frame
+        return cv2.resize(frame, self.resize_size, interpolation=cv2.INTER_AREA)
     
     def setup_database(self):
         """Tạo database để lưu log"""
@@ -157,6 +360,24 @@ class CameraAI:
             conn.commit()
             print("✅ Migration hoàn tất!")
         
+        # Migration: Thêm cột camera_id nếu chưa có (chạy nhiều camera)
+        try:
+            cursor.execute("SELECT camera_id FROM detections LIMIT 1")
+        except sqlite3.OperationalError:
+            print("🔧 Đang migrate database: thêm cột camera_id...")
+            cursor.execute("ALTER TABLE detections ADD COLUMN camera_id TEXT")
+            conn.commit()
+            print("✅ Migration hoàn tất!")
+        
+        # Migration: Thêm cột plate_confidence nếu chưa có (confidence OCR của biển số)
+        try:
+            cursor.execute("SELECT plate_confidence FROM detections LIMIT 1")
+        except sqlite3.OperationalError:
+            print("🔧 Đang migrate database: thêm cột plate_confidence...")
+            cursor.execute("ALTER TABLE detections ADD COLUMN plate_confidence REAL")
+            conn.commit()
+            print("✅ Migration hoàn tất!")
+        
         # Bảng statistics
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS statistics (
@@ -173,32 +394,70 @@ class CameraAI:
         print("💾 Database đã sẵn sàng")
     
     def start_recording(self):
-        """Bắt đầu ghi video"""
-        if not self.config['recording']['enabled']:
+        """
+        Bắt đầu ghi video
+        
+        recording.mode:
+            - 'stream_copy': FFMPEG ghi thẳng H.264 của camera thành segment,
+              không decode/encode (chỉ cho RTSP); bật camera.dual_stream thì
+              ghi main stream (độ phân giải đầy đủ) thay vì substream
+            - 'annotated': ghi frame đã vẽ detection bằng cv2.VideoWriter
+        """
+        rec_config = self.config['recording']
+        if not rec_config['enabled']:
             return
         
+        save_path = rec_config['save_path']
+        retention_days = rec_config.get('video_retention_days')
+        mode = rec_config.get('mode', 'annotated')
+        camera_config = self.config['camera']
+        source = camera_config['source']
+        dual_config = camera_config.get('dual_stream') or {}
+        if dual_config.get('enabled', False) and dual_config.get('main_source'):
+            source = dual_config['main_source']
+        
+        if mode == 'stream_copy':
+            if isinstance(source, str) and source.startswith('rtsp://'):
+                self.stream_recorder = StreamRecorder(
+                    source,
+                    save_path,
+                    segment_seconds=rec_config.get('segment_seconds', 300),
+                    segment_format=rec_config.get('segment_format', 'mp4'),
+                    retention_days=retention_days
+                )
+                if self.stream_recorder.start():
+                    return
+                self.stream_recorder = None
+                print("⚠️  Không khởi động được FFMPEG stream copy, chuyển sang ghi frame đã vẽ")
+            else:
+                print("⚠️  Stream copy chỉ hỗ trợ RTSP, chuyển sang ghi frame đã vẽ")
+        
+        cleanup_old_recordings(save_path, retention_days)
+        
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         self.current_video_path = os.path.join(
-            self.config['recording']['save_path'],
+            save_path,
             f"recording_{timestamp}.mp4"
         )
         
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
         fps = self.config['camera']['fps']
-        size = (self.config['camera']['width'], self.config['camera']['height'])
+        size = self.resize_size or (self.config['camera']['width'], self.config['camera']['height'])
         
         self.video_writer = cv2.VideoWriter(
             self.current_video_path, fourcc, fps, size
         )
         print(f"🎥 Bắt đầu ghi: {self.current_video_path}")
     
-    def save_snapshot(self, frame, detection_type, extra_info=""):
+    def save_snapshot(self, frame, detection_type, extra_info="", camera_id=None):
         """Lưu ảnh snapshot"""
         if not self.config['recording']['save_snapshots']:
             return None
         
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
         filename = f"{detection_type}_{timestamp}.jpg"
+        if camera_id:
+            filename = f"{camera_id}_{filename}"
         filepath = os.path.join(
             self.config['recording']['snapshot_path'],
             filename
@@ -209,116 +468,670 @@ class CameraAI:
     
     def get_vehicle_type(self, class_id):
         """Phân loại xe dựa trên YOLO class ID"""
-        # COCO dataset classes:
-        # 1: bicycle, 2: car, 3: motorcycle, 5: bus, 7: truck
-        vehicle_types = {
-            1: 'Xe đạp',
-            2: 'Ô tô',
-            3: 'Xe máy',
-            5: 'Xe buýt',
-            7: 'Xe tải'
-        }
-        return vehicle_types.get(class_id, 'Xe khác')
+        return VEHICLE_TYPES.get(class_id, 'Xe khác')
     
-    def log_detection(self, det_type, confidence, bbox, snapshot_path=None, plate=None, vehicle_type=None):
-        """Ghi log vào database"""
+    def log_detection(self, det_type, confidence, bbox, snapshot_path=None, plate=None, vehicle_type=None,
+                      camera_id=None, plate_confidence=None):
+        """
+        Ghi log vào database
+        
+        Returns:
+            ID của row vừa ghi
+        """
         conn = sqlite3.connect(self.config['database']['path'])
         cursor = conn.cursor()
         
         cursor.execute('''
-            INSERT INTO detections (type, vehicle_type, confidence, bbox, snapshot_path, license_plate)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (det_type, vehicle_type, confidence, str(bbox), snapshot_path, plate))
+            INSERT INTO detections (type, vehicle_type, confidence, bbox, snapshot_path, license_plate, camera_id,
+                                    plate_confidence)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (det_type, vehicle_type, confidence, str(bbox), snapshot_path, plate, camera_id, plate_confidence))
+        row_id = cursor.lastrowid
         
         conn.commit()
         conn.close()
+        return row_id
+    
+    def update_detection_plate(self, row_id, plate, plate_confidence=None):
+        """Gắn biển số (đọc được sau) vào row detection đã ghi"""
+        conn = sqlite3.connect(self.config['database']['path'])
+        conn.execute('UPDATE detections SET license_plate = ?, plate_confidence = ? WHERE id = ?',
+                     (plate, plate_confidence, row_id))
+        conn.commit()
+        conn.close()
+    
+    def save_detections(self, frame_display, detections, camera_id=None):
+        """
+        Lưu snapshot và ghi log detections của một frame vào database
+        
+        Khi bật tracking, mỗi track chỉ được ghi một lần (lúc track mới xuất
+        hiện); biển số đọc được ở frame sau sẽ được gắn vào row của xe.
+        
+        Args:
+            frame_display: Frame đã vẽ kết quả
+            detections: Kết quả từ detect_frame
+            camera_id: ID camera (khi chạy nhiều camera)
+        """
+        # Xe đã kết thúc track: không còn cập nhật row (trừ khi OCR bất đồng bộ chưa xong).
+        # Chuyển row sang ended_rows dưới plate_lock: thread OCR (collect_ocr_results)
+        # đọc ended_plate_keys / ended_rows / track_rows trong cùng lock
+        with self.plate_lock:
+            for track_id in detections.get('ended_tracks', ()):
+                key = (camera_id, track_id)
+                row = self.track_rows.pop(key, None)
+                if row and key in self.ended_plate_keys:
+                    self.ended_rows[key] = row
+        
+        if not (detections['persons'] or detections['vehicles']):
+            return
+        if not self.config['recording']['save_snapshots']:
+            return
+        
+        # Map biển số theo index của xe
+        plate_map = {plate['vehicle_index']: plate for plate in detections['plates']}
+        
+        # Xe đã ghi DB nhưng giờ mới đọc được biển số
+        for vehicle in detections['vehicles']:
+            if vehicle['new_track'] or vehicle['track_id'] is None:
+                continue
+            row = self.track_rows.get((camera_id, vehicle['track_id']))
+            plate = plate_map.get(vehicle['index'])
+            if row and plate and row['plate'] != plate['plate_text']:
+                self.update_detection_plate(row['row_id'], plate['plate_text'], plate['plate_confidence'])
+                row['plate'] = plate['plate_text']
+        
+        persons = [person for person in detections['persons'] if person['new_track']]
+        vehicles = [vehicle for vehicle in detections['vehicles'] if vehicle['new_track']]
+        if not (persons or vehicles):
+            return
+        
+        snapshot_path = self.save_snapshot(frame_display, 'detection', camera_id=camera_id)
+        
+        for person in persons:
+            self.log_detection(
+                'person',
+                person['confidence'],
+                person['bbox'],
+                snapshot_path,
+                camera_id=camera_id
+            )
+        
+        for vehicle in vehicles:
+            # Tìm biển số tương ứng với xe này
+            plate = plate_map.get(vehicle['index'])
+            plate_text = plate['plate_text'] if plate else None
+            row_id = self.log_detection(
+                'vehicle',
+                vehicle['confidence'],
+                vehicle['bbox'],
+                snapshot_path,
+                plate_text,
+                vehicle.get('vehicle_type', None),
+                camera_id=camera_id,
+                plate_confidence=plate['plate_confidence'] if plate else None
+            )
+            if vehicle['track_id'] is not None:
+                self.track_rows[(camera_id, vehicle['track_id'])] = {'row_id': row_id, 'plate': plate_text}
     
-    def detect_frame(self, frame):
+    def detect_frame(self, frame, camera_id=None, plate_frame=None):
         """Phát hiện objects trong frame"""
-        results = self.model(frame, verbose=False)
+        return self.detect_batch([frame], [camera_id], [plate_frame])[0]
+    
+    def detect_batch(self, frames, camera_ids=None, plate_frames=None):
+        """
+        Phát hiện objects + đọc biển số trên nhiều frame (model chạy MỘT lần)
+        
+        Args:
+            frames: List frame (từ nhiều camera hoặc các frame liên tiếp)
+            camera_ids: ID camera của từng frame (để tracking riêng từng camera)
+            plate_frames: Frame gốc độ phân giải cao để crop biển số (xem attach_plates_batch)
+        
+        Returns:
+            List detections dict (persons/vehicles/plates), mỗi frame một dict
+        """
+        if camera_ids is None:
+            camera_ids = [None] * len(frames)
+        start_time = time.time()
+        batch_detections = self.detect_objects_batch(frames, camera_ids)
+        self.attach_plates_batch(frames, batch_detections, camera_ids, plate_frames)
+        
+        # Thời gian detect + OCR trung bình mỗi frame đã chạy model -> latency controller
+        processed = sum(1 for detections in batch_detections if not detections.get('carried'))
+        if processed:
+            self.latency.record((time.time() - start_time) * 1000 / processed)
+        return batch_detections
+    
+    def detect_objects_batch(self, frames, camera_ids=None):
+        """
+        Phát hiện người/xe (chưa đọc biển số) trên nhiều frame bằng MỘT lần chạy model
+        
+        Args:
+            frames: List frame
+            camera_ids: ID camera của từng frame
+        
+        Returns:
+            List detections dict, biển số được điền sau bởi attach_plates
+        """
+        if not frames:
+            return []
+        if camera_ids is None:
+            camera_ids = [None] * len(frames)
+        
+        # Chỉ chạy model cho frame cần xử lý; frame bị bỏ qua (skip_frames /
+        # không có chuyển động) dùng lại kết quả của lần chạy gần nhất
+        batch_detections = [None] * len(frames)
+        active = []
+        for i, (frame, camera_id) in enumerate(zip(frames, camera_ids)):
+            if camera_id in self.last_detections and not self.needs_inference(frame, camera_id):
+                batch_detections[i] = self.carry_forward(self.last_detections[camera_id])
+            else:
+                active.append(i)
+        
+        if active:
+            # Latency controller được cập nhật bởi detect_batch / stage render
+            # (thời gian cả frame, không chỉ thời gian chạy model)
+            results = self._detect_frames([frames[i] for i in active], [camera_ids[i] for i in active])
+            
+            for i, detections in zip(active, results):
+                batch_detections[i] = detections
+                self.last_detections[camera_ids[i]] = detections
+        return batch_detections
+    
+    def needs_inference(self, frame, camera_id=None):
+        """Frame có cần chạy model không (skip_frames + motion gate)"""
+        if not self.latency.should_process(camera_id):
+            return False
+        if self.motion_enabled and not self.get_motion_gate(camera_id).check(frame):
+            return False
+        return True
+    
+    def get_motion_gate(self, camera_id):
+        """Lấy (hoặc tạo) motion gate cho một camera"""
+        if camera_id not in self.motion_gates:
+            self.motion_gates[camera_id] = MotionGate(
+                width=self.motion_config.get('width', 160),
+                pixel_threshold=self.motion_config.get('pixel_threshold', 25),
+                min_area_ratio=self.motion_config.get('min_area_ratio', 0.002),
+                refresh_interval=self.motion_config.get('refresh_interval', 30)
+            )
+        return self.motion_gates[camera_id]
+    
+    @staticmethod
+    def carry_forward(detections):
+        """Dùng lại detections của frame trước (không tính là đối tượng mới, không OCR lại)"""
+        return {
+            'persons': [dict(person, new_track=False) for person in detections['persons']],
+            'vehicles': [dict(vehicle, new_track=False) for vehicle in detections['vehicles']],
+            'plates': detections['plates'],
+            'carried': True
+        }
+    
+    def _detect_frames(self, frames, camera_ids):
+        """Chạy model (một lần) trên các frame và parse kết quả"""
+        predict_args = {'imgsz': self.latency.imgsz, 'verbose': False}
+        if self.tracking_enabled:
+            # Lấy cả detection confidence thấp để tracker giữ ID (ByteTrack)
+            predict_args['conf'] = self.track_config.get('low_confidence', 0.1)
         
+        if self.tiling_enabled:
+            batch_data = self._predict_tiled(frames, predict_args)
+        else:
+            results = self.model(list(frames), **predict_args)
+            # (N, 6): x1, y1, x2, y2, conf, cls
+            batch_data = [result.boxes.data.cpu().numpy() for result in results]
+        
+        batch_detections = [
+            self._parse_result(data, frame, camera_id)
+            for data, frame, camera_id in zip(batch_data, frames, camera_ids)
+        ]
+        
+        self.stats['last_detection'] = datetime.now()
+        return batch_detections
+    
+    def get_tiles(self, width, height):
+        """Danh sách tile (x1, y1, x2, y2) cho kích thước frame (có cache)"""
+        key = (width, height)
+        if key not in self.tile_cache:
+            self.tile_cache[key] = make_tiles(
+                width, height,
+                tile_size=self.tiling_config.get('tile_size', 640),
+                overlap=self.tiling_config.get('overlap', 0.2),
+                zones=self.tiling_config.get('zones')
+            )
+            print(f"🧩 Tiled inference {width}x{height}: {len(self.tile_cache[key])} tile")
+        return self.tile_cache[key]
+    
+    def _predict_tiled(self, frames, predict_args):
+        """
+        Chạy model trên các tile của tất cả frame trong MỘT batch
+        
+        Tile là view (không copy) của frame. Box của từng tile được dịch về tọa
+        độ frame rồi gộp bằng NMS theo class (metric 'ios' để box bị cắt ở
+        biên tile bị loại bởi box đầy đủ).
+        
+        Returns:
+            List array (N, 6) x1, y1, x2, y2, conf, cls cho từng frame
+        """
+        include_full_frame = self.tiling_config.get('include_full_frame', True)
+        
+        images = []
+        owners = []  # (index frame, offset x, offset y) của từng ảnh trong batch
+        for i, frame in enumerate(frames):
+            h, w = frame.shape[:2]
+            if include_full_frame:
+                # Frame đầy đủ: giữ các đối tượng lớn hơn một tile
+                images.append(frame)
+                owners.append((i, 0, 0))
+            for x1, y1, x2, y2 in self.get_tiles(w, h).tolist():
+                images.append(frame[y1:y2, x1:x2])
+                owners.append((i, x1, y1))
+        
+        results = self.model(images, **predict_args)
+        
+        per_frame = [[] for _ in frames]
+        for result, (i, offset_x, offset_y) in zip(results, owners):
+            data = result.boxes.data.cpu().numpy()
+            if len(data):
+                data = data.copy()
+                data[:, [0, 2]] += offset_x
+                data[:, [1, 3]] += offset_y
+                per_frame[i].append(data)
+        
+        batch_data = []
+        for parts in per_frame:
+            if not parts:
+                batch_data.append(np.zeros((0, 6), dtype=np.float32))
+                continue
+            data = np.concatenate(parts)
+            keep = nms(
+                data[:, :4], data[:, 4],
+                iou_threshold=self.tiling_config.get('nms_iou', 0.5),
+                classes=data[:, 5],
+                metric=self.tiling_config.get('nms_metric', 'ios')
+            )
+            batch_data.append(data[keep])
+        return batch_data
+    
+    def get_tracker(self, camera_id, kind):
+        """Lấy (hoặc tạo) tracker cho một camera và loại đối tượng"""
+        key = (camera_id, kind)
+        if key not in self.trackers:
+            threshold = self.person_confidence if kind == 'persons' else self.vehicle_confidence
+            self.trackers[key] = ObjectTracker(
+                high_threshold=threshold,
+                low_threshold=self.track_config.get('low_confidence', 0.1),
+                match_iou=self.track_config.get('match_iou', 0.3),
+                max_age=self.track_config.get('max_age', 30),
+                min_hits=self.track_config.get('min_hits', 2)
+            )
+        return self.trackers[key]
+    
+    def _update_tracks(self, camera_id, kind, class_mask, xyxy, confs, classes):
+        """
+        Cập nhật tracker với các detection thuộc class_mask
+        
+        Returns:
+            (track_ids, new_flags, ended_ids) - array (N,) theo thứ tự detection
+            gốc (track_id = -1 nếu không thuộc track nào) và list ID các track
+            vừa kết thúc
+        """
+        track_ids = np.full(len(confs), -1, dtype=np.int64)
+        new_flags = np.zeros(len(confs), dtype=bool)
+        
+        tracker = self.get_tracker(camera_id, kind)
+        ids, new = tracker.update(xyxy[class_mask], confs[class_mask], classes[class_mask])
+        track_ids[class_mask] = ids
+        new_flags[class_mask] = new
+        return track_ids, new_flags, list(tracker.removed_ids)
+    
+    def _parse_result(self, data, frame, camera_id=None):
+        """
+        Chuyển kết quả YOLO của một frame thành detections dict
+        
+        Kết quả đã là array NumPy (N, 6) và được lọc theo class/ngưỡng bằng
+        mask, không xử lý từng box trong Python.
+        """
         detections = {
             'persons': [],
             'vehicles': [],
-            'plates': []
+            'plates': [],
+            'ended_tracks': []  # ID xe vừa kết thúc track (để dọn state OCR/DB)
         }
         
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                cls = int(box.cls[0])
-                conf = float(box.conf[0])
-                bbox = box.xyxy[0].cpu().numpy()
+        xyxy = data[:, :4]
+        confs = data[:, -2]
+        classes = data[:, -1].astype(np.int64)
+        
+        is_person_class = np.isin(classes, self.person_classes)
+        is_vehicle_class = ~is_person_class & np.isin(classes, self.vehicle_classes)
+        person_mask = is_person_class & (confs >= self.person_confidence)
+        vehicle_mask = is_vehicle_class & (confs >= self.vehicle_confidence)
+        
+        # Tracking (kể cả frame không có detection, để track cũ già đi)
+        if self.tracking_enabled:
+            person_ids, person_new, _ = self._update_tracks(
+                camera_id, 'persons', is_person_class, xyxy, confs, classes)
+            vehicle_ids, vehicle_new, detections['ended_tracks'] = self._update_tracks(
+                camera_id, 'vehicles', is_vehicle_class, xyxy, confs, classes)
+        else:
+            # Không tracking: mỗi frame đều là detection mới
+            person_ids = vehicle_ids = np.full(len(confs), -1, dtype=np.int64)
+            person_new = vehicle_new = np.ones(len(confs), dtype=bool)
+        
+        # Phát hiện người
+        detections['persons'] = [
+            {
+                'bbox': bbox,
+                'confidence': float(conf),
+                'track_id': int(track_id) if track_id >= 0 else None,
+                'new_track': bool(new)
+            }
+            for bbox, conf, track_id, new in zip(
+                xyxy[person_mask], confs[person_mask], person_ids[person_mask], person_new[person_mask])
+        ]
+        self.stats['total_persons'] += int(person_new[person_mask].sum())
+        
+        # Phát hiện xe
+        vehicle_boxes = xyxy[vehicle_mask]
+        if len(vehicle_boxes) == 0:
+            return detections
+        vehicle_confs = confs[vehicle_mask]
+        vehicle_classes = classes[vehicle_mask]
+        vehicle_track_ids = vehicle_ids[vehicle_mask]
+        vehicle_new = vehicle_new[vehicle_mask]
+        
+        # Vùng crop mở rộng (expand_roi) để bao gồm biển số, tính cho tất cả xe một lần
+        h_frame, w_frame = frame.shape[:2]
+        boxes_int = vehicle_boxes.astype(np.int64)
+        box_wh = boxes_int[:, 2:] - boxes_int[:, :2]
+        expanded = np.empty_like(boxes_int)
+        expanded[:, :2] = np.maximum(0, (boxes_int[:, :2] - box_wh * self.expand_ratio).astype(np.int64))
+        expanded[:, 2:] = np.minimum((w_frame, h_frame),
+                                     (boxes_int[:, 2:] + box_wh * self.expand_ratio).astype(np.int64))
+        
+        for index, (bbox, conf, cls, exp_box, track_id, new) in enumerate(
+                zip(vehicle_boxes, vehicle_confs, vehicle_classes, expanded.tolist(),
+                    vehicle_track_ids.tolist(), vehicle_new.tolist())):
+            cls = int(cls)
+            vehicle_type = VEHICLE_TYPES.get(cls, 'Xe khác')
+            detections['vehicles'].append({
+                'index': index,  # Dùng để ghép biển số với xe
+                'bbox': bbox,
+                'confidence': float(conf),
+                'class': cls,
+                'vehicle_type': vehicle_type,
+                'track_id': track_id if track_id >= 0 else None,
+                'new_track': new,
+                'plate_roi': exp_box  # Vùng tìm biển số (x1, y1, x2, y2)
+            })
+        
+        self.stats['total_vehicles'] += int(vehicle_new.sum())
+        return detections
+    
+    def attach_plates(self, frame, detections, camera_id=None, plate_frame=None):
+        """
+        Đọc biển số cho các xe trong detections (từ detect_objects_batch)
+        
+        Args:
+            frame: Frame đã dùng để detect
+            detections: Detections của frame (được điền thêm 'plates')
+            camera_id: ID camera
+            plate_frame: Frame gốc độ phân giải cao (None = crop từ frame)
+        
+        Returns:
+            detections
+        """
+        return self.attach_plates_batch([frame], [detections], [camera_id], [plate_frame])[0]
+    
+    @staticmethod
+    def scale_rois(rois, frame, plate_frame):
+        """
+        Đổi vùng xe từ tọa độ frame detect sang frame gốc (kích thước khác)
+        
+        Args:
+            rois: Array (N, 4) x1, y1, x2, y2 trong frame
+            frame: Frame đã dùng để detect
+            plate_frame: Frame gốc
+        
+        Returns:
+            (array (N, 4) int trong plate_frame, tỷ lệ (sx, sy) plate_frame / frame)
+        """
+        h, w = frame.shape[:2]
+        full_h, full_w = plate_frame.shape[:2]
+        scale = np.array([full_w / float(w), full_h / float(h)])
+        scaled = np.empty((len(rois), 4), dtype=np.int64)
+        # Làm tròn ra ngoài để không cắt mất mép biển số
+        scaled[:, :2] = np.floor(rois[:, :2] * scale)
+        scaled[:, 2:] = np.ceil(rois[:, 2:] * scale)
+        scaled[:, :2] = np.maximum(scaled[:, :2], 0)
+        scaled[:, 2:] = np.minimum(scaled[:, 2:], (full_w, full_h))
+        return scaled, scale
+    
+    def attach_plates_batch(self, frames, batch_detections, camera_ids=None, plate_frames=None):
+        """
+        Đọc biển số cho các xe của nhiều frame (nhiều camera / frame liên tiếp)
+        
+        Crop xe của mọi frame được gom lại và OCR trong một batch. Khi có
+        plate_frames (frame gốc trước resize_frame), vùng xe được phóng theo tỷ
+        lệ và crop (view, không copy frame) từ frame gốc nên biển số giữ đủ chi
+        tiết; tọa độ biển số trả về vẫn theo frame đã detect.
+        
+        Args:
+            frames: List frame đã dùng để detect
+            batch_detections: Detections của từng frame (được điền thêm 'plates')
+            camera_ids: ID camera của từng frame
+            plate_frames: List frame gốc độ phân giải cao (None / phần tử None = dùng frames)
+        
+        Returns:
+            batch_detections
+        """
+        if camera_ids is None:
+            camera_ids = [None] * len(frames)
+        if plate_frames is None or not self.full_res_plates:
+            plate_frames = [None] * len(frames)
+        
+        # Frame dùng lại kết quả cũ đã có biển số
+        active = [i for i, detections in enumerate(batch_detections) if not detections.get('carried')]
+        
+        owners, vehicles, vehicle_crops, crop_cameras, track_ids = [], [], [], [], []
+        crop_rois, crop_scales = [], []  # Vùng crop trong frame nguồn, tỷ lệ nguồn / frame detect
+        for i in active:
+            frame, plate_frame = frames[i], plate_frames[i]
+            frame_vehicles = batch_detections[i]['vehicles']
+            if not frame_vehicles:
+                continue
+            rois = np.array([vehicle['plate_roi'] for vehicle in frame_vehicles], dtype=np.int64)
+            scale = np.ones(2)
+            if plate_frame is None or plate_frame.shape[:2] == frame.shape[:2]:
+                plate_frame = frame
+            else:
+                rois, scale = self.scale_rois(rois, frame, plate_frame)
+            
+            for vehicle, (x1, y1, x2, y2) in zip(frame_vehicles, rois.tolist()):
+                owners.append(i)
+                vehicles.append(vehicle)
+                vehicle_crops.append(plate_frame[y1:y2, x1:x2])
+                crop_rois.append((x1, y1))
+                crop_scales.append(scale)
+                crop_cameras.append(camera_ids[i])
+                track_ids.append(-1 if vehicle['track_id'] is None else vehicle['track_id'])
+        
+        # Phát hiện biển số (OCR batch cho tất cả xe của các frame)
+        plate_results = self.recognize_plates(vehicle_crops, crop_cameras, track_ids)
+        
+        # Đổi tọa độ biển số (x, y, w, h trong vùng xe) sang frame đã detect cho tất cả xe một lần
+        found = [i for i, plate_result in enumerate(plate_results) if plate_result]
+        with_bbox = [i for i in found if plate_results[i].get('bbox')]
+        plate_boxes = {}
+        if with_bbox:
+            rel = np.array([plate_results[i]['bbox'] for i in with_bbox], dtype=np.int64)
+            offsets = np.array([crop_rois[i] for i in with_bbox], dtype=np.int64)
+            scales = np.array([crop_scales[i] for i in with_bbox])
+            frame_boxes = np.hstack([offsets + rel[:, :2], offsets + rel[:, :2] + rel[:, 2:]])
+            frame_boxes = np.round(frame_boxes / np.tile(scales, 2)).astype(np.int64)
+            plate_boxes = dict(zip(with_bbox, map(tuple, frame_boxes.tolist())))
+        
+        for i in found:
+            batch_detections[owners[i]]['plates'].append({
+                'vehicle_index': vehicles[i]['index'],
+                'vehicle_bbox': vehicles[i]['bbox'],
+                'plate_bbox': plate_boxes.get(i),  # Tọa độ biển số trong frame
+                'plate_text': plate_results[i]['text'],
+                'plate_confidence': plate_results[i]['confidence']
+            })
+        
+        # Dọn state OCR của các xe đã kết thúc track (giữ lại nếu còn job OCR đang chạy)
+        with self.plate_lock:
+            for i in active:
+                for track_id in batch_detections[i].get('ended_tracks', ()):
+                    key = (camera_ids[i], track_id)
+                    if self.ocr_pool is not None and self.ocr_pool.is_pending(key):
+                        self.ended_plate_keys.add(key)
+                    else:
+                        self.plate_scheduler.remove(key)
+        
+        return batch_detections
+    
+    def recognize_plates(self, vehicle_crops, camera_ids=None, track_ids=None):
+        """
+        Đọc biển số của các xe (trong một hoặc nhiều frame)
+        
+        Xe có track: chỉ OCR khi scheduler chọn crop này, trả về kết quả đã gộp
+        (bỏ phiếu qua nhiều frame). Xe không có track: OCR mỗi frame như cũ.
+        Các crop cần OCR được đọc trong một batch (detector hỗ trợ batch), song
+        song trên thread pool (use_threading), hoặc gửi sang OCR pool
+        (ocr.async_pool) và không chờ kết quả.
+        
+        Args:
+            vehicle_crops: List ảnh vùng xe
+            camera_ids: ID camera của từng xe (hoặc một ID chung cho mọi xe)
+            track_ids: List track ID của từng xe (-1 = không có track)
+        
+        Returns:
+            List dict text/confidence/bbox (hoặc None), mỗi xe một phần tử
+        """
+        if track_ids is None:
+            track_ids = [-1] * len(vehicle_crops)
+        if not isinstance(camera_ids, (list, tuple)):
+            camera_ids = [camera_ids] * len(vehicle_crops)
+        
+        if self.ocr_pool is not None:
+            self.collect_ocr_results()
+        
+        # Chọn crop cần OCR
+        with self.plate_lock:
+            to_read = [
+                i for i, (crop, camera_id, track_id) in enumerate(zip(vehicle_crops, camera_ids, track_ids))
+                if track_id is None or track_id < 0
+                or self.plate_scheduler.should_read((camera_id, track_id), crop)
+            ]
+        
+        if self.ocr_pool is not None:
+            # Xe có track: gửi sang OCR pool, kết quả được gộp ở các frame sau
+            for i in [i for i in to_read if track_ids[i] is not None and track_ids[i] >= 0]:
+                key = (camera_ids[i], track_ids[i])
+                if not self.ocr_pool.submit(key, vehicle_crops[i]):
+                    if self.ocr_pool.broken:
+                        # Worker đã chết: tắt pool, crop này và các crop sau đọc đồng bộ
+                        self.disable_ocr_pool()
+                        break
+                    with self.plate_lock:
+                        self.plate_scheduler.cancel_read(key)
+                to_read.remove(i)
+        
+        crops = [vehicle_crops[i] for i in to_read]
+        if getattr(self.plate_detector, 'prefer_batch', False) or (
+                self.executor is None and hasattr(self.plate_detector, 'detect_batch')):
+            # Tất cả crop trong một lần chạy model / một batch OCR
+            readings = self.plate_detector.detect_batch(crops) if crops else []
+        elif self.executor is not None and len(crops) > 1:
+            readings = list(self.executor.map(self.plate_detector.detect, crops))
+        else:
+            readings = [self.plate_detector.detect(crop) for crop in crops]
+        readings = dict(zip(to_read, readings))
+        
+        plate_results = []
+        with self.plate_lock:
+            for i, (crop, camera_id, track_id) in enumerate(zip(vehicle_crops, camera_ids, track_ids)):
+                if track_id is None or track_id < 0:
+                    plate_result = readings[i]
+                    if plate_result:
+                        self.stats['total_plates'] += 1
+                    plate_results.append(plate_result)
+                    continue
                 
-                # Phát hiện người
-                if cls in self.config['detection']['person_classes']:
-                    if conf >= self.config['detection']['person_confidence']:
-                        detections['persons'].append({
-                            'bbox': bbox,
-                            'confidence': conf
-                        })
-                        self.stats['total_persons'] += 1
+                key = (camera_id, track_id)
+                if i in readings and self.plate_scheduler.add_reading(key, readings[i], crop.shape):
+                    fused = self.plate_scheduler.get_result(key, crop.shape)
+                    self.stats['total_plates'] += 1
+                    print(f"   ✅ Phát hiện biển số: {fused['text']} (xe #{track_id})")
+                plate_results.append(self.plate_scheduler.get_result(key, crop.shape))
+        
+        return plate_results
+    
+    def collect_ocr_results(self):
+        """
+        Gộp các kết quả đã xong từ OCR pool vào scheduler
+        
+        Xe đã hết track: chốt kết quả gộp cuối cùng và ghi vào row database của xe.
+        """
+        # Crop đã nhận nhưng bị bỏ trong pool: hoàn lại lượt OCR
+        dropped = self.ocr_pool.poll_dropped()
+        if dropped:
+            with self.plate_lock:
+                for key in dropped:
+                    self.plate_scheduler.cancel_read(key)
+        
+        for key, plate_result, crop_shape in self.ocr_pool.poll():
+            with self.plate_lock:
+                if self.plate_scheduler.add_reading(key, plate_result, crop_shape):
+                    fused = self.plate_scheduler.get_result(key, crop_shape)
+                    self.stats['total_plates'] += 1
+                    print(f"   ✅ Phát hiện biển số: {fused['text']} (xe #{key[1]})")
                 
-                # Phát hiện xe
-                elif cls in self.config['detection']['vehicle_classes']:
-                    if conf >= self.config['detection']['vehicle_confidence']:
-                        vehicle_type = self.get_vehicle_type(cls)
-                        detections['vehicles'].append({
-                            'bbox': bbox,
-                            'confidence': conf,
-                            'class': cls,
-                            'vehicle_type': vehicle_type
-                        })
-                        self.stats['total_vehicles'] += 1
-                        
-                        # Crop vùng xe để phát hiện biển số (mở rộng thêm 10% để bao gồm biển số)
-                        x1, y1, x2, y2 = map(int, bbox)
-                        h_frame, w_frame = frame.shape[:2]
-                        
-                        # Mở rộng vùng crop
-                        expand_ratio = 0.1
-                        w_box = x2 - x1
-                        h_box = y2 - y1
-                        x1_exp = max(0, int(x1 - w_box * expand_ratio))
-                        y1_exp = max(0, int(y1 - h_box * expand_ratio))
-                        x2_exp = min(w_frame, int(x2 + w_box * expand_ratio))
-                        y2_exp = min(h_frame, int(y2 + h_box * expand_ratio))
-                        
-                        vehicle_crop = frame[y1_exp:y2_exp, x1_exp:x2_exp]
-                        
-                        # Phát hiện biển số
-                        plate_result = self.plate_detector.detect(vehicle_crop)
-                        if plate_result:
-                            # Chuyển đổi tọa độ biển số từ vehicle_crop sang frame gốc
-                            plate_bbox_in_frame = None
-                            if plate_result.get('bbox'):
-                                px, py, pw, ph = plate_result['bbox']
-                                # Tọa độ trong frame gốc
-                                plate_x1 = x1_exp + px
-                                plate_y1 = y1_exp + py
-                                plate_x2 = plate_x1 + pw
-                                plate_y2 = plate_y1 + ph
-                                plate_bbox_in_frame = (plate_x1, plate_y1, plate_x2, plate_y2)
-                            
-                            detections['plates'].append({
-                                'vehicle_bbox': bbox,
-                                'plate_bbox': plate_bbox_in_frame,  # Tọa độ biển số trong frame
-                                'plate_text': plate_result['text'],
-                                'plate_confidence': plate_result['confidence']
-                            })
-                            self.stats['total_plates'] += 1
-                            print(f"   ✅ Phát hiện biển số: {plate_result['text']} ({vehicle_type})")
+                if key not in self.ended_plate_keys or self.ocr_pool.is_pending(key):
+                    continue
+                fused = self.plate_scheduler.get_result(key, crop_shape)
+                self.ended_plate_keys.discard(key)
+                self.plate_scheduler.remove(key)
+                # Row ở track_rows (store chưa xử lý frame kết thúc track) hoặc ended_rows
+                row = self.ended_rows.pop(key, None) or self.track_rows.get(key)
+            
+            if row and fused and row['plate'] != fused['text']:
+                self.update_detection_plate(row['row_id'], fused['text'], fused['confidence'])
+                row['plate'] = fused['text']
+    
+    def disable_ocr_pool(self):
+        """Tắt OCR pool bị hỏng (worker chết), từ đó OCR đồng bộ trong stage ocr"""
+        print("⚠️  Tắt OCR pool, chuyển sang OCR đồng bộ")
+        pool = self.ocr_pool
+        self.collect_ocr_results()
+        self.ocr_pool = None
+        pool.shutdown()
         
-        self.stats['last_detection'] = datetime.now()
-        return detections
+        # Xe đã hết track đang chờ kết quả từ pool: chốt với kết quả hiện có
+        with self.plate_lock:
+            ended_keys = list(self.ended_plate_keys)
+            self.ended_plate_keys.clear()
+        for key in ended_keys:
+            with self.plate_lock:
+                fused = self.plate_scheduler.get_result(key, (1, 1))
+                self.plate_scheduler.remove(key)
+                row = self.ended_rows.pop(key, None) or self.track_rows.get(key)
+            if row and fused and row['plate'] != fused['text']:
+                self.update_detection_plate(row['row_id'], fused['text'], fused['confidence'])
     
     def draw_detections(self, frame, detections):
         """Vẽ bounding boxes lên frame"""
+        show_track_id = self.config.get('dashboard', {}).get('show_tracking_id', False)
+        
         # Vẽ người
         for person in detections['persons']:
             x1, y1, x2, y2 = map(int, person['bbox'])
             cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
             label = f"Person: {person['confidence']:.2f}"
+            if show_track_id and person.get('track_id') is not None:
+                label = f"#{person['track_id']} {label}"
             cv2.putText(frame, label, (x1, y1-10),
                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
         
@@ -330,6 +1143,8 @@ class CameraAI:
             # Hiển thị loại xe và confidence
             vehicle_type = vehicle.get('vehicle_type', 'Xe')
             label = f"{vehicle_type}: {vehicle['confidence']:.2f}"
+            if show_track_id and vehicle.get('track_id') is not None:
+                label = f"#{vehicle['track_id']} {label}"
             
             # Vẽ nền cho text
             (text_w, text_h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
@@ -370,70 +1185,204 @@ class CameraAI:
         
         return frame
     
+    def frame_source(self, loop_video=False):
+        """
+        Hàm source cho pipeline: đọc frame mới từ camera thành item
+        
+        Args:
+            loop_video: Hết video file thì quay lại đầu (dashboard); camera/stream
+                bị ngắt thì luôn dừng source để nơi gọi kết nối lại
+        """
+        source = self.config['camera']['source']
+        is_video_file = isinstance(source, str) and os.path.isfile(source)
+        
+        def read_item():
+            ret, frame = self.read_frame(timeout=1.0)
+            if not ret:
+                # Stream vẫn chạy nhưng tạm chưa có frame mới -> đợi tiếp
+                if getattr(self.cap, 'is_running', False):
+                    return None
+                if loop_video and is_video_file:
+                    print("⚠️  Không đọc được frame, quay lại đầu video...")
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    return None
+                print("⚠️  Không đọc được frame")
+                raise StopIteration
+            return {
+                'frame': frame,
+                'full_frame': self.full_frame,
+                'seq': self.frame_seq,
+                'timestamp': self.frame_timestamp,
+                'camera_id': None
+            }
+        return read_item
+    
+    def build_pipeline(self, loop_video=False):
+        """
+        Tạo pipeline xử lý: capture -> infer -> ocr -> render -> (record, store, output)
+        
+        Mỗi stage có queue đầu vào giới hạn, số worker và drop policy riêng
+        (mục `pipeline` trong config), để ổ đĩa hay OCR chậm không làm nghẽn
+        capture và inference.
+        
+        Returns:
+            Pipeline (item đã render lấy bằng pipeline.get())
+        """
+        pipeline_config = self.config.get('pipeline', {})
+        options = self.stage_options()
+        
+        def make_stage(name, func):
+            return Stage(name, func, **options[name])
+        
+        pipeline = Pipeline(self.frame_source(loop_video), output_size=pipeline_config.get('output_queue_size', 2))
+        infer = pipeline.add_stage(make_stage('infer', self._stage_infer))
+        ocr = pipeline.add_stage(make_stage('ocr', self._stage_ocr), after=infer)
+        render = pipeline.add_stage(make_stage('render', self._stage_render), after=ocr)
+        if self.video_writer:
+            pipeline.add_stage(make_stage('record', self._stage_record), after=render)
+        pipeline.add_stage(make_stage('store', self._stage_store), after=render)
+        pipeline.connect_output(render)
+        self.pipeline = pipeline
+        return pipeline
+    
+    def stage_options(self):
+        """
+        Tham số của từng stage pipeline: mặc định + mục pipeline.stages trong config
+        
+        Returns:
+            Dict tên stage -> kwargs cho Stage
+        """
+        stage_config = self.config.get('pipeline', {}).get('stages', {})
+        perf_config = self.config.get('performance', {})
+        # Video file: xử lý đủ mọi frame thay vì giữ frame mới nhất
+        infer_policy = 'drop_oldest' if hasattr(self.cap, 'read_next') else 'block'
+        
+        defaults = {
+            'infer': {
+                'queue_size': 2, 'drop_policy': infer_policy, 'batched': True,
+                'batch_size': perf_config.get('max_batch_size', 1),
+                'batch_wait_ms': perf_config.get('max_batch_wait_ms', 20)
+            },
+            'ocr': {
+                'queue_size': 4, 'drop_policy': 'block', 'batched': True,
+                'batch_size': 4, 'batch_wait_ms': 10
+            },
+            'render': {'queue_size': 4, 'drop_policy': 'block'},
+            'record': {'queue_size': 30, 'drop_policy': 'drop_oldest'},
+            # Store không bỏ item: mỗi track chỉ được ghi DB ở frame đầu tiên của nó
+            'store': {'queue_size': 64, 'drop_policy': 'block'}
+        }
+        options = {}
+        for name, stage_defaults in defaults.items():
+            options[name] = dict(stage_defaults)
+            options[name].update(stage_config.get(name, {}))
+        return options
+    
+    def frame_pool_size(self):
+        """
+        Số buffer frame cho camera FFMPEG (camera.pool_size, mặc định tính từ pipeline)
+        
+        Frame capture là view vào buffer của pool (zero-copy) và được item giữ
+        từ lúc capture tới hết stage render (render bỏ frame khỏi item), nên
+        pool cần đủ cho queue + batch đang xử lý của infer/ocr/render, cộng
+        frame mới nhất của camera, frame đang chờ vào pipeline và buffer đang ghi.
+        Thiếu buffer thì frame mới bị bỏ (thống kê frames.discarded).
+        """
+        pool_size = self.config['camera'].get('pool_size')
+        if pool_size:
+            return pool_size
+        options = self.stage_options()
+        in_flight = 0
+        for name in ('infer', 'ocr', 'render'):
+            stage = options[name]
+            batch_size = stage.get('batch_size', 1) if stage.get('batched') else 1
+            in_flight += stage['queue_size'] + stage.get('workers', 1) * batch_size
+        return in_flight + 4
+    
+    def _stage_infer(self, items):
+        """Stage infer: phát hiện người/xe cho một batch item"""
+        frames = [item['frame'] for item in items]
+        camera_ids = [item['camera_id'] for item in items]
+        for item, detections in zip(items, self.detect_objects_batch(frames, camera_ids)):
+            item['detections'] = detections
+        return items
+    
+    def _stage_ocr(self, items):
+        """Stage ocr: đọc biển số (crop của cả batch frame OCR cùng lúc)"""
+        # Frame gốc chỉ cần tới đây, bỏ khỏi item để giải phóng sớm
+        full_frames = [item.pop('full_frame', None) for item in items]
+        try:
+            self.attach_plates_batch(
+                [item['frame'] for item in items],
+                [item['detections'] for item in items],
+                [item['camera_id'] for item in items],
+                [self.plate_frame(item, full_frame) for item, full_frame in zip(items, full_frames)]
+            )
+        except Exception as e:
+            # Lỗi OCR không được làm mất detections (row DB của track mới): đi tiếp không có biển số
+            print(f"❌ Lỗi đọc biển số: {e}")
+        return items
+    
+    def plate_frame(self, item, full_frame):
+        """
+        Frame để crop biển số của một item
+        
+        Camera 2 stream (DualStreamCamera): frame có xe cần đọc biển số dùng
+        frame main stream cùng thời điểm (và giữ main stream chạy); chưa có
+        frame main stream phù hợp thì dùng frame gốc như thường.
+        """
+        detections = item['detections']
+        if (not hasattr(self.cap, 'main_frame') or detections.get('carried')
+                or not detections['vehicles']):
+            return full_frame
+        self.cap.request_main()
+        main_frame = self.cap.main_frame(item['timestamp'])
+        return full_frame if main_frame is None else main_frame
+    
+    def _stage_render(self, item):
+        """Stage render: vẽ kết quả"""
+        # Sau render chỉ cần ảnh đã vẽ: bỏ frame capture để trả buffer về pool của camera
+        item['display'] = self.draw_detections(item.pop('frame').copy(), item['detections'])
+        # Độ trễ từ lúc capture tới khi render xong (gồm chờ queue, detect, OCR)
+        # -> latency controller; frame dùng lại kết quả cũ không tính
+        if item.get('timestamp') is not None and not item['detections'].get('carried'):
+            self.latency.record((time.time() - item['timestamp']) * 1000)
+        return item
+    
+    def _stage_record(self, item):
+        """Sink ghi video (annotated)"""
+        if self.video_writer:
+            self.video_writer.write(item['display'])
+    
+    def _stage_store(self, item):
+        """Sink lưu snapshot + database"""
+        self.save_detections(item['display'], item['detections'], camera_id=item['camera_id'])
+    
     def run(self, show_preview=True):
         """Chạy hệ thống detection"""
         print("▶️  Bắt đầu phát hiện...")
         self.start_recording()
+        pipeline = self.build_pipeline()
+        pipeline.start()
         
         try:
             while True:
-                ret, frame = self.cap.read()
-                if not ret:
-                    print("⚠️  Không đọc được frame")
-                    break
-                
-                # Phát hiện objects
-                detections = self.detect_frame(frame)
-                
-                # Vẽ kết quả
-                frame_display = self.draw_detections(frame.copy(), detections)
-                
-                # Ghi video
-                if self.video_writer:
-                    self.video_writer.write(frame_display)
-                
-                # Lưu snapshots nếu có detection
-                if detections['persons'] or detections['vehicles']:
-                    if self.config['recording']['save_snapshots']:
-                        snapshot_path = self.save_snapshot(
-                            frame_display, 
-                            'detection'
-                        )
-                        
-                        # Log vào database
-                        for person in detections['persons']:
-                            self.log_detection(
-                                'person',
-                                person['confidence'],
-                                person['bbox'],
-                                snapshot_path
-                            )
-                        
-                        for vehicle in detections['vehicles']:
-                            plate_text = None
-                            # Tìm biển số tương ứng
-                            for plate in detections['plates']:
-                                if np.array_equal(plate['vehicle_bbox'], vehicle['bbox']):
-                                    plate_text = plate['plate_text']
-                                    break
-                            
-                            self.log_detection(
-                                'vehicle',
-                                vehicle['confidence'],
-                                vehicle['bbox'],
-                                snapshot_path,
-                                plate_text
-                            )
+                item = pipeline.get(timeout=1.0)
+                if item is None:
+                    if pipeline.is_done():
+                        break
+                    continue
                 
                 # Hiển thị preview
                 if show_preview:
-                    cv2.imshow('Camera AI - Press Q to quit', frame_display)
+                    cv2.imshow('Camera AI - Press Q to quit', item['display'])
                     if cv2.waitKey(1) & 0xFF == ord('q'):
                         break
                 
         except KeyboardInterrupt:
             print("\n⏹️  Dừng hệ thống...")
         finally:
+            pipeline.stop()
             self.cleanup()
     
     def cleanup(self):
@@ -443,12 +1392,39 @@ class CameraAI:
                 self.cap.release()
         if self.video_writer:
             self.video_writer.release()
+        if self.stream_recorder:
+            self.stream_recorder.stop()
+            self.stream_recorder = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        if self.ocr_pool is not None:
+            self.ocr_pool.shutdown()
         cv2.destroyAllWindows()
         print("🧹 Đã dọn dẹp tài nguyên")
     
     def get_stats(self):
         """Lấy thống kê"""
-        return self.stats
+        stats = dict(self.stats)
+        stats['plate_ocr'] = self.plate_scheduler.get_stats()
+        if getattr(self.plate_detector, 'quality', None) is not None:
+            stats['plate_quality'] = self.plate_detector.quality.get_stats()
+        if getattr(self.plate_detector, 'recognizer', None) is not None:
+            stats['ocr_cascade'] = self.plate_detector.recognizer.get_stats()
+        if getattr(self.plate_detector, 'ocr_cache', None) is not None:
+            stats['ocr_cache'] = self.plate_detector.ocr_cache.get_stats()
+        if self.ocr_pool is not None:
+            stats['ocr_pool'] = self.ocr_pool.get_stats()
+        stats['latency'] = self.latency.get_stats()
+        if self.pipeline is not None:
+            stats['pipeline'] = self.pipeline.get_stats()
+        if self.motion_gates:
+            stats['motion'] = {
+                str(camera_id or 'default'): gate.get_stats()
+                for camera_id, gate in self.motion_gates.items()
+            }
+        if self.cap is not None and hasattr(self.cap, 'get_frame_stats'):
+            stats['frames'] = self.cap.get_frame_stats()
+        return stats
 
 if __name__ == '__main__':
     # Chạy camera AI
@@ -11,6 +11,7 @@ import json
 from datetime import datetime, timedelta
 from threading import Thread, Lock
 import base64
+import time
 from camera_ai import CameraAI
 
 app = Flask(__name__)
@@ -38,6 +39,33 @@ def get_db_connection():
     conn.row_factory = sqlite3.Row
     return conn
 
+def reconnect_pipeline(retry_interval=5.0):
+    """
+    Kết nối lại camera và tạo pipeline mới khi nguồn đã dừng (vd FFMPEG chết)
+    
+    Returns:
+        Pipeline đã start, hoặc None nếu camera loop bị dừng trong lúc chờ
+    """
+    if camera_system.cap is not None and hasattr(camera_system.cap, 'release'):
+        camera_system.cap.release()
+    camera_system.cap = None
+    
+    while is_running:
+        print(f"⚠️  Nguồn camera đã dừng, kết nối lại sau {retry_interval:.0f} giây...")
+        time.sleep(retry_interval)
+        if not is_running:
+            break
+        try:
+            camera_system.setup_camera()
+        except Exception as e:
+            print(f"❌ Kết nối lại camera thất bại: {e}")
+            continue
+        pipeline = camera_system.build_pipeline(loop_video=True)
+        pipeline.start()
+        print("✅ Đã kết nối lại camera")
+        return pipeline
+    return None
+
 def camera_loop():
     """Vòng lặp chạy camera detection"""
     global camera_system, latest_frame, is_running
@@ -48,80 +76,40 @@ def camera_loop():
     print("📹 Camera loop bắt đầu...")
     camera_system.start_recording()
     
+    pipeline = camera_system.build_pipeline(loop_video=True)
+    pipeline.start()
+    
     frame_count = 0
     try:
         while is_running:
-            ret, frame = camera_system.cap.read()
-            if not ret:
-                print("⚠️  Không đọc được frame, quay lại đầu video...")
-                # Quay lại đầu video
-                camera_system.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            item = pipeline.get(timeout=1.0)
+            if item is None:
+                if pipeline.is_done():
+                    # Giống run(): nguồn đã hết -> dừng pipeline, rồi kết nối lại
+                    pipeline.stop()
+                    pipeline = reconnect_pipeline()
+                    if pipeline is None:
+                        break
                 continue
             
+            detections = item['detections']
             frame_count += 1
             if frame_count % 30 == 0:  # Log mỗi 30 frames
                 print(f"📹 Đã xử lý {frame_count} frames...")
-            
-            # Phát hiện objects
-            detections = camera_system.detect_frame(frame)
-            
-            # Vẽ kết quả
-            frame_display = camera_system.draw_detections(frame.copy(), detections)
+                if detections['persons'] or detections['vehicles']:
+                    print(f"   → Phát hiện: {len(detections['persons'])} người, {len(detections['vehicles'])} xe, {len(detections['plates'])} biển số")
+                    for plate in detections['plates']:
+                        print(f"   🚗 Biển số: {plate['plate_text']}")
             
             # Lưu frame mới nhất
             with camera_lock:
-                latest_frame = frame_display.copy()
-            
-            # Ghi video
-            if camera_system.video_writer:
-                camera_system.video_writer.write(frame_display)
-            
-            # Lưu snapshots và log
-            if detections['persons'] or detections['vehicles']:
-                if frame_count % 30 == 0:  # Log mỗi 30 frames
-                    print(f"   → Phát hiện: {len(detections['persons'])} người, {len(detections['vehicles'])} xe, {len(detections['plates'])} biển số")
-                
-                if config['recording']['save_snapshots']:
-                    snapshot_path = camera_system.save_snapshot(
-                        frame_display,
-                        'detection'
-                    )
-                    
-                    # Log detections
-                    for person in detections['persons']:
-                        camera_system.log_detection(
-                            'person',
-                            person['confidence'],
-                            person['bbox'],
-                            snapshot_path
-                        )
-                    
-                    # Tạo map biển số theo vehicle bbox
-                    plate_map = {}
-                    for plate in detections['plates']:
-                        veh_bbox_str = str(plate['vehicle_bbox'])
-                        plate_map[veh_bbox_str] = plate['plate_text']
-                        if frame_count % 30 == 0:
-                            print(f"   🚗 Biển số: {plate['plate_text']}")
-                    
-                    for vehicle in detections['vehicles']:
-                        # Tìm biển số tương ứng với xe này
-                        veh_bbox_str = str(vehicle['bbox'])
-                        plate_text = plate_map.get(veh_bbox_str, None)
-                        vehicle_type = vehicle.get('vehicle_type', None)
-                        
-                        camera_system.log_detection(
-                            'vehicle',
-                            vehicle['confidence'],
-                            vehicle['bbox'],
-                            snapshot_path,
-                            plate_text,
-                            vehicle_type
-                        )
+                latest_frame = item['display']
     
     except Exception as e:
         print(f"❌ Lỗi camera loop: {e}")
     finally:
+        if pipeline is not None:
+            pipeline.stop()
         if camera_system:
             camera_system.cleanup()
         is_running = False
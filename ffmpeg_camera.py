@@ -8,11 +8,13 @@ import numpy as np
 import threading
 import queue
 import time
+from collections import deque
+from frame_pool import FramePool, FrameSequencer, readinto_exact
 
 class FFMPEGCamera:
     """Camera RTSP qua FFMPEG"""
     
-    def __init__(self, rtsp_url, width=1280, height=720, fps=25):
+    def __init__(self, rtsp_url, width=1280, height=720, fps=25, pool_size=4, history=0):
         """
         Khởi tạo FFMPEG Camera
         
@@ -21,17 +23,28 @@ class FFMPEGCamera:
             width: Độ rộng (có thể resize)
             height: Độ cao (có thể resize)
             fps: FPS mong muốn
+            pool_size: Số buffer frame cấp phát sẵn (zero-copy)
+            history: Số frame gần nhất giữ lại kèm timestamp (cho frame_at);
+                mỗi frame giữ một buffer nên pool_size phải lớn hơn history
         """
         self.rtsp_url = rtsp_url
         self.width = width
         self.height = height
         self.fps = fps
+        self.pool_size = pool_size
+        self.history = deque(maxlen=history) if history else None
         
         self.process = None
         self.frame_queue = queue.Queue(maxsize=2)
         self.is_running = False
         self.current_frame = None
         self.frame_lock = threading.Lock()
+        self.pool = None
+        
+        # Số thứ tự + timestamp của frame
+        self.sequencer = FrameSequencer()
+        self.frame_seq = 0
+        self.frame_timestamp = None
         
         print(f"📹 FFMPEG Camera: {rtsp_url}")
         print(f"   Resolution: {width}x{height}")
@@ -135,7 +148,7 @@ class FFMPEGCamera:
                 pass
     
     def _read_frames(self):
-        """Thread đọc frames từ FFMPEG"""
+        """Thread đọc frames từ FFMPEG (ghi thẳng vào buffer của FramePool)"""
         # Đợi một chút để stderr thread detect resolution
         time.sleep(1)
         
@@ -143,54 +156,67 @@ class FFMPEGCamera:
         frame_size = self.width * self.height * 3
         print(f"   📐 Frame size: {self.width}x{self.height} = {frame_size} bytes")
         
+        # Cấp phát trước các buffer, không cấp phát/copy trong vòng lặp
+        self.pool = FramePool(self.width, self.height, size=self.pool_size)
+        max_sum = self.width * self.height * 3 * 255 * 0.99
+        
         first_frame = True
         
         while self.is_running and self.process:
+            index = None
             try:
-                # Đọc raw frame từ stdout
-                raw_frame = self.process.stdout.read(frame_size)
+                # Đọc raw frame từ stdout thẳng vào buffer (không tạo bytes mới)
+                index, buf = self.pool.acquire()
+                n = readinto_exact(self.process.stdout, buf)
                 
-                if len(raw_frame) == 0:
+                if n < frame_size:
+                    self.pool.release(index)
+                    index = None
+                    if n == 0 or self.process.poll() is not None:
+                        # EOF / FFMPEG đã thoát -> stream kết thúc, báo cho consumer
+                        if self.is_running:
+                            print("⚠️  FFMPEG stream đã kết thúc")
+                        self.is_running = False
+                        break
+                    # Frame không đủ -> bỏ qua
                     if self.is_running:
                         time.sleep(0.1)
                     continue
                 
-                if len(raw_frame) < frame_size:
-                    # Frame không đủ, đợi thêm data
-                    if first_frame:
-                        # Đợi thêm data cho frame đầu tiên
-                        remaining = frame_size - len(raw_frame)
-                        additional = self.process.stdout.read(remaining)
-                        if len(additional) > 0:
-                            raw_frame += additional
-                        else:
-                            time.sleep(0.1)
-                            continue
-                    else:
-                        # Bỏ qua frame không đủ (có thể bị mất một phần)
-                        continue
+                if index is None:
+                    # Mọi buffer đều đang được consumer giữ -> bỏ frame này
+                    self.pool.discard()
+                    if self.pool.frames_discarded == 1:
+                        print(f"⚠️  Hết buffer frame (pool_size={self.pool_size}), bỏ frame mới "
+                              f"cho tới khi consumer trả buffer (xem frames.discarded)")
+                    continue
                 
-                # Convert sang numpy array
-                frame_data = raw_frame[:frame_size]
-                frame = np.frombuffer(frame_data, dtype=np.uint8)
-                frame = frame.reshape((self.height, self.width, 3))
+                frame = self.pool.publish(index)
+                index = None
                 
                 # Kiểm tra frame hợp lệ (không phải toàn 0 hoặc toàn 255)
-                if frame.sum() > 0 and frame.sum() < self.width * self.height * 3 * 255 * 0.99:
-                    # Lưu frame mới nhất
+                frame_sum = frame.sum()
+                if frame_sum > 0 and frame_sum < max_sum:
+                    # Lưu frame mới nhất (view chỉ-đọc, không copy)
+                    timestamp = time.time()
                     with self.frame_lock:
-                        self.current_frame = frame.copy()
+                        self.current_frame = frame
+                    if self.history is not None:
+                        self.history.append((timestamp, frame))
+                    self.sequencer.publish(frame, timestamp=timestamp)
                     
                     if first_frame:
                         print(f"   ✅ Đã nhận được frame đầu tiên!")
                         first_frame = False
                 else:
-                    # Frame không hợp lệ, bỏ qua
+                    # Frame không hợp lệ, bỏ qua (buffer tự trả về pool)
+                    del frame
                     if first_frame:
                         time.sleep(0.1)
                         continue
                 
             except Exception as e:
+                self.pool.release(index)
                 if self.is_running:
                     print(f"⚠️  Lỗi đọc frame: {e}")
                     import traceback
@@ -201,15 +227,64 @@ class FFMPEGCamera:
         """
         Đọc frame hiện tại (tương thích với cv2.VideoCapture)
         
+        Frame trả về là view chỉ-đọc trỏ vào buffer của pool (không copy).
+        Buffer được giữ cho tới khi consumer bỏ mọi tham chiếu tới frame;
+        cần vẽ lên frame thì dùng frame.copy(). Có thể trả lại frame đã đọc
+        nếu chưa có frame mới (xem read_next).
+        
         Returns:
             ret: True nếu có frame
-            frame: Frame hiện tại
+            frame: Frame hiện tại (read-only)
         """
-        with self.frame_lock:
-            if self.current_frame is not None:
-                return True, self.current_frame.copy()
-            else:
-                return False, None
+        frame, seq, timestamp = self.sequencer.latest()
+        if frame is None:
+            return False, None
+        self.frame_seq = seq
+        self.frame_timestamp = timestamp
+        return True, frame
+    
+    def read_next(self, timeout=1.0):
+        """
+        Chờ và đọc frame MỚI (chưa từng được trả về)
+        
+        Args:
+            timeout: Thời gian chờ tối đa (giây)
+        
+        Returns:
+            ret: True nếu có frame mới trong thời gian chờ
+            frame: Frame mới (read-only); frame_seq/frame_timestamp được cập nhật
+        """
+        frame, seq, timestamp = self.sequencer.wait_next(timeout=timeout)
+        if frame is None:
+            return False, None
+        self.frame_seq = seq
+        self.frame_timestamp = timestamp
+        return True, frame
+    
+    def frame_at(self, timestamp, max_offset=None):
+        """
+        Frame trong history có timestamp gần timestamp nhất
+        
+        Args:
+            timestamp: Thời điểm cần lấy frame
+            max_offset: Lệch tối đa (giây), None = không giới hạn
+        
+        Returns:
+            (frame, timestamp của frame) hoặc (None, None)
+        """
+        if not self.history:
+            return None, None
+        frame_time, frame = min(list(self.history), key=lambda item: abs(item[0] - timestamp))
+        if max_offset is not None and abs(frame_time - timestamp) > max_offset:
+            return None, None
+        return frame, frame_time
+    
+    def get_frame_stats(self):
+        """Thống kê frame: đã capture, bị bỏ, bị đọc lặp lại"""
+        stats = self.sequencer.get_stats()
+        if self.pool:
+            stats['discarded'] = self.pool.frames_discarded
+        return stats
     
     def isOpened(self):
         """Kiểm tra camera có mở không"""
@@ -249,6 +324,178 @@ class FFMPEGCamera:
             return self.fps
         return 0
 
+class DualStreamCamera:
+    """
+    Hai RTSP stream của cùng một camera (Dahua/Imou): substream (subtype=1)
+    cho detection, main stream (subtype=0) để crop biển số
+    
+    Substream được đọc liên tục như FFMPEGCamera. Main stream chỉ được decode
+    khi có xe (request_main) và tự dừng sau idle_timeout giây không có yêu
+    cầu. Frame main stream được giữ trong ring buffer kèm timestamp, main_frame()
+    trả về frame gần thời điểm của frame substream nhất.
+    """
+    
+    def __init__(self, rtsp_url, main_url, width=1280, height=720, fps=25, pool_size=4,
+                 main_width=2560, main_height=1440, idle_timeout=3.0, max_offset=0.2,
+                 main_delay=0.0, history=5, wait_ms=80, retry_interval=10.0):
+        """
+        Args:
+            rtsp_url: RTSP URL substream
+            main_url: RTSP URL main stream
+            width, height, fps, pool_size: Như FFMPEGCamera (substream)
+            main_width, main_height: Độ phân giải main stream
+            idle_timeout: Số giây không có xe thì dừng decode main stream
+            max_offset: Lệch timestamp tối đa giữa frame hai stream (giây)
+            main_delay: Main stream đến chậm hơn substream bao nhiêu giây
+            history: Số frame main stream giữ trong ring buffer
+            wait_ms: Thời gian chờ tối đa để main stream có frame tới thời điểm cần
+            retry_interval: Main stream không kết nối được thì chờ bao lâu mới thử lại
+        """
+        self.sub = FFMPEGCamera(rtsp_url, width=width, height=height, fps=fps, pool_size=pool_size)
+        self.main_url = main_url
+        self.main_width = main_width
+        self.main_height = main_height
+        self.fps = fps
+        self.idle_timeout = idle_timeout
+        self.max_offset = max_offset
+        self.main_delay = main_delay
+        self.history = max(1, history)
+        self.wait = wait_ms / 1000.0
+        self.retry_interval = retry_interval
+        
+        self.main = None
+        self.main_lock = threading.Lock()
+        self.last_request = 0.0
+        self.retry_at = 0.0
+        self.stats = {'main_starts': 0, 'main_stops': 0, 'aligned': 0, 'missed': 0}
+        
+        print(f"   Main stream (khi có xe): {main_url} {main_width}x{main_height}")
+    
+    @property
+    def is_running(self):
+        return self.sub.is_running
+    
+    @property
+    def frame_seq(self):
+        return self.sub.frame_seq
+    
+    @property
+    def frame_timestamp(self):
+        return self.sub.frame_timestamp
+    
+    @property
+    def width(self):
+        return self.sub.width
+    
+    @property
+    def height(self):
+        return self.sub.height
+    
+    def start(self):
+        """Bắt đầu đọc substream (main stream chỉ chạy khi có xe)"""
+        return self.sub.start()
+    
+    def read(self):
+        """Đọc frame substream hiện tại (xem FFMPEGCamera.read)"""
+        self._check_idle()
+        return self.sub.read()
+    
+    def read_next(self, timeout=1.0):
+        """Chờ và đọc frame substream MỚI (xem FFMPEGCamera.read_next)"""
+        self._check_idle()
+        return self.sub.read_next(timeout=timeout)
+    
+    def request_main(self):
+        """Báo đang có xe: giữ main stream chạy (khởi động nền nếu chưa chạy)"""
+        now = time.time()
+        self.last_request = now
+        with self.main_lock:
+            if self.main is not None or now < self.retry_at:
+                return
+            # Mỗi frame trong ring buffer giữ một buffer của pool
+            self.main = FFMPEGCamera(self.main_url, width=self.main_width, height=self.main_height,
+                                     fps=self.fps, pool_size=self.history + 3, history=self.history)
+            self.stats['main_starts'] += 1
+            main = self.main
+        # start() chờ frame đầu tiên (tối đa 10 giây), không chặn luồng detection
+        threading.Thread(target=self._start_main, args=(main,), daemon=True).start()
+    
+    def _start_main(self, main):
+        if main.start():
+            return
+        with self.main_lock:
+            if self.main is main:
+                self.main = None
+                self.retry_at = time.time() + self.retry_interval
+                print(f"⚠️  Main stream không kết nối được, thử lại sau {self.retry_interval:.0f}s")
+        main.release()
+    
+    def _check_idle(self):
+        """Dừng main stream khi đã idle_timeout giây không có xe"""
+        if self.main is None or time.time() - self.last_request <= self.idle_timeout:
+            return
+        with self.main_lock:
+            main, self.main = self.main, None
+        if main is not None:
+            self.stats['main_stops'] += 1
+            # release() chờ FFMPEG thoát, không chặn luồng đọc substream
+            threading.Thread(target=main.release, daemon=True).start()
+    
+    def main_frame(self, timestamp):
+        """
+        Frame main stream cùng thời điểm với frame substream
+        
+        Args:
+            timestamp: frame_timestamp của frame substream
+        
+        Returns:
+            Frame main stream (read-only) hoặc None nếu main stream chưa chạy
+            hoặc không có frame lệch dưới max_offset
+        """
+        main = self.main
+        if main is None or timestamp is None or not main.isOpened():
+            return None
+        
+        target = timestamp + self.main_delay
+        deadline = time.time() + self.wait
+        # Main stream chưa có frame tới thời điểm cần -> chờ thêm một chút
+        while (not main.history or main.history[-1][0] < target) and time.time() < deadline:
+            main.sequencer.wait_next(timeout=max(0.0, deadline - time.time()))
+        
+        frame, _ = main.frame_at(target, self.max_offset)
+        self.stats['aligned' if frame is not None else 'missed'] += 1
+        return frame
+    
+    def get_frame_stats(self):
+        """Thống kê frame substream + main stream (số lần bật/tắt, ghép được / trượt)"""
+        stats = self.sub.get_frame_stats()
+        stats['main'] = dict(self.stats)
+        main = self.main
+        if main is not None:
+            stats['main'].update(main.get_frame_stats())
+        return stats
+    
+    def isOpened(self):
+        """Kiểm tra substream có mở không"""
+        return self.sub.isOpened()
+    
+    def release(self):
+        """Giải phóng cả hai stream"""
+        with self.main_lock:
+            main, self.main = self.main, None
+        if main is not None:
+            main.release()
+        self.sub.release()
+    
+    def set(self, prop_id, value):
+        """Giả lập set property"""
+        pass
+    
+    def get(self, prop_id):
+        """Giả lập get property (substream)"""
+        return self.sub.get(prop_id)
+
+
 def test_ffmpeg_camera(rtsp_url):
     """Test FFMPEG camera"""
     print("=" * 70)
@@ -272,6 +519,8 @@ def test_ffmpeg_camera(rtsp_url):
                     frame_count += 1
                     elapsed = time.time() - start_time
                     
+                    # Frame là read-only, copy trước khi vẽ
+                    frame = frame.copy()
                     if elapsed > 0:
                         fps = frame_count / elapsed
                         cv2.putText(frame, f"FPS: {fps:.1f} | Frames: {frame_count}", 
@@ -0,0 +1,194 @@
+"""
+Frame Pool Module
+Bộ đệm frame cấp phát trước (zero-copy) cho các camera đọc raw video
+và bộ đánh số thứ tự frame dùng chung cho các capture class
+"""
+import threading
+import time
+import weakref
+from collections import deque
+
+import numpy as np
+
+
+class FramePool:
+    """
+    Pool các buffer frame cấp phát sẵn.
+
+    Reader ghi thẳng dữ liệu vào buffer qua memoryview (readinto), sau đó
+    publish() trả về một view numpy chỉ-đọc trỏ vào buffer đó. Buffer chỉ
+    được tái sử dụng khi mọi tham chiếu tới view (và các slice/crop của nó)
+    đã được giải phóng - việc đếm tham chiếu dựa vào refcount của Python.
+    """
+
+    def __init__(self, width, height, channels=3, size=4):
+        """
+        Args:
+            width: Độ rộng frame
+            height: Độ cao frame
+            channels: Số kênh màu (bgr24 = 3)
+            size: Số buffer trong pool
+        """
+        self.shape = (height, width, channels)
+        self.frame_size = width * height * channels
+        self.size = size
+
+        self._buffers = [bytearray(self.frame_size) for _ in range(size)]
+        self._views = [memoryview(buf) for buf in self._buffers]
+        self._free = deque(range(size))
+
+        # Buffer tạm để xả dữ liệu khi mọi buffer đều đang được dùng
+        self._scratch = memoryview(bytearray(self.frame_size))
+
+        # Thống kê
+        self.frames_published = 0
+        self.frames_discarded = 0
+
+    def acquire(self):
+        """
+        Lấy một buffer rảnh để ghi frame mới
+
+        Returns:
+            (index, memoryview) - index = None nếu pool đã hết buffer rảnh
+            (khi đó memoryview là buffer tạm, frame sẽ bị bỏ qua)
+        """
+        try:
+            index = self._free.popleft()
+        except IndexError:
+            return None, self._scratch
+        return index, self._views[index]
+
+    def release(self, index):
+        """Trả buffer về pool mà không publish (frame lỗi/không đủ)"""
+        if index is not None:
+            self._free.append(index)
+
+    def publish(self, index):
+        """
+        Tạo view numpy chỉ-đọc cho buffer đã ghi xong
+
+        Returns:
+            np.ndarray (height, width, channels) không sở hữu dữ liệu
+        """
+        frame = np.ndarray(self.shape, dtype=np.uint8, buffer=self._views[index])
+        frame.flags.writeable = False
+        # Khi view (và mọi slice của nó) bị thu hồi -> trả buffer về pool
+        weakref.finalize(frame, self._free.append, index)
+        self.frames_published += 1
+        return frame
+
+    def discard(self):
+        """Đếm frame bị bỏ do không còn buffer rảnh"""
+        self.frames_discarded += 1
+
+    def free_count(self):
+        """Số buffer đang rảnh"""
+        return len(self._free)
+
+
+def readinto_exact(stream, view):
+    """
+    Đọc đủ len(view) bytes từ stream vào view
+
+    Returns:
+        Số bytes đã đọc (nhỏ hơn len(view) nếu gặp EOF)
+    """
+    total = len(view)
+    filled = 0
+    while filled < total:
+        n = stream.readinto(view[filled:])
+        if not n:
+            break
+        filled += n
+    return filled
+
+
+class FrameSequencer:
+    """
+    Giữ frame mới nhất kèm số thứ tự (tăng đơn điệu) và thời điểm capture.
+
+    Capture thread gọi publish() cho mỗi frame mới; consumer dùng latest()
+    (không chờ, có thể trả lại frame cũ) hoặc wait_next() (chờ tới khi có
+    frame thật sự mới). Đồng thời đếm số frame bị bỏ (bị ghi đè trước khi
+    được đọc) và số lần đọc lặp lại cùng một frame.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._timestamp = None
+        self._last_read_seq = 0
+
+        # Thống kê
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.frames_repeated = 0
+
+    def publish(self, frame, timestamp=None):
+        """
+        Đăng frame mới
+
+        Args:
+            frame: Frame vừa capture
+            timestamp: Thời điểm capture (mặc định time.time())
+
+        Returns:
+            Số thứ tự của frame
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        with self._cond:
+            # Frame trước chưa ai đọc mà đã bị thay -> tính là dropped
+            if self._frame is not None and self._seq > self._last_read_seq:
+                self.frames_dropped += 1
+            self._frame = frame
+            self._seq += 1
+            self._timestamp = timestamp
+            self.frames_captured += 1
+            self._cond.notify_all()
+            return self._seq
+
+    def latest(self):
+        """
+        Lấy frame mới nhất ngay lập tức
+
+        Returns:
+            (frame, seq, timestamp) - frame = None nếu chưa có frame nào
+        """
+        with self._cond:
+            if self._frame is None:
+                return None, 0, None
+            if self._seq == self._last_read_seq:
+                self.frames_repeated += 1
+            self._last_read_seq = self._seq
+            return self._frame, self._seq, self._timestamp
+
+    def wait_next(self, after_seq=None, timeout=None):
+        """
+        Chờ tới khi có frame có số thứ tự lớn hơn after_seq
+
+        Args:
+            after_seq: Số thứ tự đã xử lý (mặc định: frame đọc gần nhất)
+            timeout: Thời gian chờ tối đa (giây), None = chờ mãi
+
+        Returns:
+            (frame, seq, timestamp) - frame = None nếu hết thời gian chờ
+        """
+        with self._cond:
+            if after_seq is None:
+                after_seq = self._last_read_seq
+            if not self._cond.wait_for(lambda: self._seq > after_seq, timeout):
+                return None, after_seq, None
+            self._last_read_seq = self._seq
+            return self._frame, self._seq, self._timestamp
+
+    def get_stats(self):
+        """Lấy thống kê frame"""
+        with self._cond:
+            return {
+                'seq': self._seq,
+                'captured': self.frames_captured,
+                'dropped': self.frames_dropped,
+                'repeated': self.frames_repeated
+            }
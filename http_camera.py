@@ -7,6 +7,7 @@ import requests
 import numpy as np
 import time
 import threading
+from frame_pool import FrameSequencer
 from urllib.parse import urlparse
 from requests.auth import HTTPBasicAuth, HTTPDigestAuth
 
@@ -54,6 +55,11 @@ class HTTPCamera:
         self.is_running = False
         self.read_thread = None
         
+        # Số thứ tự + timestamp của frame
+        self.sequencer = FrameSequencer()
+        self.frame_seq = 0
+        self.frame_timestamp = None
+        
         # Stats
         self.frame_count = 0
         self.last_update = time.time()
@@ -134,6 +140,7 @@ class HTTPCamera:
             if frame is not None:
                 with self.frame_lock:
                     self.current_frame = frame.copy()
+                self.sequencer.publish(frame, timestamp=start_time)
                 self.frame_count += 1
                 self.last_update = time.time()
             else:
@@ -150,15 +157,40 @@ class HTTPCamera:
         """
         Đọc frame hiện tại (tương thích với cv2.VideoCapture)
         
+        Có thể trả lại snapshot đã đọc nếu chưa có snapshot mới (xem read_next).
+        
         Returns:
             ret: True nếu có frame
             frame: Frame hiện tại
         """
-        with self.frame_lock:
-            if self.current_frame is not None:
-                return True, self.current_frame.copy()
-            else:
-                return False, None
+        frame, seq, timestamp = self.sequencer.latest()
+        if frame is None:
+            return False, None
+        self.frame_seq = seq
+        self.frame_timestamp = timestamp
+        return True, frame.copy()
+    
+    def read_next(self, timeout=1.0):
+        """
+        Chờ và đọc snapshot MỚI (chưa từng được trả về)
+        
+        Args:
+            timeout: Thời gian chờ tối đa (giây)
+        
+        Returns:
+            ret: True nếu có frame mới trong thời gian chờ
+            frame: Frame mới; frame_seq/frame_timestamp được cập nhật
+        """
+        frame, seq, timestamp = self.sequencer.wait_next(timeout=timeout)
+        if frame is None:
+            return False, None
+        self.frame_seq = seq
+        self.frame_timestamp = timestamp
+        return True, frame.copy()
+    
+    def get_frame_stats(self):
+        """Thống kê frame: đã capture, bị bỏ, bị đọc lặp lại"""
+        return self.sequencer.get_stats()
     
     def isOpened(self):
         """Kiểm tra camera có mở không"""
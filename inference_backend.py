@@ -0,0 +1,124 @@
+"""
+Inference Backend Module
+Chọn runtime chạy YOLO: PyTorch, ONNX Runtime hoặc OpenVINO (export từ .pt và cache lại)
+"""
+import hashlib
+import os
+import shutil
+from pathlib import Path
+
+from ultralytics import YOLO
+
+# Backend -> format export của ultralytics
+EXPORT_FORMATS = {
+    'onnx': 'onnx',
+    'openvino': 'openvino'
+}
+
+DEFAULT_CACHE_DIR = os.path.join('models', 'cache')
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """Hash SHA-256 (12 ký tự đầu) nội dung file model"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def _cache_key(model_path, imgsz):
+    """Key cache: tên model + hash nội dung + input size"""
+    return f"{Path(model_path).stem}_{file_hash(model_path)}_{imgsz}"
+
+
+def get_int8_path(model_path, imgsz, cache_dir=DEFAULT_CACHE_DIR):
+    """Đường dẫn model ONNX INT8 (tạo bởi quantize_models.py)"""
+    return os.path.join(cache_dir, f"{_cache_key(model_path, imgsz)}_int8.onnx")
+
+
+def get_cache_path(model_path, backend, imgsz, cache_dir=DEFAULT_CACHE_DIR, dynamic=False):
+    """
+    Đường dẫn model đã export trong cache
+
+    Key cache gồm tên model + hash nội dung + input size (+ dynamic batch),
+    nên đổi file .pt hoặc imgsz sẽ tự export lại.
+    """
+    key = _cache_key(model_path, imgsz)
+    if dynamic:
+        key += '_dyn'
+    if backend == 'onnx':
+        return os.path.join(cache_dir, f"{key}.onnx")
+    return os.path.join(cache_dir, f"{key}_openvino_model")
+
+
+def export_cached(model, model_path, backend, imgsz, cache_dir=DEFAULT_CACHE_DIR, dynamic=False):
+    """
+    Export model PyTorch sang ONNX/OpenVINO (chỉ lần đầu) và trả về đường dẫn trong cache
+
+    Args:
+        model: YOLO model đã load từ model_path
+        model_path: File .pt gốc (dùng để tính hash)
+        backend: 'onnx' hoặc 'openvino'
+        imgsz: Input size khi export
+        cache_dir: Thư mục cache
+        dynamic: Export với batch/kích thước động (cần cho batch inference)
+    """
+    cache_path = get_cache_path(model_path, backend, imgsz, cache_dir, dynamic)
+    if os.path.exists(cache_path):
+        return cache_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    print(f"⚙️  Đang export {Path(model_path).name} sang {backend} (imgsz={imgsz}, chỉ chạy lần đầu)...")
+    exported = model.export(format=EXPORT_FORMATS[backend], imgsz=imgsz, dynamic=dynamic)
+    shutil.move(str(exported), cache_path)
+    print(f"✅ Đã cache model: {cache_path}")
+    return cache_path
+
+
+def load_model(model_path, backend='torch', imgsz=640, cache_dir=DEFAULT_CACHE_DIR, dynamic=False,
+               precision='fp32'):
+    """
+    Load YOLO model với backend đã chọn
+
+    Model ONNX/OpenVINO vẫn chạy qua ultralytics nên tiền xử lý, NMS và
+    decode box giống hệt đường PyTorch.
+
+    Args:
+        model_path: File .pt (hoặc tên model để ultralytics tự tải)
+        backend: 'torch', 'onnx' hoặc 'openvino'
+        imgsz: Input size
+        cache_dir: Thư mục cache model đã export
+        dynamic: Export với batch động
+        precision: 'fp32' hoặc 'int8' (dùng model INT8 từ quantize_models.py,
+            chạy bằng ONNX Runtime)
+
+    Returns:
+        YOLO model (lỗi export -> fallback về PyTorch)
+    """
+    model = YOLO(model_path)
+
+    # ckpt_path: file .pt thực tế (kể cả khi ultralytics vừa tự tải về)
+    source_path = getattr(model, 'ckpt_path', None) or model_path
+
+    if precision == 'int8':
+        int8_path = get_int8_path(source_path, imgsz, cache_dir)
+        if os.path.exists(int8_path):
+            print(f"🚀 Inference backend: onnx INT8 ({int8_path})")
+            return YOLO(int8_path, task='detect')
+        print(f"⚠️  Chưa có model INT8 {int8_path} (chạy: python quantize_models.py), dùng FP32")
+
+    backend = (backend or 'torch').lower()
+    if backend in ('torch', 'pytorch'):
+        return model
+    if backend not in EXPORT_FORMATS:
+        print(f"⚠️  Backend không hỗ trợ: {backend}, dùng PyTorch")
+        return model
+
+    try:
+        exported_path = export_cached(model, source_path, backend, imgsz, cache_dir, dynamic)
+        print(f"🚀 Inference backend: {backend} ({exported_path})")
+        return YOLO(exported_path, task='detect')
+    except Exception as e:
+        print(f"⚠️  Không dùng được backend {backend}: {e} -> dùng PyTorch")
+        return model
@@ -1,45 +1,332 @@
 """
 Module phát hiện và đọc biển số xe
 """
-import cv2
-import numpy as np
 import re
+import threading
+from collections import Counter, deque
 from typing import Optional, Dict
 
+import cv2
+import numpy as np
+
+from box_utils import box_iou
+from ocr_engines import create_engine
+from plate_cache import create_ocr_cache
+
+
+class PlateQualityScorer:
+    """
+    Chấm điểm chất lượng crop biển số (0..1) trước khi OCR
+    
+    Mỗi thành phần nằm trong 0..1, tính trên ảnh xám thu nhỏ về sample_height:
+    - size: kích thước vùng biển số so với min_width x min_height
+    - sharpness: độ nét theo hướng kém nhất (đạo hàm bậc 2 theo x và y, chia cho độ
+      tương phản), nên cả ảnh mờ lẫn mờ do chuyển động theo một hướng đều bị điểm thấp
+    - contrast: khoảng độ sáng p5..p95
+    - exposure: tỷ lệ pixel cháy sáng / quá tối
+    - aspect: tỷ lệ rộng / cao (nhìn quá nghiêng -> biển số bị ép hẹp)
+    
+    Điểm = tích các thành phần: chỉ cần một thành phần kém là crop bị loại.
+    Phân bố điểm được in định kỳ (log_interval crop) để chỉnh ngưỡng.
+    """
+    
+    def __init__(self, min_score=0.35, min_width=48, min_height=16, sample_height=32,
+                 sharpness_ref=0.45, contrast_ref=0.3, min_aspect=1.0, max_aspect=7.0,
+                 log_interval=500):
+        """
+        Args:
+            min_score: Điểm tối thiểu để crop được OCR
+            min_width, min_height: Kích thước biển số (pixel gốc) đạt điểm size tối đa
+            sample_height: Chiều cao ảnh xám dùng để tính điểm
+            sharpness_ref: Độ nét đạt điểm tối đa
+            contrast_ref: Độ tương phản (p95 - p5) / 255 đạt điểm tối đa
+            min_aspect, max_aspect: Khoảng tỷ lệ rộng / cao hợp lệ của biển số
+            log_interval: In phân bố điểm sau mỗi bấy nhiêu crop (0 = không in)
+        """
+        self.min_score = min_score
+        self.min_width = min_width
+        self.min_height = min_height
+        self.sample_height = sample_height
+        self.sharpness_ref = sharpness_ref
+        self.contrast_ref = contrast_ref
+        self.min_aspect = min_aspect
+        self.max_aspect = max_aspect
+        self.log_interval = log_interval
+        
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=2000)  # Điểm các crop gần nhất (để tính phân vị)
+        self.histogram = [0] * 10  # Số crop theo khoảng điểm 0.0-0.1, ..., 0.9-1.0
+        self.reasons = Counter()  # Thành phần kém nhất của các crop bị loại
+        self.stats = {'scored': 0, 'rejected': 0}
+    
+    def measure(self, img, size=None, full_crop=False):
+        """
+        Tính từng thành phần chất lượng
+        
+        Args:
+            img: Ảnh biển số (hoặc ảnh xe khi full_crop)
+            size: (w, h) vùng biển số trong ảnh gốc (None = kích thước img),
+                dùng khi img đã được nắn / phóng to
+            full_crop: True -> ảnh cả xe, bỏ qua size và aspect
+        
+        Returns:
+            Dict thành phần -> 0..1
+        """
+        h, w = img.shape[:2]
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        width = max(1, int(round(w * self.sample_height / float(h))))
+        gray = cv2.resize(gray, (width, self.sample_height),
+                          interpolation=cv2.INTER_AREA if h > self.sample_height else cv2.INTER_LINEAR)
+        
+        low, high = np.percentile(gray, (5, 95))
+        spread = float(high - low)
+        clipped = np.count_nonzero((gray >= 250) | (gray <= 5)) / float(gray.size)
+        sharpness = float(np.sqrt(min(
+            cv2.Sobel(gray, cv2.CV_32F, 2, 0, ksize=3).var(),
+            cv2.Sobel(gray, cv2.CV_32F, 0, 2, ksize=3).var()
+        ))) / (spread + 1.0)
+        
+        components = {
+            'sharpness': min(1.0, sharpness / self.sharpness_ref),
+            'contrast': min(1.0, spread / 255.0 / self.contrast_ref),
+            # Nền biển số trắng nên cho phép tới một nửa số pixel bị cắt
+            'exposure': min(1.0, max(0.0, 1.0 - (clipped - 0.5) / 0.5))
+        }
+        if not full_crop:
+            w, h = size if size is not None else (w, h)
+            aspect = w / float(max(h, 1))
+            components['size'] = min(1.0, w / float(self.min_width)) * min(1.0, h / float(self.min_height))
+            components['aspect'] = min(1.0, aspect / self.min_aspect, self.max_aspect / max(aspect, 1e-6))
+        return components
+    
+    def score(self, img, size=None, full_crop=False):
+        """
+        Điểm chất lượng
+        
+        Returns:
+            (score, components)
+        """
+        if img is None or img.size == 0 or min(img.shape[:2]) < 2:
+            return 0.0, {}
+        components = self.measure(img, size, full_crop)
+        return float(np.prod(list(components.values()))), components
+    
+    def accept(self, img, size=None, full_crop=False):
+        """
+        Crop có đủ chất lượng để OCR không? (ghi nhận điểm vào thống kê)
+        
+        Args: như measure()
+        """
+        score, components = self.score(img, size, full_crop)
+        accepted = score >= self.min_score
+        
+        with self.lock:
+            self.stats['scored'] += 1
+            self.recent.append(score)
+            self.histogram[min(int(score * 10), 9)] += 1
+            if not accepted:
+                self.stats['rejected'] += 1
+                self.reasons[min(components, key=components.get) if components else 'empty'] += 1
+            should_log = self.log_interval and self.stats['scored'] % self.log_interval == 0
+        
+        if should_log:
+            stats = self.get_stats()
+            print(f"📊 Chất lượng biển số: {stats['scored']} crop, loại {stats['rejected']} "
+                  f"({stats['reject_rate']:.0%}), điểm p10/p50/p90 = "
+                  f"{stats['p10']:.2f}/{stats['p50']:.2f}/{stats['p90']:.2f}, lý do: {stats['reasons']}")
+        return accepted
+    
+    def get_stats(self):
+        """Thống kê điểm: số crop đã chấm / bị loại, phân vị, histogram, lý do loại"""
+        with self.lock:
+            stats = dict(self.stats)
+            recent = list(self.recent)
+            stats['histogram'] = list(self.histogram)
+            stats['reasons'] = dict(self.reasons)
+        stats['reject_rate'] = round(stats['rejected'] / max(stats['scored'], 1), 3)
+        if recent:
+            p10, p50, p90 = np.percentile(recent, (10, 50, 90))
+        else:
+            p10 = p50 = p90 = 0.0
+        stats.update({'p10': round(float(p10), 3), 'p50': round(float(p50), 3), 'p90': round(float(p90), 3)})
+        return stats
+
+
+def create_quality_scorer(config):
+    """
+    Tạo PlateQualityScorer từ license_plate.quality_gate
+    
+    Returns:
+        PlateQualityScorer hoặc None nếu tắt
+    """
+    gate_config = config.get('license_plate', {}).get('quality_gate', {})
+    if not gate_config.get('enabled', True):
+        return None
+    return PlateQualityScorer(
+        min_score=gate_config.get('min_score', 0.35),
+        min_width=gate_config.get('min_width', 48),
+        min_height=gate_config.get('min_height', 16),
+        sharpness_ref=gate_config.get('sharpness_ref', 0.45),
+        contrast_ref=gate_config.get('contrast_ref', 0.3),
+        log_interval=gate_config.get('log_interval', 500)
+    )
+
+
+class OCRCascade:
+    """
+    Đọc text biển số theo tầng, dừng ở tầng đầu tiên đủ tin cậy
+    
+    1. Nhanh: fast_engine trên crop biển số đã tìm sẵn - recognizer CRNN
+       (ocr_engines.CRNNEngine) hoặc engine chính ở chế độ chỉ recognizer, bỏ
+       bước dò vùng chữ, giới hạn trong bảng ký tự biển số.
+    2. Đầy đủ: engine chính (dò vùng chữ + đọc); chỉ chạy cho crop có
+       confidence tầng 1 dưới min_confidence hoặc text không hợp lệ (vd biển
+       số 2 dòng của xe máy).
+    
+    Kết quả trả về kèm confidence thật của OCR.
+    """
+    
+    def __init__(self, engine, fast_engine, clean_text, min_confidence=0.6, batch_size=16, validate=None):
+        """
+        Args:
+            engine: OCREngine đọc đầy đủ
+            fast_engine: OCREngine tầng nhanh (None -> luôn đọc đầy đủ)
+            clean_text: Hàm làm sạch text (None nếu không hợp lệ)
+            min_confidence: Confidence tối thiểu để nhận kết quả tầng nhanh
+            batch_size: Số crop tối đa mỗi lần gọi OCR
+            validate: Hàm kiểm tra text đúng định dạng biển số (None = không kiểm tra);
+                kết quả tầng nhanh không hợp lệ được đọc lại đầy đủ
+        """
+        self.engine = engine
+        self.fast_engine = fast_engine
+        self.clean_text = clean_text
+        self.validate = validate
+        self.min_confidence = min_confidence
+        self.batch_size = max(1, batch_size)
+        
+        self.lock = threading.Lock()
+        self.stats = {'fast': 0, 'fast_accepted': 0, 'full': 0}
+    
+    def read_batch(self, imgs, height=None, localized=True):
+        """
+        Đọc text của nhiều crop
+        
+        Args:
+            imgs: List ảnh
+            height: Chiều cao chung khi pad (None = engine tự chọn theo nhóm ảnh cao gần nhau)
+            localized: True nếu là crop biển số (được đọc nhanh trước);
+                False với ảnh cả xe (đọc đầy đủ luôn)
+        
+        Returns:
+            List (text hoặc None, confidence), mỗi ảnh một phần tử
+        """
+        results = [(None, 0.0)] * len(imgs)
+        fast = results
+        pending = list(range(len(imgs)))
+        
+        if localized and self.fast_engine is not None and imgs:
+            fast = self._read_chunks(self.fast_engine, imgs, height)
+            pending = []
+            for i, (text, conf) in enumerate(fast):
+                if text and conf >= self.min_confidence and (self.validate is None or self.validate(text)):
+                    results[i] = (text, conf)
+                else:
+                    pending.append(i)
+            with self.lock:
+                self.stats['fast'] += len(imgs)
+                self.stats['fast_accepted'] += len(imgs) - len(pending)
+        
+        if pending:
+            full = self._read_chunks(self.engine, [imgs[i] for i in pending], height)
+            for i, reading in zip(pending, full):
+                # Đọc đầy đủ không ra text: giữ kết quả tầng nhanh (confidence thấp)
+                if reading[0] or not fast[i][0]:
+                    results[i] = reading
+                else:
+                    results[i] = fast[i]
+            with self.lock:
+                self.stats['full'] += len(pending)
+        return results
+    
+    def _read_chunks(self, engine, imgs, height):
+        readings = []
+        for start in range(0, len(imgs), self.batch_size):
+            for text, conf in engine.recognize_batch(imgs[start:start + self.batch_size], height):
+                text = self.clean_text(text) if text else None
+                readings.append((text, conf) if text else (None, 0.0))
+        return readings
+    
+    def get_stats(self):
+        """Số crop đọc ở tầng nhanh / được nhận ngay / phải đọc đầy đủ"""
+        with self.lock:
+            stats = dict(self.stats)
+        stats['engine'] = self.engine.name
+        stats['fast_engine'] = self.fast_engine.name if self.fast_engine is not None else None
+        stats['fast_rate'] = round(stats['fast_accepted'] / stats['fast'], 3) if stats['fast'] else None
+        return stats
+
+
+def create_ocr_cascade(config, clean_text, validate=None):
+    """
+    Tạo OCR engine (ocr.engine) và OCRCascade (ocr.cascade)
+    
+    Args:
+        config: Config đầy đủ
+        clean_text: Hàm làm sạch text của detector
+        validate: Hàm kiểm tra định dạng biển số của detector (None = không kiểm tra)
+    
+    Returns:
+        OCRCascade hoặc None nếu tắt OCR / không tạo được engine
+    """
+    ocr_config = config.get('ocr', {})
+    if not ocr_config.get('enabled', False):
+        return None
+    
+    name = ocr_config.get('engine', 'easyocr')
+    engine = create_engine(name, config)
+    if engine is None:
+        return None
+    
+    fast_engine = None
+    cascade_config = ocr_config.get('cascade', {})
+    if cascade_config.get('enabled', True):
+        fast_name = cascade_config.get('fast_engine', name)
+        # Engine chỉ có recognizer (crnn) thì tầng nhanh trùng tầng đầy đủ
+        if fast_name != name or engine.has_fast_mode:
+            fast_engine = create_engine(fast_name, config, fast=True)
+    
+    return OCRCascade(
+        engine, fast_engine, clean_text,
+        min_confidence=cascade_config.get('min_confidence', 0.6),
+        batch_size=ocr_config.get('batch_size', 16),
+        validate=validate
+    )
+
+
 class LicensePlateDetector:
     def __init__(self, config):
         """Khởi tạo License Plate Detector"""
         self.config = config
         self.ocr_enabled = config['ocr']['enabled']
         
-        # Khởi tạo OCR engine
-        if self.ocr_enabled:
-            engine = config['ocr']['engine']
-            if engine == 'paddleocr':
-                try:
-                    from paddleocr import PaddleOCR
-                    self.ocr = PaddleOCR(
-                        use_angle_cls=True,
-                        lang='en'
-                    )
-                    self.ocr_engine = 'paddle'
-                    print("✅ PaddleOCR đã sẵn sàng")
-                except ImportError:
-                    print("⚠️  PaddleOCR chưa cài đặt, dùng xử lý cơ bản")
-                    self.ocr_engine = None
-            elif engine == 'easyocr':
-                try:
-                    import easyocr
-                    self.ocr = easyocr.Reader(['en'], gpu=False)
-                    self.ocr_engine = 'easy'
-                    print("✅ EasyOCR đã sẵn sàng")
-                except ImportError:
-                    print("⚠️  EasyOCR chưa cài đặt, dùng xử lý cơ bản")
-                    self.ocr_engine = None
-            else:
-                self.ocr_engine = None
-        else:
-            self.ocr_engine = None
+        # OCR engine (ocr.engine) đọc theo tầng (đọc nhanh trước), gom crop của
+        # nhiều xe vào một lần gọi OCR
+        self.recognizer = create_ocr_cascade(config, self.clean_plate_text, self.validate_plate)
+        self.ocr_engine = self.recognizer.engine.name if self.recognizer else None
+        self.prefer_batch = bool(self.recognizer and self.recognizer.engine.supports_batch)
+        # Crop gần giống crop đã đọc gần đây (xe đứng yên) dùng lại kết quả OCR
+        self.ocr_cache = create_ocr_cache(config)
+        
+        # Tìm vị trí biển số trước (trên ảnh thu nhỏ), OCR chỉ trên vùng biển số
+        plate_config = config.get('license_plate', {})
+        self.localize_width = plate_config.get('localize_width', 320)
+        self.localize_mode = plate_config.get('localize_mode', 'fast')
+        self.max_candidates = plate_config.get('max_candidates', 3)
+        self.plate_height = plate_config.get('rectified_height', 64)
+        self.full_crop_fallback = plate_config.get('full_crop_fallback', True)
+        
+        # Bỏ crop mờ / quá nhỏ / cháy sáng / quá nghiêng trước khi OCR
+        self.quality = create_quality_scorer(config)
     
     def preprocess_plate(self, img):
         """Tiền xử lý ảnh biển số"""
@@ -58,8 +345,8 @@ class LicensePlateDetector:
         
         return gray, edges
     
-    def find_plate_contours(self, edges):
-        """Tìm contours có thể là biển số"""
+    def _plate_contours(self, edges):
+        """Contours có hình dạng biển số: list (contour, (x, y, w, h))"""
         contours, _ = cv2.findContours(
             edges.copy(),
             cv2.RETR_TREE,
@@ -72,10 +359,6 @@ class LicensePlateDetector:
         plate_candidates = []
         
         for contour in contours:
-            # Tính perimeter
-            peri = cv2.arcLength(contour, True)
-            approx = cv2.approxPolyDP(contour, 0.02 * peri, True)
-            
             # Biển số có thể có 4 cạnh hoặc hình chữ nhật
             x, y, w, h = cv2.boundingRect(contour)
             aspect_ratio = w / float(h)
@@ -90,35 +373,157 @@ class LicensePlateDetector:
                     solidity = float(area) / hull_area
                     # Biển số thường có solidity cao (hình chữ nhật đầy)
                     if solidity > 0.5:
-                        plate_candidates.append((x, y, w, h))
+                        plate_candidates.append((contour, (x, y, w, h)))
         
         return plate_candidates
     
-    def extract_text_ocr(self, img):
-        """Trích xuất text từ ảnh bằng OCR"""
-        if self.ocr_engine == 'paddle':
-            try:
-                result = self.ocr.ocr(img)
-                if result and result[0]:
-                    texts = [line[1][0] for line in result[0]]
-                    full_text = ' '.join(texts)
-                    return self.clean_plate_text(full_text)
-            except Exception as e:
-                print(f"Lỗi PaddleOCR: {e}")
-                return None
-        
-        elif self.ocr_engine == 'easy':
-            try:
-                result = self.ocr.readtext(img)
-                if result:
-                    texts = [item[1] for item in result]
-                    full_text = ' '.join(texts)
-                    return self.clean_plate_text(full_text)
-            except Exception as e:
-                print(f"Lỗi EasyOCR: {e}")
-                return None
+    def plate_text_mask(self, gray):
+        """
+        Mask các vùng chữ dày đặc (ứng viên biển số) trên ảnh xám đã thu nhỏ
         
-        return None
+        Thay cho bilateral + CLAHE + Canny: blackhat/tophat làm nổi ký tự tối
+        trên nền sáng (và ngược lại), gradient ngang + closing nối các ký tự
+        thành một khối đặc, nên chỉ cần contour ngoài (RETR_EXTERNAL).
+        """
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (13, 5))
+        text = cv2.max(
+            cv2.morphologyEx(gray, cv2.MORPH_BLACKHAT, kernel),
+            cv2.morphologyEx(gray, cv2.MORPH_TOPHAT, kernel)
+        )
+        grad = np.abs(cv2.Sobel(text, cv2.CV_32F, 1, 0, ksize=3))
+        grad = cv2.normalize(grad, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+        grad = cv2.GaussianBlur(grad, (5, 5), 0)
+        grad = cv2.morphologyEx(grad, cv2.MORPH_CLOSE, kernel)
+        _, mask = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+        # Bỏ đốm nhỏ
+        return cv2.dilate(cv2.erode(mask, None), None)
+    
+    def _plate_blobs(self, mask):
+        """Khối chữ có hình dạng biển số: list (contour, (x, y, w, h)), lớn trước"""
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        
+        # Lọc theo tỷ lệ / diện tích trước, chỉ sắp xếp các khối còn lại.
+        # Khối chữ hẹp hơn viền biển số nên cho phép tỷ lệ tới 8
+        plate_candidates = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            if h > 0 and 1.5 <= w / float(h) <= 8.0 and w * h >= 200:
+                plate_candidates.append((contour, (x, y, w, h)))
+        plate_candidates.sort(key=lambda item: item[1][2] * item[1][3], reverse=True)
+        return plate_candidates[:15]
+    
+    def localize_plates(self, vehicle_img):
+        """
+        Tìm các vùng có thể là biển số trong ảnh xe
+        
+        Ảnh xe được thu nhỏ về chiều rộng localize_width trước khi lọc, nên chi
+        phí gần như cố định kể cả với nguồn 4K; chỉ 4 góc của các vùng tìm được
+        được đổi về tọa độ ảnh gốc (để cắt biển số ở độ phân giải đầy đủ).
+        
+        Returns:
+            List (bbox (x, y, w, h), corners (4, 2) float32) trong ảnh gốc,
+            tối đa max_candidates phần tử
+        """
+        h, w = vehicle_img.shape[:2]
+        scale = min(1.0, self.localize_width / float(w))
+        if scale < 1.0:
+            size = (self.localize_width, max(1, int(round(h * scale))))
+            small = cv2.resize(vehicle_img, size, interpolation=cv2.INTER_AREA)
+            scale = self.localize_width / float(w)
+        else:
+            small = vehicle_img
+        
+        if self.localize_mode == 'contour':
+            # Cách cũ: bilateral + CLAHE + Canny, contour dạng cây
+            _, edges = self.preprocess_plate(small)
+            regions = self._plate_contours(edges)
+            padding = (1.0, 1.0)
+        else:
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+            regions = self._plate_blobs(self.plate_text_mask(gray))
+            # Khối chữ sát ký tự: nới thêm lề để OCR không bị cắt mất nét
+            padding = (1.1, 1.5)
+        
+        candidates = []
+        for contour, _ in regions:
+            # Hình chữ nhật xoay nhỏ nhất (để nắn thẳng biển số bị nghiêng)
+            center, (rect_w, rect_h), angle = cv2.minAreaRect(contour)
+            if rect_w < rect_h:
+                # Cạnh dài nằm dọc (góc gần 90 độ): nới theo đúng chiều
+                rect = (center, (rect_w * padding[1], rect_h * padding[0]), angle)
+            else:
+                rect = (center, (rect_w * padding[0], rect_h * padding[1]), angle)
+            corners = cv2.boxPoints(rect) / scale
+            x, y, bw, bh = cv2.boundingRect(corners.astype(np.int32))
+            x, y = max(0, x), max(0, y)
+            bw, bh = min(bw, w - x), min(bh, h - y)
+            if bw <= 0 or bh <= 0:
+                continue
+            
+            # Bỏ contour trùng (viền trong/ngoài của cùng một biển số)
+            box = [x, y, x + bw, y + bh]
+            if candidates:
+                kept = [[cx, cy, cx + cw, cy + ch] for (cx, cy, cw, ch), _ in candidates]
+                if box_iou([box], kept).max() > 0.7:
+                    continue
+            
+            candidates.append(((x, y, bw, bh), corners.astype(np.float32)))
+            if len(candidates) >= self.max_candidates:
+                break
+        return candidates
+    
+    def rectify_plate(self, vehicle_img, corners):
+        """
+        Cắt và nắn thẳng vùng biển số về chiều cao rectified_height
+        
+        Args:
+            vehicle_img: Ảnh xe
+            corners: 4 góc biển số (4, 2)
+        
+        Returns:
+            Ảnh biển số đã nắn thẳng
+        """
+        # Sắp xếp góc: trên-trái, trên-phải, dưới-phải, dưới-trái
+        sums = corners.sum(axis=1)
+        diffs = np.diff(corners, axis=1).ravel()
+        ordered = np.array([
+            corners[np.argmin(sums)],
+            corners[np.argmin(diffs)],
+            corners[np.argmax(sums)],
+            corners[np.argmax(diffs)]
+        ], dtype=np.float32)
+        
+        width = np.linalg.norm(ordered[1] - ordered[0])
+        height = np.linalg.norm(ordered[3] - ordered[0])
+        out_h = self.plate_height
+        out_w = max(1, int(round(out_h * width / max(height, 1.0))))
+        
+        target = np.array([[0, 0], [out_w - 1, 0], [out_w - 1, out_h - 1], [0, out_h - 1]], dtype=np.float32)
+        matrix = cv2.getPerspectiveTransform(ordered, target)
+        return cv2.warpPerspective(vehicle_img, matrix, (out_w, out_h), flags=cv2.INTER_CUBIC)
+    
+    def extract_text_ocr_batch(self, imgs, height=None, localized=True, return_hits=False):
+        """
+        Đọc text của nhiều ảnh qua OCRCascade; crop gần giống crop đã đọc gần
+        đây lấy kết quả từ cache (ocr.cache), chỉ crop mới được OCR
+        
+        Args:
+            imgs: List ảnh
+            height: Chiều cao chung khi pad (None = engine tự chọn theo nhóm ảnh cao gần nhau)
+            localized: True nếu là crop biển số, False nếu là ảnh cả xe
+            return_hits: True -> trả thêm list cờ kết quả lấy từ cache
+        
+        Returns:
+            List (text hoặc None, confidence), mỗi ảnh một phần tử (kèm list hit nếu return_hits)
+        """
+        if self.recognizer is None:
+            readings = [(None, 0.0)] * len(imgs)
+            return (readings, [False] * len(imgs)) if return_hits else readings
+        read = lambda batch: self.recognizer.read_batch(batch, height, localized)
+        if self.ocr_cache is None:
+            readings = read(imgs)
+            return (readings, [False] * len(imgs)) if return_hits else readings
+        return self.ocr_cache.read_batch(imgs, read, return_hits)
     
     def clean_plate_text(self, text):
         """Làm sạch text biển số"""
@@ -166,95 +571,103 @@ class LicensePlateDetector:
         Returns:
             Dict chứa thông tin biển số hoặc None
         """
-        if vehicle_img is None or vehicle_img.size == 0:
-            return None
+        return self.detect_batch([vehicle_img])[0]
+    
+    def detect_batch(self, vehicle_imgs):
+        """
+        Phát hiện và đọc biển số cho nhiều xe, OCR tất cả vùng biển số trong một batch
         
-        h, w = vehicle_img.shape[:2]
-        if h < 30 or w < 30:
-            return None
+        Args:
+            vehicle_imgs: List ảnh vùng xe
         
-        # CHIẾN LƯỢC MỚI: Thử OCR trực tiếp TRƯỚC (hiệu quả hơn cho video thực tế)
-        if self.ocr_engine:
-            # Resize để OCR tốt hơn
-            if h < 100:
-                scale = 100 / h
-                vehicle_img_resized = cv2.resize(vehicle_img, None, fx=scale, fy=scale)
-            else:
-                vehicle_img_resized = vehicle_img
-            
-            # OCR trực tiếp trên toàn bộ vùng xe
-            text = self.extract_text_ocr(vehicle_img_resized)
-            
-            # Kiểm tra text hợp lệ
-            if text and self.validate_plate(text):
-                # Tìm vị trí chính xác bằng contour
-                gray, edges = self.preprocess_plate(vehicle_img)
-                plate_candidates = self.find_plate_contours(edges)
-                
-                if plate_candidates:
-                    x, y, w, h = plate_candidates[0]
-                    return {
-                        'text': text,
-                        'confidence': 0.85,
-                        'bbox': (x, y, w, h)
-                    }
-                else:
-                    # Ước lượng vị trí biển số (thường ở phần dưới xe)
-                    h_img, w_img = vehicle_img.shape[:2]
-                    est_x = int(w_img * 0.1)
-                    est_y = int(h_img * 0.6)
-                    est_w = int(w_img * 0.8)
-                    est_h = int(h_img * 0.25)
-                    return {
-                        'text': text,
-                        'confidence': 0.75,
-                        'bbox': (est_x, est_y, est_w, est_h)
-                    }
-        
-        # FALLBACK: Phương pháp contour cũ (nếu OCR không hoạt động)
-        gray, edges = self.preprocess_plate(vehicle_img)
-        plate_candidates = self.find_plate_contours(edges)
-        
-        if not plate_candidates:
-            return None
+        Returns:
+            List dict thông tin biển số (hoặc None), mỗi xe một phần tử
+        """
+        plate_results = [None] * len(vehicle_imgs)
+        if not self.ocr_engine:
+            return plate_results
         
-        # Lấy candidate tốt nhất (đầu tiên)
-        x, y, w, h = plate_candidates[0]
-        plate_roi = gray[y:y+h, x:x+w]
-        
-        # Resize để OCR tốt hơn
-        if plate_roi.shape[0] < 50:
-            scale = 50 / plate_roi.shape[0]
-            new_w = int(plate_roi.shape[1] * scale)
-            plate_roi = cv2.resize(plate_roi, (new_w, 50))
-        
-        # Threshold
-        _, plate_thresh = cv2.threshold(
-            plate_roi,
-            0,
-            255,
-            cv2.THRESH_BINARY + cv2.THRESH_OTSU
-        )
+        valid = [
+            i for i, img in enumerate(vehicle_imgs)
+            if img is not None and img.size > 0 and min(img.shape[:2]) >= 30
+        ]
         
-        # OCR
-        if self.ocr_engine:
-            plate_color = cv2.cvtColor(plate_thresh, cv2.COLOR_GRAY2BGR)
-            text = self.extract_text_ocr(plate_color)
-            
-            if text:
-                # Validate biển số Việt Nam
-                if self.validate_plate(text):
-                    return {
-                        'text': text,
-                        'confidence': 0.8,
-                        'bbox': (x, y, w, h)
-                    }
-                else:
-                    # Biển số không hợp lệ, bỏ qua
-                    return None
+        # Bước 1: tìm vị trí biển số của mọi xe, OCR các vùng biển số đã nắn thẳng cùng lúc
+        owners, boxes, plate_imgs = [], [], []
+        candidates = {}
+        for i in valid:
+            for bbox, corners in self.localize_plates(vehicle_imgs[i]):
+                candidates.setdefault(i, []).append(bbox)
+                plate_img = self.rectify_plate(vehicle_imgs[i], corners)
+                if self.quality is None or self.quality.accept(plate_img, size=bbox[2:]):
+                    owners.append(i)
+                    boxes.append(bbox)
+                    plate_imgs.append(plate_img)
+        
+        readings, hits = self.extract_text_ocr_batch(plate_imgs, self.plate_height, return_hits=True)
+        for i, bbox, (text, confidence), cached in zip(owners, boxes, readings, hits):
+            if plate_results[i] is None and text and self.validate_plate(text):
+                plate_results[i] = {
+                    'text': text,
+                    'confidence': confidence,
+                    'bbox': bbox,
+                    'cached': cached  # Lấy từ cache: không phải một lần đọc mới
+                }
+        
+        # Bước 2 (fallback): OCR trên toàn bộ vùng xe
+        if self.full_crop_fallback:
+            missing = [
+                i for i in valid if plate_results[i] is None
+                and (self.quality is None or self.quality.accept(vehicle_imgs[i], full_crop=True))
+            ]
+            readings, hits = self.extract_text_ocr_batch(
+                [self.resize_full_crop(vehicle_imgs[i]) for i in missing], localized=False, return_hits=True)
+            for i, reading, cached in zip(missing, readings, hits):
+                plate_results[i] = self.full_crop_result(vehicle_imgs[i], reading, candidates.get(i))
+                if plate_results[i] is not None:
+                    plate_results[i]['cached'] = cached
+        
+        return plate_results
+    
+    def resize_full_crop(self, vehicle_img):
+        """Phóng to vùng xe thấp hơn 100px để OCR tốt hơn"""
+        h = vehicle_img.shape[0]
+        if h < 100:
+            scale = 100 / h
+            return cv2.resize(vehicle_img, None, fx=scale, fy=scale)
+        return vehicle_img
+    
+    def full_crop_result(self, vehicle_img, reading, candidate_boxes=None):
+        """
+        Kết quả của OCR toàn bộ vùng xe
         
-        # Không phát hiện được biển số hợp lệ
-        return None
+        Args:
+            vehicle_img: Ảnh vùng xe
+            reading: (text, confidence) OCR đọc được
+            candidate_boxes: Bbox các vùng biển số đã tìm (để lấy vị trí)
+        """
+        text, confidence = reading
+        if not (text and self.validate_plate(text)):
+            return None
+        
+        if candidate_boxes:
+            return {
+                'text': text,
+                'confidence': confidence,
+                'bbox': candidate_boxes[0]
+            }
+        
+        # Ước lượng vị trí biển số (thường ở phần dưới xe)
+        h, w = vehicle_img.shape[:2]
+        est_x = int(w * 0.1)
+        est_y = int(h * 0.6)
+        est_w = int(w * 0.8)
+        est_h = int(h * 0.25)
+        return {
+            'text': text,
+            'confidence': confidence,
+            'bbox': (est_x, est_y, est_w, est_h)
+        }
     
     def validate_plate(self, text):
         """
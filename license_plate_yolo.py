@@ -1,50 +1,80 @@
 """
-Module phát hiện biển số xe bằng YOLOv8
-Sử dụng model pre-trained cho license plate detection
+Module phát hiện biển số xe bằng YOLO
+Sử dụng model phát hiện biển số chuyên dụng (detection.license_plate_model)
 """
+import os
+
 import cv2
 import numpy as np
 from typing import Optional, Dict
 
+from license_plate import create_ocr_cascade, create_quality_scorer
+from plate_cache import create_ocr_cache
+
+
+def get_plate_model_path(config):
+    """Đường dẫn model phát hiện biển số (detection.license_plate_model)"""
+    return (config.get('detection', {}).get('license_plate_model')
+            or config.get('license_plate', {}).get('yolo_model'))
+
+
+def use_yolo_plate(config):
+    """
+    Có dùng YOLOLicensePlateDetector không?
+    
+    Cần bật license_plate.use_yolo_plate và có file model biển số; thiếu model
+    thì dùng detector contour.
+    """
+    plate_config = config.get('license_plate', {})
+    if not plate_config.get('use_yolo_plate', plate_config.get('use_yolo', False)):
+        return False
+    model_path = get_plate_model_path(config)
+    if not model_path or not os.path.exists(model_path):
+        print(f"⚠️  Không tìm thấy model biển số {model_path}, dùng Contour License Plate Detector")
+        return False
+    return True
+
+
 class YOLOLicensePlateDetector:
     def __init__(self, config):
         """Khởi tạo YOLO License Plate Detector"""
         self.config = config
         
         try:
-            from ultralytics import YOLO
+            from inference_backend import load_model
+            
+            # Model phát hiện biển số chuyên dụng (detection.license_plate_model)
+            model_path = get_plate_model_path(config)
+            self.confidence = float(config.get('detection', {}).get('plate_confidence', 0.25))
+            self.full_crop_fallback = config.get('license_plate', {}).get('full_crop_fallback', True)
+            self.plate_height = config.get('license_plate', {}).get('rectified_height', 64)
+            # Model biển số luôn chạy batch cho cả frame
+            self.prefer_batch = True
+            # Bỏ crop mờ / quá nhỏ / cháy sáng / quá nghiêng trước khi OCR
+            self.quality = create_quality_scorer(config)
+            # Crop gần giống crop đã đọc gần đây (xe đứng yên) dùng lại kết quả OCR
+            self.ocr_cache = create_ocr_cache(config)
             
-            # Tải model YOLO cho license plate
-            # Option 1: Model từ Roboflow (rất tốt cho biển số)
-            model_path = config.get('license_plate', {}).get('yolo_model', 'license_plate_detector.pt')
+            # Backend (torch / onnx / openvino) dùng chung cấu hình với CameraAI
+            perf_config = config.get('performance', {})
+            self.imgsz = perf_config.get('imgsz', 640)
             
             print("⬇️  Đang tải YOLO License Plate model...")
-            self.model = YOLO(model_path)
+            self.model = load_model(
+                model_path,
+                backend=perf_config.get('backend', 'torch'),
+                imgsz=self.imgsz,
+                # Batch động: tất cả xe của một frame chạy trong một lần
+                dynamic=True,
+                precision=perf_config.get('precision', 'fp32')
+            )
             print("✅ YOLO License Plate Detector đã sẵn sàng")
             
-            # Khởi tạo OCR cho đọc text
-            self.ocr_engine = None
-            if config.get('ocr', {}).get('enabled', False):
-                engine = config['ocr'].get('engine', 'paddleocr')
-                if engine == 'paddleocr':
-                    try:
-                        from paddleocr import PaddleOCR
-                        self.ocr = PaddleOCR(use_angle_cls=True, lang='en')
-                        self.ocr_engine = 'paddle'
-                        print("✅ PaddleOCR đã sẵn sàng cho đọc text")
-                    except ImportError:
-                        print("⚠️  PaddleOCR chưa cài đặt")
-                        self.ocr_engine = None
-                elif engine == 'easyocr':
-                    try:
-                        import easyocr
-                        self.ocr = easyocr.Reader(['en'], gpu=False)
-                        self.ocr_engine = 'easy'
-                        print("✅ EasyOCR đã sẵn sàng cho đọc text")
-                    except ImportError:
-                        print("⚠️  EasyOCR chưa cài đặt")
-                        self.ocr_engine = None
-                        
+            # OCR engine (ocr.engine) đọc theo tầng (đọc nhanh trước), gom crop
+            # của nhiều xe vào một lần gọi OCR
+            self.recognizer = create_ocr_cascade(config, self.clean_plate_text)
+            self.ocr_engine = self.recognizer.engine.name if self.recognizer else None
+            
         except ImportError:
             print("❌ Ultralytics YOLO chưa cài đặt. Chạy: pip install ultralytics")
             raise
@@ -54,92 +84,123 @@ class YOLOLicensePlateDetector:
         Phát hiện biển số trong ảnh xe bằng YOLO
         Returns: dict with 'text', 'confidence', 'bbox'
         """
-        if vehicle_img is None or vehicle_img.size == 0:
-            return None
+        return self.detect_batch([vehicle_img])[0]
+    
+    def localize_batch(self, vehicle_imgs):
+        """
+        Tìm biển số trong nhiều ảnh xe bằng MỘT lần chạy model
         
-        h, w = vehicle_img.shape[:2]
-        if h < 30 or w < 30:
-            return None
+        Args:
+            vehicle_imgs: List ảnh xe
+        
+        Returns:
+            Array (N, 5) x1, y1, x2, y2, conf của biển số tốt nhất mỗi ảnh
+            (trong tọa độ ảnh xe); conf = 0 nếu không tìm thấy
+        """
+        best = np.zeros((len(vehicle_imgs), 5), dtype=np.float32)
+        valid = [
+            i for i, img in enumerate(vehicle_imgs)
+            if img is not None and img.size > 0 and min(img.shape[:2]) >= 30
+        ]
+        if not valid:
+            return best
+        
+        results = self.model([vehicle_imgs[i] for i in valid], imgsz=self.imgsz,
+                             conf=self.confidence, verbose=False)
+        for i, result in zip(valid, results):
+            # (K, 6): x1, y1, x2, y2, conf, cls -> giữ box confidence cao nhất
+            data = result.boxes.data.cpu().numpy()
+            if len(data):
+                best[i] = data[data[:, 4].argmax(), :5]
+        return best
+    
+    def detect_batch(self, vehicle_imgs):
+        """
+        Phát hiện + đọc biển số cho tất cả xe của một frame
+        
+        Model biển số chạy một lần cho mọi xe, các vùng biển số tìm được cũng
+        được OCR trong một batch.
+        
+        Args:
+            vehicle_imgs: List ảnh xe (crop từ frame)
         
-        # Phát hiện xe/object bằng YOLO (tạm thời dùng base model)
-        # TODO: Thay bằng model license plate chuyên dụng
-        results = self.model(vehicle_img, verbose=False, classes=[2, 3, 5, 7])  # car, motorcycle, bus, truck
-        
-        if len(results) == 0 or len(results[0].boxes) == 0:
-            # Nếu không phát hiện được, thử OCR trực tiếp trên toàn bộ ảnh
-            if self.ocr_engine:
-                text = self.extract_text_ocr(vehicle_img)
-                if text:
-                    print(f"🔍 OCR đọc được (không có YOLO detection): '{text}'")
-                    # Ước lượng vị trí biển số (thường ở 60% từ trên)
-                    h_img, w_img = vehicle_img.shape[:2]
-                    est_bbox = (int(w_img * 0.1), int(h_img * 0.6), int(w_img * 0.8), int(h_img * 0.25))
-                    return {
-                        'text': text,
-                        'confidence': 0.7,
-                        'bbox': est_bbox
-                    }
+        Returns:
+            List dict 'text', 'confidence', 'bbox' (x, y, w, h trong ảnh xe) hoặc None
+        """
+        plates = self.localize_batch(vehicle_imgs)
+        boxes = plates[:, :4].astype(np.int64)
+        plate_results = [None] * len(vehicle_imgs)
+        if not self.ocr_engine:
+            return plate_results
+        
+        # Crop vùng biển số + đọc text bằng OCR (một batch)
+        found = [
+            i for i, ((x1, y1, x2, y2), confidence) in enumerate(zip(boxes.tolist(), plates[:, 4].tolist()))
+            if confidence > 0 and y2 - y1 > 10 and x2 - x1 > 10
+            and (self.quality is None or self.quality.accept(vehicle_imgs[i][y1:y2, x1:x2]))
+        ]
+        plate_imgs = [vehicle_imgs[i][y1:y2, x1:x2] for i, (x1, y1, x2, y2) in zip(found, boxes[found].tolist())]
+        readings, hits = self.extract_text_ocr_batch(plate_imgs, self.plate_height, return_hits=True)
+        for i, (plate_text, confidence), cached in zip(found, readings, hits):
+            if plate_text:
+                x1, y1, x2, y2 = boxes[i].tolist()
+                print(f"🎯 YOLO phát hiện biển số: '{plate_text}' "
+                      f"(box: {plates[i, 4]:.2f}, OCR: {confidence:.2f})")
+                plate_results[i] = {
+                    'text': plate_text,
+                    'confidence': confidence,
+                    'bbox': (x1, y1, x2 - x1, y2 - y1),
+                    'cached': cached  # Lấy từ cache: không phải một lần đọc mới
+                }
+        
+        # Không tìm thấy biển số: OCR toàn bộ ảnh xe (nếu bật fallback)
+        if self.full_crop_fallback:
+            missing = [
+                i for i, img in enumerate(vehicle_imgs)
+                if plates[i, 4] <= 0 and img is not None and img.size > 0 and min(img.shape[:2]) >= 30
+                and (self.quality is None or self.quality.accept(img, full_crop=True))
+            ]
+            readings, hits = self.extract_text_ocr_batch(
+                [vehicle_imgs[i] for i in missing], localized=False, return_hits=True)
+            for i, reading, cached in zip(missing, readings, hits):
+                plate_results[i] = self.full_crop_result(vehicle_imgs[i], reading)
+                if plate_results[i] is not None:
+                    plate_results[i]['cached'] = cached
+        return plate_results
+    
+    def full_crop_result(self, vehicle_img, reading):
+        """Kết quả của OCR toàn bộ ảnh xe từ reading (text, confidence)"""
+        text, confidence = reading
+        if not text:
             return None
         
-        # Lấy detection có confidence cao nhất (giả định là vùng có biển số)
-        boxes = results[0].boxes
-        confidences = boxes.conf.cpu().numpy()
-        best_idx = np.argmax(confidences)
-        
-        box = boxes.xyxy[best_idx].cpu().numpy()
-        confidence = float(confidences[best_idx])
-        
-        # Chuyển đổi tọa độ
-        x1, y1, x2, y2 = map(int, box)
-        plate_bbox = (x1, y1, x2 - x1, y2 - y1)
-        
-        # Crop vùng biển số
-        plate_img = vehicle_img[y1:y2, x1:x2]
-        
-        # Đọc text bằng OCR
-        plate_text = None
-        if self.ocr_engine and plate_img.shape[0] > 10 and plate_img.shape[1] > 10:
-            plate_text = self.extract_text_ocr(plate_img)
-        
-        if plate_text:
-            print(f"🎯 YOLO phát hiện biển số: '{plate_text}' (confidence: {confidence:.2f})")
-            return {
-                'text': plate_text,
-                'confidence': confidence,
-                'bbox': plate_bbox
-            }
-        else:
-            # Nếu không đọc được text, vẫn trả về bbox
-            print(f"🎯 YOLO phát hiện biển số nhưng không đọc được text (confidence: {confidence:.2f})")
-            return {
-                'text': 'DETECTED',
-                'confidence': confidence,
-                'bbox': plate_bbox
-            }
+        print(f"🔍 OCR đọc được (không có YOLO detection): '{text}' (OCR: {confidence:.2f})")
+        # Ước lượng vị trí biển số (thường ở 60% từ trên)
+        h_img, w_img = vehicle_img.shape[:2]
+        est_bbox = (int(w_img * 0.1), int(h_img * 0.6), int(w_img * 0.8), int(h_img * 0.25))
+        return {
+            'text': text,
+            'confidence': confidence,
+            'bbox': est_bbox
+        }
     
-    def extract_text_ocr(self, plate_img):
-        """Trích xuất text từ ảnh biển số bằng OCR"""
-        if self.ocr_engine == 'paddle':
-            try:
-                result = self.ocr.ocr(plate_img)
-                if result and result[0]:
-                    texts = [line[1][0] for line in result[0]]
-                    full_text = ' '.join(texts)
-                    return self.clean_plate_text(full_text)
-            except Exception as e:
-                print(f"Lỗi PaddleOCR: {e}")
-                return None
-        elif self.ocr_engine == 'easy':
-            try:
-                result = self.ocr.readtext(plate_img)
-                if result:
-                    texts = [text[1] for text in result]
-                    full_text = ' '.join(texts)
-                    return self.clean_plate_text(full_text)
-            except Exception as e:
-                print(f"Lỗi EasyOCR: {e}")
-                return None
-        return None
+    def extract_text_ocr_batch(self, imgs, height=None, localized=True, return_hits=False):
+        """
+        Đọc text của nhiều ảnh qua OCRCascade (crop gần giống crop đã đọc gần
+        đây lấy kết quả từ cache)
+        
+        Returns:
+            List (text hoặc None, confidence), mỗi ảnh một phần tử (kèm list
+            cờ kết quả lấy từ cache nếu return_hits)
+        """
+        if self.recognizer is None:
+            readings = [(None, 0.0)] * len(imgs)
+            return (readings, [False] * len(imgs)) if return_hits else readings
+        read = lambda batch: self.recognizer.read_batch(batch, height, localized)
+        if self.ocr_cache is None:
+            readings = read(imgs)
+            return (readings, [False] * len(imgs)) if return_hits else readings
+        return self.ocr_cache.read_batch(imgs, read, return_hits)
     
     def clean_plate_text(self, text):
         """Làm sạch text biển số"""
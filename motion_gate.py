@@ -0,0 +1,78 @@
+"""
+Motion Gate Module
+Phát hiện chuyển động rẻ (sai khác frame trên ảnh xám thu nhỏ) để bỏ qua YOLO khi cảnh đứng yên
+"""
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Quyết định frame nào cần chạy detection
+
+    So sánh ảnh xám đã thu nhỏ + làm mờ của frame hiện tại với frame đã chạy
+    detection gần nhất. Nếu tỷ lệ pixel thay đổi nhỏ hơn ngưỡng -> bỏ qua
+    (dùng lại kết quả cũ). Cứ refresh_interval frame sẽ chạy lại một lần để
+    không giữ kết quả cũ quá lâu.
+    """
+
+    def __init__(self, width=160, pixel_threshold=25, min_area_ratio=0.002, refresh_interval=30):
+        """
+        Args:
+            width: Chiều rộng ảnh xám dùng để so sánh (pixel)
+            pixel_threshold: Mức chênh lệch độ sáng để coi một pixel là thay đổi
+            min_area_ratio: Tỷ lệ pixel thay đổi tối thiểu để coi là có chuyển động
+            refresh_interval: Số frame tối đa liên tiếp được bỏ qua
+        """
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_area_ratio = min_area_ratio
+        self.refresh_interval = refresh_interval
+
+        self.reference = None  # Ảnh xám của frame đã chạy detection gần nhất
+        self.frames_since_inference = 0
+
+        self.stats = {'frames': 0, 'inferred': 0, 'skipped': 0}
+
+    def _prepare(self, frame):
+        """Ảnh xám thu nhỏ + làm mờ (giảm nhiễu sensor)"""
+        h, w = frame.shape[:2]
+        height = max(1, int(h * self.width / w))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def check(self, frame):
+        """
+        Frame này có cần chạy detection không?
+
+        Returns:
+            True nếu có chuyển động, chưa có frame tham chiếu, hoặc đã tới lúc refresh
+        """
+        self.stats['frames'] += 1
+        gray = self._prepare(frame)
+
+        need_inference = (
+            self.reference is None
+            or self.reference.shape != gray.shape
+            or self.frames_since_inference + 1 >= self.refresh_interval
+        )
+        if not need_inference:
+            diff = cv2.absdiff(gray, self.reference)
+            changed = np.count_nonzero(diff > self.pixel_threshold)
+            need_inference = changed >= self.min_area_ratio * diff.size
+
+        if need_inference:
+            self.reference = gray
+            self.frames_since_inference = 0
+            self.stats['inferred'] += 1
+        else:
+            self.frames_since_inference += 1
+            self.stats['skipped'] += 1
+        return need_inference
+
+    def get_stats(self):
+        """Thống kê số frame đã chạy / bỏ qua detection"""
+        stats = dict(self.stats)
+        stats['skip_rate'] = round(stats['skipped'] / max(stats['frames'], 1), 3)
+        return stats
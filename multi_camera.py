@@ -0,0 +1,260 @@
+"""
+Multi Camera Module
+Chạy nhiều camera: mỗi camera một thread capture, tất cả dùng chung một detector
+"""
+import threading
+import time
+
+import cv2
+
+from camera_ai import CameraAI, open_camera
+from frame_pool import FrameSequencer
+
+
+class CameraWorker:
+    """Thread capture cho một camera, luôn giữ frame mới nhất"""
+
+    def __init__(self, camera_id, camera_config, frame_event):
+        """
+        Args:
+            camera_id: ID camera (ghi vào database / tên snapshot)
+            camera_config: Dict cấu hình camera (source, width, height, fps...)
+            frame_event: threading.Event chung, được set khi có frame mới
+        """
+        self.camera_id = camera_id
+        self.config = camera_config
+        self.frame_event = frame_event
+
+        self.cap = None
+        self.sequencer = FrameSequencer()
+        self.is_running = False
+        self.thread = None
+
+        source = camera_config['source']
+        self.is_live = isinstance(source, str) and source.startswith(('rtsp://', 'http://', 'https://'))
+
+    def start(self):
+        """Kết nối camera và bắt đầu thread capture"""
+        self.cap = open_camera(self.config)
+        self.is_running = True
+        self.thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.thread.start()
+
+    def _capture_loop(self):
+        """Đọc frame liên tục và publish frame mới nhất"""
+        # Video file: phát theo FPS cấu hình thay vì đọc nhanh nhất có thể
+        interval = 0 if self.is_live else 1.0 / max(1, self.config.get('fps', 25))
+
+        while self.is_running:
+            start_time = time.time()
+
+            if hasattr(self.cap, 'read_next'):
+                ret, frame = self.cap.read_next(timeout=1.0)
+                timestamp = self.cap.frame_timestamp
+            else:
+                ret, frame = self.cap.read()
+                timestamp = start_time
+
+            if not ret:
+                if not self.is_live:
+                    # Hết video -> quay lại đầu
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                continue
+
+            self.sequencer.publish(frame, timestamp=timestamp)
+            self.frame_event.set()
+
+            if interval:
+                sleep_time = interval - (time.time() - start_time)
+                if sleep_time > 0:
+                    time.sleep(sleep_time)
+
+    def stop(self):
+        """Dừng thread capture và giải phóng camera"""
+        self.is_running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+        if self.cap is not None and hasattr(self.cap, 'release'):
+            self.cap.release()
+
+    def get_stats(self):
+        """Thống kê frame của camera"""
+        return self.sequencer.get_stats()
+
+
+class MultiCameraManager:
+    """Quản lý nhiều camera dùng chung một CameraAI (model YOLO + OCR load một lần)"""
+
+    def __init__(self, config_path='config.yaml'):
+        # Detector chung: chỉ load model + database, không mở camera
+        self.detector = CameraAI(config_path, with_camera=False)
+        self.config = self.detector.config
+
+        self.frame_event = threading.Event()
+        self.workers = {}
+        for camera_config in self.get_camera_configs(self.config):
+            camera_id = camera_config['id']
+            self.workers[camera_id] = CameraWorker(camera_id, camera_config, self.frame_event)
+
+        # Seq đã xử lý của từng camera
+        self.processed_seq = {camera_id: 0 for camera_id in self.workers}
+
+        # Batch inference: gom frame của nhiều camera vào một lần chạy model
+        perf_config = self.config.get('performance', {})
+        self.max_batch_size = max(1, perf_config.get('max_batch_size', len(self.workers)))
+        self.max_batch_wait = perf_config.get('max_batch_wait_ms', 20) / 1000.0
+
+        # Frame đã vẽ mới nhất của từng camera (cho dashboard/preview)
+        self.latest_frames = {}
+        self.frame_lock = threading.Lock()
+        self.is_running = False
+
+        print(f"📹 Multi-camera: {len(self.workers)} camera - {', '.join(self.workers)}")
+
+    @staticmethod
+    def get_camera_configs(config):
+        """
+        Lấy danh sách cấu hình camera
+
+        Mỗi phần tử trong `cameras` kế thừa các key còn thiếu từ mục `camera`.
+        Không có `cameras` -> chạy một camera duy nhất từ mục `camera`.
+        """
+        defaults = config['camera']
+        cameras = config.get('cameras') or [dict(defaults, id='cam1')]
+
+        camera_configs = []
+        for i, camera in enumerate(cameras, start=1):
+            camera_config = dict(defaults)
+            camera_config.update(camera)
+            camera_config['id'] = str(camera.get('id', f'cam{i}'))
+            camera_configs.append(camera_config)
+        return camera_configs
+
+    def start(self):
+        """Kết nối và bắt đầu capture tất cả camera"""
+        for camera_id, worker in list(self.workers.items()):
+            try:
+                worker.start()
+            except Exception as e:
+                print(f"❌ Camera {camera_id}: {e}")
+                del self.workers[camera_id]
+
+        if not self.workers:
+            raise Exception("❌ Không kết nối được camera nào")
+        self.is_running = True
+
+    def collect_batch(self):
+        """
+        Gom frame mới của các camera thành một batch
+
+        Mỗi camera góp tối đa một frame (mới nhất). Sau khi có frame đầu tiên,
+        chỉ chờ thêm tối đa max_batch_wait giây hoặc tới khi đủ max_batch_size.
+
+        Returns:
+            List (camera_id, frame)
+        """
+        batch = []
+        deadline = None
+
+        while self.is_running:
+            for camera_id, worker in self.workers.items():
+                if len(batch) >= self.max_batch_size:
+                    break
+                if any(item[0] == camera_id for item in batch):
+                    continue
+                frame, seq, _ = worker.sequencer.wait_next(
+                    after_seq=self.processed_seq[camera_id], timeout=0
+                )
+                if frame is None:
+                    continue
+                self.processed_seq[camera_id] = seq
+                batch.append((camera_id, frame))
+
+            if len(batch) >= min(self.max_batch_size, len(self.workers)):
+                break
+
+            if batch and deadline is None:
+                deadline = time.time() + self.max_batch_wait
+            timeout = 1.0 if deadline is None else deadline - time.time()
+            if timeout <= 0:
+                break
+
+            # Đợi camera khác có frame mới
+            if self.frame_event.wait(timeout=timeout):
+                self.frame_event.clear()
+
+        return batch
+
+    def process_batch(self, batch):
+        """
+        Chạy detection (một lần chạy model) + lưu kết quả cho một batch
+
+        Returns:
+            List (camera_id, frame_display)
+        """
+        # Detect trên frame đã resize, biển số được crop từ frame gốc
+        full_frames = [frame for _, frame in batch]
+        batch = [(camera_id, self.detector.prepare_frame(frame)) for camera_id, frame in batch]
+        frames = [frame for _, frame in batch]
+        camera_ids = [camera_id for camera_id, _ in batch]
+        batch_detections = self.detector.detect_batch(frames, camera_ids, full_frames)
+
+        displays = []
+        for (camera_id, frame), detections in zip(batch, batch_detections):
+            frame_display = self.detector.draw_detections(frame.copy(), detections)
+
+            with self.frame_lock:
+                self.latest_frames[camera_id] = frame_display
+
+            self.detector.save_detections(frame_display, detections, camera_id=camera_id)
+            displays.append((camera_id, frame_display))
+        return displays
+
+    def run(self, show_preview=False):
+        """Vòng lặp detection: gom frame mới của các camera thành batch và xử lý"""
+        print("▶️  Bắt đầu phát hiện (multi-camera)...")
+        self.start()
+
+        try:
+            while self.is_running:
+                batch = self.collect_batch()
+                if not batch:
+                    continue
+
+                for camera_id, frame_display in self.process_batch(batch):
+                    if show_preview:
+                        cv2.imshow(f'Camera AI - {camera_id}', frame_display)
+
+                if show_preview and cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+
+        except KeyboardInterrupt:
+            print("\n⏹️  Dừng hệ thống...")
+        finally:
+            self.stop()
+
+    def get_latest_frame(self, camera_id):
+        """Lấy frame đã vẽ mới nhất của một camera"""
+        with self.frame_lock:
+            return self.latest_frames.get(camera_id)
+
+    def get_stats(self):
+        """Thống kê detector + frame của từng camera"""
+        stats = self.detector.get_stats()
+        stats['cameras'] = {
+            camera_id: worker.get_stats()
+            for camera_id, worker in self.workers.items()
+        }
+        return stats
+
+    def stop(self):
+        """Dừng tất cả camera"""
+        self.is_running = False
+        for worker in self.workers.values():
+            worker.stop()
+        self.detector.cleanup()
+
+
+if __name__ == '__main__':
+    manager = MultiCameraManager()
+    manager.run(show_preview=True)
@@ -0,0 +1,330 @@
+"""
+OCR Engines Module
+Giao diện chung cho các OCR engine đọc biển số: recognize_batch(crops) -> [(text, confidence)]
+Engine được đăng ký theo tên và chọn bằng ocr.engine trong config
+"""
+import os
+import threading
+from abc import ABC, abstractmethod
+
+import cv2
+import numpy as np
+
+# Ký tự có trên biển số VN (không có I, J, O, Q, R, W)
+PLATE_CHARS = '0123456789ABCDEFGHKLMNPSTUVXYZ-.'
+
+OCR_ENGINES = {}
+
+# OCR reader dùng chung giữa các engine (vd tầng nhanh + tầng đầy đủ cùng một EasyOCR reader)
+_readers = {}
+_readers_lock = threading.Lock()
+
+
+def register_engine(name):
+    """Decorator đăng ký OCR engine theo tên (giá trị của ocr.engine)"""
+    def decorator(cls):
+        cls.name = name
+        OCR_ENGINES[name] = cls
+        return cls
+    return decorator
+
+
+def _shared_reader(key, factory):
+    with _readers_lock:
+        if key not in _readers:
+            _readers[key] = factory()
+        return _readers[key]
+
+
+def join_lines(lines):
+    """
+    Gộp các dòng text OCR của một crop
+
+    Args:
+        lines: List (text, confidence)
+
+    Returns:
+        (text, confidence trung bình có trọng số theo độ dài) hoặc (None, 0.0)
+    """
+    lines = [(text, float(conf)) for text, conf in lines if text]
+    total = sum(len(text) for text, _ in lines)
+    if not total:
+        return None, 0.0
+    return ' '.join(text for text, _ in lines), sum(len(text) * conf for text, conf in lines) / total
+
+
+def pad_batch(images, height):
+    """
+    Đưa các ảnh về cùng kích thước để OCR batch
+
+    Mỗi ảnh được resize về cùng chiều cao (giữ tỷ lệ) rồi pad bên phải tới
+    chiều rộng lớn nhất trong batch bằng màu trung bình của ảnh (màu đều, không
+    kéo dài ký tự ở mép ảnh vào vùng pad như BORDER_REPLICATE).
+
+    Args:
+        images: List ảnh BGR
+        height: Chiều cao chung (pixel)
+
+    Returns:
+        List ảnh cùng shape (height, max_width, 3)
+    """
+    resized = []
+    for img in images:
+        h, w = img.shape[:2]
+        width = max(1, int(round(w * height / float(h))))
+        img = cv2.resize(img, (width, height), interpolation=cv2.INTER_CUBIC if h < height else cv2.INTER_AREA)
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        resized.append(img)
+
+    max_width = max(img.shape[1] for img in resized)
+    return [
+        cv2.copyMakeBorder(img, 0, 0, 0, max_width - img.shape[1], cv2.BORDER_CONSTANT,
+                           value=[float(c) for c in img.reshape(-1, 3).mean(axis=0)])
+        if img.shape[1] < max_width else img
+        for img in resized
+    ]
+
+
+def group_by_height(images, max_ratio=1.25):
+    """
+    Chia ảnh thành các nhóm có chiều cao gần nhau để OCR batch
+
+    Ảnh cao nhất trong nhóm không quá max_ratio lần ảnh thấp nhất, nên khi
+    cả nhóm được đưa về chiều cao của ảnh thấp nhất thì không ảnh nào bị
+    phóng to và tổng diện tích OCR không tăng.
+
+    Args:
+        images: List ảnh
+        max_ratio: Tỷ lệ chiều cao tối đa trong một nhóm
+
+    Returns:
+        List nhóm, mỗi nhóm là list index ảnh
+    """
+    groups = []
+    for i in sorted(range(len(images)), key=lambda i: images[i].shape[0]):
+        if groups and images[i].shape[0] <= images[groups[-1][0]].shape[0] * max_ratio:
+            groups[-1].append(i)
+        else:
+            groups.append([i])
+    return groups
+
+
+class OCREngine(ABC):
+    """
+    OCR engine đọc crop biển số
+
+    Engine con cài đặt recognize_batch(). fast=True: chỉ chạy recognizer trên
+    cả crop (crop đã là vùng biển số, bỏ bước dò vùng chữ) và giới hạn trong
+    PLATE_CHARS, dùng cho tầng nhanh của OCRCascade.
+    """
+
+    name = None
+    supports_batch = False  # True: nhiều crop được đọc trong một lần gọi model
+    has_fast_mode = True  # False: engine vốn chỉ có recognizer (fast không khác gì)
+
+    def __init__(self, config, fast=False):
+        self.config = config
+        self.fast = fast
+
+    @abstractmethod
+    def recognize_batch(self, crops, height=None):
+        """
+        Đọc text của nhiều crop
+
+        Args:
+            crops: List ảnh BGR
+            height: Chiều cao chung khi pad (None = engine tự chọn, vd theo nhóm chiều cao)
+
+        Returns:
+            List (text thô hoặc None, confidence), mỗi crop một phần tử
+        """
+
+
+@register_engine('easyocr')
+class EasyOCREngine(OCREngine):
+    """EasyOCR: readtext_batched (đầy đủ) hoặc recognize với allowlist (nhanh)"""
+
+    supports_batch = True
+
+    def __init__(self, config, fast=False):
+        super().__init__(config, fast)
+        import easyocr
+        ocr_config = config.get('ocr', {})
+        languages = tuple(ocr_config.get('languages', ['en']))
+        gpu = ocr_config.get('gpu', False)
+        self.reader = _shared_reader(('easyocr', languages, gpu), lambda: easyocr.Reader(list(languages), gpu=gpu))
+
+    def recognize_batch(self, crops, height=None):
+        if not crops:
+            return []
+        try:
+            if self.fast:
+                return self._recognize_stacked(crops, height or max(crop.shape[0] for crop in crops))
+            # Không có chiều cao chung (ảnh cả xe): gom ảnh cao gần nhau, mỗi nhóm
+            # thu nhỏ về ảnh thấp nhất nhóm thay vì phóng to mọi ảnh lên ảnh cao nhất
+            groups = [list(range(len(crops)))] if height else group_by_height(crops)
+            results = [None] * len(crops)
+            for group in groups:
+                imgs = [crops[i] for i in group]
+                if len(imgs) == 1:
+                    group_results = [self.reader.readtext(imgs[0])]
+                else:
+                    batch = pad_batch(imgs, height or min(img.shape[0] for img in imgs))
+                    group_results = self.reader.readtext_batched(batch, batch_size=len(batch))
+                for i, result in zip(group, group_results):
+                    results[i] = result
+        except Exception as e:
+            print(f"Lỗi EasyOCR: {e}")
+            return [(None, 0.0)] * len(crops)
+        return [join_lines([(item[1], item[2]) for item in result]) for result in results]
+
+    def _recognize_stacked(self, crops, height):
+        """Xếp chồng các crop (cùng kích thước) thành một ảnh, mỗi crop một vùng chữ"""
+        canvas = np.vstack(pad_batch(crops, height))
+        width = canvas.shape[1]
+        boxes = [[0, width, i * height, (i + 1) * height] for i in range(len(crops))]
+        result = self.reader.recognize(
+            canvas, horizontal_list=boxes, free_list=[], allowlist=PLATE_CHARS,
+            batch_size=len(crops), detail=1
+        )
+
+        lines = [[] for _ in crops]
+        for box, text, conf in result:
+            top = min(point[1] for point in box)
+            lines[min(int(top // height), len(crops) - 1)].append((text, conf))
+        return [join_lines(crop_lines) for crop_lines in lines]
+
+
+@register_engine('paddleocr')
+class PaddleOCREngine(OCREngine):
+    """PaddleOCR: ocr() (dò vùng chữ + đọc) hoặc ocr(det=False) (nhanh), từng crop một"""
+
+    def __init__(self, config, fast=False):
+        super().__init__(config, fast)
+        from paddleocr import PaddleOCR
+        self.ocr = _shared_reader(('paddleocr',), lambda: PaddleOCR(use_angle_cls=True, lang='en'))
+
+    def recognize_batch(self, crops, height=None):
+        readings = []
+        for crop in crops:
+            try:
+                if self.fast:
+                    result = self.ocr.ocr(crop, det=False, cls=False)
+                    lines = [
+                        (''.join(c for c in text.upper() if c in PLATE_CHARS), conf)
+                        for text, conf in (result[0] if result and result[0] else [])
+                    ]
+                else:
+                    result = self.ocr.ocr(crop)
+                    lines = [line[1] for line in result[0]] if result and result[0] else []
+                readings.append(join_lines(lines))
+            except Exception as e:
+                print(f"Lỗi PaddleOCR: {e}")
+                readings.append((None, 0.0))
+        return readings
+
+
+@register_engine('crnn')
+class CRNNEngine(OCREngine):
+    """
+    Recognizer CRNN + CTC (ONNX Runtime, CPU) chỉ cho ký tự biển số VN
+
+    Model nhận ảnh (N, C, H, W) đã chuẩn hóa về [-1, 1], trả về xác suất
+    (hoặc logits) (N, T, số ký tự + 1) với index 0 là blank của CTC. Biển số
+    2 dòng (xe máy) thường cho confidence thấp -> OCRCascade chuyển sang
+    engine đầy đủ.
+    """
+
+    supports_batch = True
+    has_fast_mode = False
+
+    def __init__(self, config, fast=False):
+        super().__init__(config, fast)
+        import onnxruntime as ort
+
+        crnn_config = config.get('ocr', {}).get('crnn', {})
+        model_path = crnn_config.get('model_path', 'models/plate_crnn.onnx')
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Không tìm thấy model CRNN: {model_path}")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = crnn_config.get('threads', 2)
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Kích thước cố định của model (trục động thì lấy từ config)
+        _, channels, height, width = model_input.shape
+        self.channels = channels if isinstance(channels, int) else 1
+        self.height = height if isinstance(height, int) else crnn_config.get('input_height', 32)
+        self.width = width if isinstance(width, int) else crnn_config.get('input_width', 128)
+        self.charset = crnn_config.get('charset', PLATE_CHARS)
+        self.layout = crnn_config.get('output_layout', 'NTC')
+
+    def _prepare(self, crop):
+        """Resize giữ tỷ lệ về input của model, pad bên phải, chuẩn hóa [-1, 1], CHW"""
+        if self.channels == 1 and crop.ndim == 3:
+            crop = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        h, w = crop.shape[:2]
+        width = min(self.width, max(1, int(round(w * self.height / float(h)))))
+        resized = cv2.resize(crop, (width, self.height), interpolation=cv2.INTER_LINEAR)
+        if resized.ndim == 2:
+            resized = resized[:, :, None]
+
+        canvas = np.zeros((self.height, self.width, self.channels), dtype=np.float32)
+        canvas[:, :width] = resized.astype(np.float32) / 127.5 - 1.0
+        return canvas.transpose(2, 0, 1)
+
+    def _decode(self, probs):
+        """Greedy CTC: bỏ ký tự lặp liền nhau và blank; confidence = trung bình xác suất ký tự"""
+        best = probs.argmax(axis=1)
+        scores = probs.max(axis=1)
+        keep = (best != 0) & np.concatenate([[True], best[1:] != best[:-1]])
+        indices = best[keep] - 1
+        valid = indices < len(self.charset)
+        text = ''.join(self.charset[i] for i in indices[valid])
+        if not text:
+            return None, 0.0
+        return text, float(scores[keep][valid].mean())
+
+    def recognize_batch(self, crops, height=None):
+        if not crops:
+            return []
+        batch = np.stack([self._prepare(crop) for crop in crops])
+        try:
+            output = self.session.run(None, {self.input_name: batch})[0]
+        except Exception as e:
+            print(f"Lỗi CRNN: {e}")
+            return [(None, 0.0)] * len(crops)
+
+        if self.layout == 'TNC':
+            output = output.transpose(1, 0, 2)
+        # Model xuất logits -> softmax
+        if output.min() < 0 or not np.allclose(output.sum(axis=-1), 1.0, atol=1e-3):
+            output = np.exp(output - output.max(axis=-1, keepdims=True))
+            output /= output.sum(axis=-1, keepdims=True)
+        return [self._decode(probs) for probs in output]
+
+
+def create_engine(name, config, fast=False):
+    """
+    Tạo OCR engine theo tên
+
+    Returns:
+        OCREngine hoặc None (tên không hợp lệ / chưa cài thư viện / thiếu model)
+    """
+    engine_cls = OCR_ENGINES.get(name)
+    if engine_cls is None:
+        print(f"⚠️  OCR engine không hợp lệ: {name} (chọn: {', '.join(OCR_ENGINES)})")
+        return None
+    try:
+        engine = engine_cls(config, fast=fast)
+    except ImportError as e:
+        print(f"⚠️  {name} chưa cài đặt ({e}), dùng xử lý cơ bản")
+        return None
+    except OSError as e:
+        print(f"⚠️  Không tải được OCR engine {name}: {e}")
+        return None
+    print(f"✅ OCR engine {name}{' (nhanh)' if fast and engine.has_fast_mode else ''} đã sẵn sàng")
+    return engine
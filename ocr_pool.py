@@ -0,0 +1,179 @@
+"""
+OCR Pool Module
+Đọc biển số bất đồng bộ trên process pool: mỗi worker giữ một OCR reader riêng,
+vòng lặp detection chỉ gửi crop và nhận kết quả khi xong
+"""
+import multiprocessing
+import threading
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+
+import numpy as np
+
+# Detector của từng process worker (tạo một lần trong initializer)
+_detector = None
+
+
+def _init_worker(config):
+    """Khởi tạo plate detector (+ OCR reader) trong process worker"""
+    global _detector
+    from license_plate_yolo import use_yolo_plate
+    if use_yolo_plate(config):
+        from license_plate_yolo import YOLOLicensePlateDetector as LicensePlateDetector
+    else:
+        from license_plate import LicensePlateDetector
+    _detector = LicensePlateDetector(config)
+
+
+def _detect_plate(crop):
+    """Chạy trong process worker: phát hiện + đọc biển số một crop"""
+    return _detector.detect(crop)
+
+
+class OCRWorkerPool:
+    """
+    Process pool đọc biển số bất đồng bộ
+
+    - Mỗi key (vd (camera_id, track_id)) chỉ có tối đa một job đang chạy; crop
+      gửi thêm trong lúc đó được gộp lại (chỉ giữ crop mới nhất) và gửi khi
+      job hiện tại xong.
+    - Tổng số job đang chạy bị giới hạn bởi max_pending; vượt quá -> bỏ crop.
+    - Kết quả được lấy ra bằng poll() từ thread xử lý; key có crop đã nhận
+      nhưng bị bỏ (không bao giờ được đọc) lấy ra bằng poll_dropped().
+    - Worker chết (BrokenProcessPool): broken = True, submit luôn trả False.
+    """
+
+    def __init__(self, config, workers=2, max_pending=8):
+        """
+        Args:
+            config: Config đầy đủ (để worker tạo plate detector)
+            workers: Số process OCR
+            max_pending: Số job tối đa đang chờ / đang chạy
+        """
+        self.max_pending = max(1, max_pending)
+        # spawn: không fork process đang chạy thread/CUDA
+        self.executor = ProcessPoolExecutor(
+            max_workers=max(1, workers),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(config,)
+        )
+
+        # RLock: callback có thể chạy ngay trong submit nếu job xong rất nhanh
+        self.lock = threading.RLock()
+        self.in_flight = {}  # key -> future
+        self.waiting = {}  # key -> crop chờ gửi khi job hiện tại xong
+        self.results = []  # (key, plate_result, crop_shape)
+        self.dropped_keys = []  # Key có crop đã nhận nhưng bị bỏ, không được đọc
+        self.broken = False
+        self.stats = {'submitted': 0, 'completed': 0, 'coalesced': 0, 'dropped': 0, 'errors': 0}
+
+        print(f"🔁 OCR pool: {workers} process, tối đa {self.max_pending} job")
+
+    def submit(self, key, crop):
+        """
+        Gửi crop để đọc biển số
+
+        Returns:
+            True nếu crop sẽ được đọc thêm một lần (gửi ngay hoặc chờ job đang
+            chạy); False nếu bị bỏ, hoặc chỉ thay crop đang chờ của key (số
+            lần đọc không tăng) -> caller hoàn lại lượt OCR
+        """
+        # Copy crop (view của frame) để không giữ cả frame trong lúc chờ
+        crop = np.ascontiguousarray(crop)
+        with self.lock:
+            if self.broken:
+                return False
+            if key in self.in_flight:
+                replaced = key in self.waiting
+                if replaced:
+                    self.stats['coalesced'] += 1
+                self.waiting[key] = crop
+                return not replaced
+            if len(self.in_flight) >= self.max_pending:
+                self.stats['dropped'] += 1
+                return False
+            try:
+                self._submit(key, crop)
+            except BrokenExecutor as e:
+                print(f"❌ OCR pool hỏng (worker đã chết): {e}")
+                self.broken = True
+                return False
+            return True
+
+    def _submit(self, key, crop):
+        """Gửi job (gọi khi đang giữ lock)"""
+        future = self.executor.submit(_detect_plate, crop)
+        self.in_flight[key] = future
+        self.stats['submitted'] += 1
+        future.add_done_callback(lambda f: self._on_done(key, crop.shape, f))
+
+    def _on_done(self, key, crop_shape, future):
+        try:
+            plate_result = future.result()
+            error = False
+        except Exception as e:
+            print(f"⚠️  Lỗi OCR worker: {e}")
+            plate_result = None
+            error = True
+
+        with self.lock:
+            self.in_flight.pop(key, None)
+            self.stats['completed'] += 1
+            if error:
+                self.stats['errors'] += 1
+            self.results.append((key, plate_result, crop_shape))
+
+            # Crop đã gộp trong lúc chờ -> gửi tiếp (vẫn trong giới hạn max_pending)
+            crop = self.waiting.pop(key, None)
+            if crop is None:
+                return
+            if self.broken or len(self.in_flight) >= self.max_pending:
+                self.stats['dropped'] += 1
+                self.dropped_keys.append(key)
+                return
+            try:
+                self._submit(key, crop)
+            except RuntimeError as e:
+                # Pool đã shutdown / worker chết (BrokenProcessPool)
+                if isinstance(e, BrokenExecutor):
+                    self.broken = True
+                self.dropped_keys.append(key)
+
+    def poll(self):
+        """
+        Lấy các kết quả đã xong
+
+        Returns:
+            List (key, plate_result, crop_shape)
+        """
+        with self.lock:
+            results, self.results = self.results, []
+        return results
+
+    def poll_dropped(self):
+        """
+        Lấy các key có crop đã nhận (submit trả True) nhưng bị bỏ, không được đọc
+
+        Returns:
+            List key (mỗi phần tử ứng với một lượt OCR cần hoàn lại)
+        """
+        with self.lock:
+            dropped, self.dropped_keys = self.dropped_keys, []
+        return dropped
+
+    def is_pending(self, key):
+        """Key còn job đang chạy / đang chờ không"""
+        with self.lock:
+            return key in self.in_flight or key in self.waiting
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = len(self.in_flight)
+        return stats
+
+    def shutdown(self):
+        """Dừng pool (bỏ các job chưa chạy)"""
+        with self.lock:
+            self.waiting.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
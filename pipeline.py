@@ -0,0 +1,293 @@
+"""
+Pipeline Module
+Pipeline nhiều stage chạy song song: capture -> infer -> OCR -> render -> sink,
+giữa các stage là queue có giới hạn với chính sách drop khi bị nghẽn
+"""
+import queue
+import threading
+import time
+
+DROP_POLICIES = ('block', 'drop_oldest', 'drop_newest')
+
+
+class BoundedQueue:
+    """
+    Queue có giới hạn với chính sách khi đầy:
+    - block: chờ tới khi có chỗ (không mất item, stage trước bị chậm theo)
+    - drop_oldest: bỏ item cũ nhất để nhận item mới (giữ dữ liệu mới nhất)
+    - drop_newest: bỏ item mới (giữ thứ tự các item đang chờ)
+    """
+
+    def __init__(self, maxsize=8, drop_policy='block', on_drop=None):
+        """
+        Args:
+            maxsize: Số item tối đa
+            drop_policy: 'block', 'drop_oldest' hoặc 'drop_newest'
+            on_drop: Hàm gọi khi một item đã nằm trong queue bị bỏ (drop_oldest)
+        """
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Drop policy không hợp lệ: {drop_policy} (chọn: {', '.join(DROP_POLICIES)})")
+        self.queue = queue.Queue(maxsize=max(1, maxsize))
+        self.drop_policy = drop_policy
+        self.on_drop = on_drop
+        self.dropped = 0
+
+    def put(self, item, stop_event):
+        """
+        Đưa item vào queue theo drop policy
+
+        Returns:
+            True nếu item được nhận
+        """
+        if self.drop_policy == 'block':
+            while not stop_event.is_set():
+                try:
+                    self.queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        if self.drop_policy == 'drop_newest':
+            try:
+                self.queue.put_nowait(item)
+                return True
+            except queue.Full:
+                self.dropped += 1
+                return False
+
+        # drop_oldest
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return True
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                    if self.on_drop is not None:
+                        self.on_drop()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """Lấy item (None nếu hết thời gian chờ)"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def qsize(self):
+        return self.queue.qsize()
+
+
+class Stage:
+    """Một bước xử lý của pipeline: nhận item từ queue, gọi func, đẩy kết quả sang stage sau"""
+
+    def __init__(self, name, func, workers=1, queue_size=8, drop_policy='block',
+                 batched=False, batch_size=1, batch_wait_ms=0):
+        """
+        Args:
+            name: Tên stage (hiển thị trong thống kê)
+            func: Hàm xử lý item -> item (None = không đẩy tiếp, vd sink)
+            workers: Số thread xử lý (>1 có thể làm đổi thứ tự item)
+            queue_size: Kích thước queue đầu vào
+            drop_policy: 'block', 'drop_oldest' hoặc 'drop_newest'
+            batched: True -> func nhận list item và trả về list item
+            batch_size: Số item tối đa mỗi lần gọi func (khi batched)
+            batch_wait_ms: Sau item đầu tiên, chờ thêm tối đa bấy nhiêu ms để gom batch
+        """
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.input = BoundedQueue(queue_size, drop_policy, on_drop=self._release)
+        self.batched = batched
+        self.batch_size = max(1, batch_size) if batched else 1
+        self.batch_wait = batch_wait_ms / 1000.0
+
+        self.outputs = []  # Queue đầu vào của các stage sau (hoặc output của pipeline)
+        self.threads = []
+        # Số item đã nhận mà chưa xong: đang chờ trong queue hoặc đang xử lý, tính
+        # tới khi kết quả đã được đẩy sang stage sau (is_idle không bỏ sót item)
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.stats = {'processed': 0, 'errors': 0, 'total_ms': 0.0}
+
+    def put(self, item, stop_event):
+        with self.lock:
+            self.pending += 1
+        accepted = self.input.put(item, stop_event)
+        if not accepted:
+            self._release()
+        return accepted
+
+    def _release(self, count=1):
+        with self.lock:
+            self.pending -= count
+
+    def _take(self, stop_event):
+        """Lấy một item (hoặc một batch) từ queue đầu vào"""
+        item = self.input.get(timeout=0.1)
+        if item is None:
+            return []
+
+        items = [item]
+        deadline = time.time() + self.batch_wait
+        while len(items) < self.batch_size and not stop_event.is_set():
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0:
+                    items.append(self.input.queue.get(timeout=remaining))
+                else:
+                    items.append(self.input.queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _worker(self, stop_event):
+        while not stop_event.is_set():
+            items = self._take(stop_event)
+            if not items:
+                continue
+
+            start_time = time.time()
+            try:
+                if self.batched:
+                    results = self.func(items) or []
+                else:
+                    results = [self.func(items[0])]
+            except Exception as e:
+                results = []
+                with self.lock:
+                    self.stats['errors'] += 1
+                print(f"❌ Lỗi stage {self.name}: {e}")
+            with self.lock:
+                self.stats['processed'] += len(items)
+                self.stats['total_ms'] += (time.time() - start_time) * 1000
+
+            try:
+                for result in results:
+                    if result is None:
+                        continue
+                    for output in self.outputs:
+                        output.put(result, stop_event)
+            finally:
+                # Chỉ hết "đang xử lý" sau khi kết quả đã nằm trong queue của stage sau
+                self._release(len(items))
+
+    def start(self, stop_event):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, args=(stop_event,),
+                                      name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def is_idle(self):
+        """Không còn item đang chờ hoặc đang xử lý"""
+        with self.lock:
+            return self.pending == 0
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        processed = stats.pop('processed')
+        total_ms = stats.pop('total_ms')
+        stats.update({
+            'processed': processed,
+            'dropped': self.input.dropped,
+            'queue': self.input.qsize(),
+            'avg_ms': round(total_ms / processed, 1) if processed else None,
+            'workers': self.workers
+        })
+        return stats
+
+
+class Pipeline:
+    """
+    Pipeline: một thread source đọc frame + các Stage nối với nhau
+
+    Stage đầu tiên nhận item từ source; mỗi stage có thể đẩy sang nhiều stage
+    sau (vd render -> ghi video + lưu database) và/hoặc ra output của pipeline
+    để thread chính lấy bằng get() (preview, dashboard).
+    """
+
+    def __init__(self, source, output_size=2):
+        """
+        Args:
+            source: Hàm không tham số trả về item mới, None nếu chưa có
+                (sẽ gọi lại), raise StopIteration khi hết nguồn
+            output_size: Kích thước queue output (luôn drop_oldest)
+        """
+        self.source = source
+        self.stages = []
+        self.output = BoundedQueue(output_size, 'drop_oldest')
+
+        self.stop_event = threading.Event()
+        self.source_thread = None
+        self.source_done = False
+
+    def add_stage(self, stage, after=None):
+        """
+        Thêm stage vào pipeline
+
+        Args:
+            stage: Stage
+            after: Stage phía trước (None = stage đầu tiên, nhận từ source)
+
+        Returns:
+            stage
+        """
+        if after is not None:
+            after.outputs.append(stage)
+        self.stages.append(stage)
+        return stage
+
+    def connect_output(self, stage):
+        """Đẩy kết quả của stage ra output của pipeline"""
+        stage.outputs.append(self.output)
+
+    def start(self):
+        """Bắt đầu thread source và worker của tất cả stage"""
+        self.stop_event.clear()
+        self.source_done = False
+        for stage in self.stages:
+            stage.start(self.stop_event)
+        self.source_thread = threading.Thread(target=self._source_loop, name='source', daemon=True)
+        self.source_thread.start()
+
+    def _source_loop(self):
+        first_stage = self.stages[0]
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    item = self.source()
+                except StopIteration:
+                    break
+                if item is not None:
+                    first_stage.put(item, self.stop_event)
+        finally:
+            self.source_done = True
+
+    def get(self, timeout=1.0):
+        """Lấy item từ output của pipeline (None nếu chưa có)"""
+        return self.output.get(timeout=timeout)
+
+    def is_done(self):
+        """Source đã hết và mọi stage đã xử lý xong"""
+        return self.source_done and all(stage.is_idle() for stage in self.stages)
+
+    def stop(self, timeout=2):
+        """Dừng source và tất cả stage"""
+        self.stop_event.set()
+        if self.source_thread:
+            self.source_thread.join(timeout=timeout)
+        for stage in self.stages:
+            for thread in stage.threads:
+                thread.join(timeout=timeout)
+            stage.threads = []
+
+    def get_stats(self):
+        """Thống kê từng stage: số item đã xử lý / bị drop / đang chờ, thời gian trung bình"""
+        stats = {stage.name: stage.get_stats() for stage in self.stages}
+        stats['output'] = {'dropped': self.output.dropped, 'queue': self.output.qsize()}
+        return stats
@@ -0,0 +1,166 @@
+"""
+Plate Cache Module
+Cache kết quả OCR biển số theo perceptual hash (dHash) của crop: xe đứng yên
+cho ra các crop gần như giống hệt nhau qua nhiều frame, chỉ cần OCR một lần
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def dhash(img, hash_width=32, hash_height=8, dead_zone=4):
+    """
+    Difference hash của ảnh
+
+    Ảnh xám được thu nhỏ về (hash_width + 1) x hash_height; mỗi cặp pixel kề
+    nhau theo chiều ngang cho 2 bit: sáng lên / tối đi rõ rệt (chênh lệch lớn
+    hơn dead_zone). Vùng phẳng (nền biển số) cho 00 nên nhiễu sensor và độ
+    sáng thay đổi nhẹ không làm đổi hash.
+
+    Returns:
+        Hash dạng int (2 * hash_width * hash_height bit)
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    small = cv2.resize(gray, (hash_width + 1, hash_height), interpolation=cv2.INTER_AREA).astype(np.int16)
+    diff = small[:, 1:] - small[:, :-1]
+    bits = np.concatenate([(diff > dead_zone).ravel(), (diff < -dead_zone).ravel()])
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+class PlateOCRCache:
+    """
+    LRU cache kết quả OCR theo dHash của crop biển số
+
+    - Crop có hash cách hash đã lưu không quá max_distance bit (Hamming) được
+      coi là trùng và nhận lại kết quả cũ ngay, không gọi OCR.
+    - Mỗi entry sống tối đa ttl giây (xe khác có thể dừng đúng chỗ cũ).
+    - Vượt max_size entry thì bỏ entry ít dùng nhất.
+    """
+
+    def __init__(self, max_size=512, ttl=5.0, max_distance=3, hash_width=32, hash_height=8):
+        """
+        Args:
+            max_size: Số entry tối đa
+            ttl: Thời gian sống của entry (giây)
+            max_distance: Số bit khác nhau tối đa để coi hai crop là trùng (0 = chỉ trùng
+                hash). Biển số khác nhau một ký tự chỉ lệch vài bit nên giữ giá trị nhỏ
+            hash_width, hash_height: Kích thước dHash
+        """
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.hash_width = hash_width
+        self.hash_height = hash_height
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # hash -> (value, thời điểm lưu), cũ -> mới theo lần dùng
+        self.stats = {'hits': 0, 'misses': 0, 'evicted': 0, 'expired': 0}
+
+    def key(self, img):
+        """Hash của crop"""
+        return dhash(img, self.hash_width, self.hash_height)
+
+    def _find(self, key, now):
+        """Hash đã lưu trùng / gần với key nhất (gọi khi đang giữ lock)"""
+        # Bỏ entry hết hạn (thứ tự LRU khác thứ tự thời gian lưu nên duyệt hết)
+        expired = [k for k, (_, stored_at) in self.entries.items() if now - stored_at > self.ttl]
+        for k in expired:
+            del self.entries[k]
+        self.stats['expired'] += len(expired)
+
+        if key in self.entries:
+            return key
+        if self.max_distance <= 0 or not self.entries:
+            return None
+        best_key, best_distance = None, self.max_distance + 1
+        for k in self.entries:
+            distance = bin(k ^ key).count('1')
+            if distance < best_distance:
+                best_key, best_distance = k, distance
+        return best_key
+
+    def get(self, key):
+        """
+        Returns:
+            (hit, value)
+        """
+        now = time.time()
+        with self.lock:
+            found = self._find(key, now)
+            if found is None:
+                self.stats['misses'] += 1
+                return False, None
+            self.entries.move_to_end(found)
+            self.stats['hits'] += 1
+            return True, self.entries[found][0]
+
+    def put(self, key, value):
+        """Lưu kết quả OCR của crop có hash key"""
+        with self.lock:
+            self.entries[key] = (value, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.stats['evicted'] += 1
+
+    def read_batch(self, imgs, read_func, return_hits=False):
+        """
+        Đọc nhiều crop qua cache: chỉ crop chưa có trong cache mới được OCR
+
+        Kết quả rỗng (text None) không được lưu, để crop đó được đọc lại ở frame sau.
+
+        Args:
+            imgs: List crop
+            read_func: Hàm OCR list crop -> list (text, confidence) (chỉ gọi với crop bị miss)
+            return_hits: True -> trả thêm list cờ kết quả lấy từ cache
+
+        Returns:
+            List kết quả, mỗi crop một phần tử (kèm list hit nếu return_hits)
+        """
+        keys = [self.key(img) for img in imgs]
+        values = [None] * len(imgs)
+        hits = [False] * len(imgs)
+        misses = []
+        for i, key in enumerate(keys):
+            hit, value = self.get(key)
+            if hit:
+                values[i] = value
+                hits[i] = True
+            else:
+                misses.append(i)
+
+        if misses:
+            for i, value in zip(misses, read_func([imgs[i] for i in misses])):
+                values[i] = value
+                if value and value[0]:
+                    self.put(keys[i], value)
+        return (values, hits) if return_hits else values
+
+    def get_stats(self):
+        """Số lần hit / miss, tỷ lệ hit, số entry bị bỏ (đầy / hết hạn)"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self.entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+        return stats
+
+
+def create_ocr_cache(config):
+    """
+    Tạo PlateOCRCache từ ocr.cache
+
+    Returns:
+        PlateOCRCache hoặc None nếu tắt
+    """
+    cache_config = config.get('ocr', {}).get('cache', {})
+    if not cache_config.get('enabled', True):
+        return None
+    return PlateOCRCache(
+        max_size=cache_config.get('max_size', 512),
+        ttl=cache_config.get('ttl_seconds', 5.0),
+        max_distance=cache_config.get('max_distance', 3)
+    )
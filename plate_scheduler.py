@@ -0,0 +1,229 @@
+"""
+Plate Scheduler Module
+Lên lịch OCR biển số theo từng xe đang được track: chỉ đọc vài crop tốt nhất,
+gộp kết quả bằng bỏ phiếu theo từng ký tự và dừng khi kết quả đã ổn định
+"""
+from collections import Counter, defaultdict
+
+import cv2
+
+
+def crop_quality(crop, sample_size=128):
+    """
+    Điểm chất lượng crop = diện tích x độ nét (phương sai Laplacian)
+
+    Độ nét được tính trên ảnh xám đã thu nhỏ nên chi phí gần như cố định.
+    """
+    if crop is None or crop.size == 0:
+        return 0.0
+    h, w = crop.shape[:2]
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    scale = sample_size / max(h, w)
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    sharpness = cv2.Laplacian(gray, cv2.CV_32F).var()
+    return float(h * w) * float(sharpness)
+
+
+def vote_plate(readings):
+    """
+    Gộp nhiều lần đọc biển số bằng bỏ phiếu theo từng ký tự
+
+    Chỉ các lần đọc có độ dài phổ biến nhất (tính theo tổng confidence) được
+    dùng; mỗi vị trí chọn ký tự có tổng confidence cao nhất.
+
+    Args:
+        readings: List (text, confidence)
+
+    Returns:
+        (text, confidence) hoặc (None, 0.0)
+    """
+    if not readings:
+        return None, 0.0
+
+    length_weights = defaultdict(float)
+    for text, conf in readings:
+        length_weights[len(text)] += conf
+    length = max(length_weights, key=length_weights.get)
+    candidates = [(text, conf) for text, conf in readings if len(text) == length]
+    total = sum(conf for _, conf in candidates)
+
+    chars = []
+    agreement = 0.0
+    for i in range(length):
+        votes = defaultdict(float)
+        for text, conf in candidates:
+            votes[text[i]] += conf
+        char = max(votes, key=votes.get)
+        chars.append(char)
+        agreement += votes[char] / max(total, 1e-9)
+
+    # Confidence = độ đồng thuận trung bình x confidence trung bình
+    mean_conf = total / len(candidates)
+    return ''.join(chars), (agreement / max(length, 1)) * mean_conf
+
+
+class PlateTrackState:
+    """Trạng thái OCR biển số của một xe"""
+
+    def __init__(self):
+        self.readings = []  # (text, confidence) các lần đọc hợp lệ
+        self.attempts = 0
+        self.frames_since_read = 0
+        self.best_quality = 0.0
+        self.text = None
+        self.confidence = 0.0
+        self.bbox = None  # Vị trí biển số tương đối trong crop (0..1)
+        self.history = Counter()  # Số lần mỗi kết quả gộp xuất hiện
+        self.locked = False
+
+
+class PlateScheduler:
+    """
+    Quyết định khi nào cần OCR biển số cho một xe và lưu kết quả đã gộp
+
+    Các lần đọc cách nhau ít nhất read_interval frame. Khi chưa đủ min_votes
+    lần đọc, crop chỉ cần không tệ hơn nhiều so với crop tốt nhất; sau đó chỉ
+    OCR lại khi crop tốt hơn rõ rệt. Tổng số lần đọc mỗi xe bị giới hạn; khi
+    kết quả gộp ổn định, biển số được khóa và dùng lại cho đến khi track kết thúc.
+    """
+
+    def __init__(self, max_reads=5, min_votes=3, stable_count=2, quality_gain=1.2,
+                 min_quality_ratio=0.7, read_interval=3):
+        """
+        Args:
+            max_reads: Số lần OCR tối đa cho mỗi xe
+            min_votes: Số lần đọc hợp lệ tối thiểu trước khi khóa kết quả
+            stable_count: Số lần kết quả gộp giống nhau để khóa
+            quality_gain: Đủ phiếu rồi: chỉ OCR lại khi crop tốt hơn crop tốt nhất x lần
+            min_quality_ratio: Chưa đủ phiếu: bỏ qua crop kém hơn tỷ lệ này so với crop tốt nhất
+            read_interval: Số frame tối thiểu giữa hai lần OCR cùng một xe
+        """
+        self.max_reads = max_reads
+        self.min_votes = min_votes
+        self.stable_count = stable_count
+        self.quality_gain = quality_gain
+        self.min_quality_ratio = min_quality_ratio
+        self.read_interval = read_interval
+
+        self.states = {}
+        self.stats = {'ocr_calls': 0, 'skipped': 0, 'locked': 0, 'cached': 0}
+
+    def should_read(self, key, crop):
+        """
+        Crop này có cần OCR không?
+
+        Args:
+            key: Khóa của xe, vd (camera_id, track_id)
+            crop: Ảnh vùng xe
+
+        Returns:
+            True nếu nên chạy OCR
+        """
+        state = self.states.setdefault(key, PlateTrackState())
+        state.frames_since_read += 1
+        if state.locked or state.attempts >= self.max_reads:
+            self.stats['skipped'] += 1
+            return False
+
+        if state.attempts:
+            if state.frames_since_read < self.read_interval:
+                self.stats['skipped'] += 1
+                return False
+            quality = crop_quality(crop)
+            ratio = self.min_quality_ratio if len(state.readings) < self.min_votes else self.quality_gain
+            if quality < state.best_quality * ratio:
+                self.stats['skipped'] += 1
+                return False
+        else:
+            quality = crop_quality(crop)
+
+        state.best_quality = max(state.best_quality, quality)
+        state.attempts += 1
+        state.frames_since_read = 0
+        self.stats['ocr_calls'] += 1
+        return True
+
+    def cancel_read(self, key):
+        """Hoàn lại lượt OCR khi crop đã chọn không được đọc (vd OCR pool đầy)"""
+        state = self.states.get(key)
+        if state is not None and state.attempts:
+            state.attempts -= 1
+            self.stats['ocr_calls'] -= 1
+            self.stats['skipped'] += 1
+
+    def add_reading(self, key, plate_result, crop_shape):
+        """
+        Thêm kết quả OCR của một crop và gộp lại
+
+        Args:
+            key: Khóa của xe
+            plate_result: Kết quả từ plate_detector.detect (hoặc None)
+            crop_shape: Kích thước crop (để lưu vị trí biển số tương đối)
+
+        Returns:
+            True nếu kết quả gộp vừa được khóa
+        """
+        state = self.states.setdefault(key, PlateTrackState())
+        if not plate_result or not plate_result.get('text'):
+            return False
+        # Kết quả lấy từ OCR cache (crop gần giống crop đã đọc, xe đứng yên) chỉ là
+        # lần đọc cũ lặp lại: không tính là phiếu mới, và không có OCR nào chạy nên
+        # hoàn lại lượt đọc (xe đứng yên không bị hết max_reads mà không đủ phiếu)
+        if plate_result.get('cached'):
+            self.cancel_read(key)
+            self.stats['cached'] += 1
+            return False
+
+        state.readings.append((plate_result['text'], float(plate_result.get('confidence', 0.0))))
+        if plate_result.get('bbox'):
+            h, w = crop_shape[:2]
+            px, py, pw, ph = plate_result['bbox']
+            state.bbox = (px / w, py / h, pw / w, ph / h)
+
+        state.text, state.confidence = vote_plate(state.readings)
+        state.history[state.text] += 1
+
+        if (len(state.readings) >= self.min_votes
+                and state.history[state.text] >= self.stable_count):
+            state.locked = True
+            self.stats['locked'] += 1
+            return True
+        return False
+
+    def get_result(self, key, crop_shape):
+        """
+        Kết quả đã gộp của một xe (dạng giống plate_detector.detect)
+
+        Args:
+            key: Khóa của xe
+            crop_shape: Kích thước crop hiện tại (để đổi bbox tương đối)
+
+        Returns:
+            Dict text/confidence/bbox/locked hoặc None
+        """
+        state = self.states.get(key)
+        if state is None or state.text is None:
+            return None
+
+        bbox = None
+        if state.bbox:
+            h, w = crop_shape[:2]
+            rx, ry, rw, rh = state.bbox
+            bbox = (int(rx * w), int(ry * h), int(rw * w), int(rh * h))
+        return {
+            'text': state.text,
+            'confidence': state.confidence,
+            'bbox': bbox,
+            'locked': state.locked
+        }
+
+    def remove(self, key):
+        """Xóa trạng thái khi track kết thúc"""
+        self.states.pop(key, None)
+
+    def get_stats(self):
+        """Thống kê số lần OCR / bỏ qua / khóa"""
+        stats = dict(self.stats)
+        stats['active_tracks'] = len(self.states)
+        return stats
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Quantize model YOLO sang INT8 (ONNX Runtime static quantization) cho CPU
+Calibrate bằng frame lấy từ video trong videos/, xuất báo cáo độ chính xác/tốc độ so với FP32
+
+Sử dụng: python quantize_models.py [--models person plate] [--calib-frames 100] [--eval-frames 100]
+Sau khi chạy xong, đặt performance.precision: "int8" trong config.yaml
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+import yaml
+from ultralytics import YOLO
+
+from box_utils import box_iou
+from inference_backend import DEFAULT_CACHE_DIR, export_cached, get_int8_path
+from license_plate_yolo import get_plate_model_path
+
+VIDEO_EXTENSIONS = ('*.mp4', '*.avi', '*.mkv', '*.mov')
+
+
+def sample_frames(video_dir, num_frames, offset=0.0):
+    """
+    Lấy frame rải đều từ tất cả video trong thư mục
+
+    Args:
+        video_dir: Thư mục chứa video
+        num_frames: Tổng số frame cần lấy
+        offset: Dịch vị trí lấy mẫu (0-1 bước), để tập calibration và
+            tập đánh giá không trùng frame
+
+    Returns:
+        List frame BGR
+    """
+    videos = sorted(p for ext in VIDEO_EXTENSIONS for p in glob.glob(os.path.join(video_dir, ext)))
+    if not videos:
+        raise FileNotFoundError(f"Không có video nào trong {video_dir}")
+
+    per_video = max(1, num_frames // len(videos))
+    frames = []
+    for video in videos:
+        cap = cv2.VideoCapture(video)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if total <= 0:
+            cap.release()
+            continue
+        step = total / per_video
+        for i in range(per_video):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int((i + offset) * step) % total)
+            ret, frame = cap.read()
+            if ret:
+                frames.append(frame)
+        cap.release()
+
+    print(f"🎞️  Lấy {len(frames)} frame từ {len(videos)} video")
+    return frames[:num_frames]
+
+
+def letterbox_tensor(frame, imgsz):
+    """Tiền xử lý giống ultralytics: letterbox, BGR->RGB, /255, NCHW float32"""
+    h, w = frame.shape[:2]
+    scale = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top = (imgsz - new_h) // 2
+    left = (imgsz - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+
+    tensor = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return tensor[None]
+
+
+class FrameCalibrationReader:
+    """CalibrationDataReader cho onnxruntime.quantization từ list frame"""
+
+    def __init__(self, frames, input_name, imgsz):
+        self.frames = frames
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self._iter = iter(frames)
+
+    def get_next(self):
+        frame = next(self._iter, None)
+        if frame is None:
+            return None
+        return {self.input_name: letterbox_tensor(frame, self.imgsz)}
+
+    def rewind(self):
+        """Đọc lại từ frame đầu tiên (calibrator có thể duyệt nhiều lượt)"""
+        self._iter = iter(self.frames)
+
+
+def quantize_model(model_path, calib_frames, imgsz, cache_dir):
+    """
+    Export FP32 ONNX (qua cache của inference_backend) rồi quantize INT8
+
+    Returns:
+        (fp32_path, int8_path)
+    """
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    model = YOLO(model_path)
+    source_path = getattr(model, 'ckpt_path', None) or model_path
+    fp32_path = export_cached(model, source_path, 'onnx', imgsz, cache_dir, dynamic=True)
+    int8_path = get_int8_path(source_path, imgsz, cache_dir)
+
+    # Chuẩn bị model (shape inference + fold constant) trước khi quantize
+    prep_path = int8_path.replace('_int8.onnx', '_prep.onnx')
+    try:
+        quant_pre_process(fp32_path, prep_path)
+
+        input_name = ort.InferenceSession(prep_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+        reader = FrameCalibrationReader(calib_frames, input_name, imgsz)
+
+        print(f"⚙️  Đang quantize INT8: {os.path.basename(source_path)} ({len(calib_frames)} frame calibration)...")
+        quantize_static(
+            prep_path,
+            int8_path,
+            reader,
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            calibrate_method=CalibrationMethod.MinMax,
+            # Chỉ quantize Conv/MatMul, phần decode box ở head giữ FP32
+            op_types_to_quantize=['Conv', 'MatMul']
+        )
+    except Exception:
+        # Không để lại model INT8 dở dang trong cache (inference_backend sẽ nạp nhầm)
+        if os.path.exists(int8_path):
+            os.remove(int8_path)
+        raise
+    finally:
+        # File trung gian, không giữ trong cache export
+        if os.path.exists(prep_path):
+            os.remove(prep_path)
+
+    # Giữ metadata của ultralytics (names, imgsz, stride) cho model INT8
+    _copy_metadata(fp32_path, int8_path)
+
+    print(f"✅ Model INT8: {int8_path}")
+    return fp32_path, int8_path
+
+
+def _copy_metadata(src_path, dst_path):
+    """Copy metadata_props (class names, stride...) từ model FP32 sang INT8"""
+    import onnx
+
+    src = onnx.load(src_path, load_external_data=False)
+    dst = onnx.load(dst_path)
+    existing = {prop.key for prop in dst.metadata_props}
+    for prop in src.metadata_props:
+        if prop.key not in existing:
+            dst.metadata_props.add(key=prop.key, value=prop.value)
+    onnx.save(dst, dst_path)
+
+
+def run_predictions(model, frames, imgsz):
+    """
+    Chạy model trên từng frame, đo thời gian
+
+    Returns:
+        (predictions, fps) - predictions: list array (N, 6) x1, y1, x2, y2, conf, cls
+    """
+    # Warmup
+    model(frames[0], imgsz=imgsz, conf=0.01, verbose=False)
+
+    predictions = []
+    start = time.perf_counter()
+    for frame in frames:
+        result = model(frame, imgsz=imgsz, conf=0.01, verbose=False)[0]
+        predictions.append(result.boxes.data.cpu().numpy()[:, :6])
+    elapsed = time.perf_counter() - start
+    return predictions, len(frames) / max(elapsed, 1e-9)
+
+
+def average_precision(recall, precision):
+    """AP (all-point interpolation) từ đường precision/recall"""
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    idx = np.where(mrec[1:] != mrec[:-1])[0]
+    return float(np.sum((mrec[idx + 1] - mrec[idx]) * mpre[idx + 1]))
+
+
+def match_predictions(gt_boxes, pred_boxes, iou_threshold=0.5):
+    """
+    Ghép prediction (đã sort conf giảm dần) với ground truth theo IoU
+
+    Returns:
+        Array bool (len(pred_boxes),) - True nếu prediction khớp một GT chưa dùng
+    """
+    matched = np.zeros(len(pred_boxes), dtype=bool)
+    if len(gt_boxes) == 0 or len(pred_boxes) == 0:
+        return matched
+
+    ious = box_iou(pred_boxes, gt_boxes)
+    used = np.zeros(len(gt_boxes), dtype=bool)
+    for i in range(len(pred_boxes)):
+        candidates = np.where(~used & (ious[i] >= iou_threshold))[0]
+        if len(candidates):
+            best = candidates[np.argmax(ious[i, candidates])]
+            used[best] = True
+            matched[i] = True
+    return matched
+
+
+def compare_predictions(fp32_preds, int8_preds, class_thresholds, iou_threshold=0.5):
+    """
+    So sánh INT8 với FP32 (FP32 tại ngưỡng cấu hình làm ground truth giả)
+
+    Returns:
+        Dict: map50 (mAP proxy) và recall từng class tại ngưỡng cấu hình
+    """
+    per_class = {}
+    for cls, threshold in class_thresholds.items():
+        scores, tps = [], []
+        num_gt = 0
+        hits = 0
+        for fp32, int8 in zip(fp32_preds, int8_preds):
+            gt = fp32[(fp32[:, 5] == cls) & (fp32[:, 4] >= threshold), :4]
+            pred = int8[int8[:, 5] == cls]
+            pred = pred[np.argsort(-pred[:, 4])]
+            num_gt += len(gt)
+
+            matched = match_predictions(gt, pred[:, :4], iou_threshold)
+            scores.append(pred[:, 4])
+            tps.append(matched)
+
+            # Recall tại đúng ngưỡng deploy
+            confident = pred[pred[:, 4] >= threshold, :4]
+            hits += int(match_predictions(gt, confident, iou_threshold).sum())
+
+        if num_gt == 0:
+            continue
+
+        scores = np.concatenate(scores)
+        tps = np.concatenate(tps)[np.argsort(-scores)]
+        tp_cum = np.cumsum(tps)
+        recall_curve = tp_cum / num_gt
+        precision_curve = tp_cum / np.arange(1, len(tps) + 1)
+
+        per_class[int(cls)] = {
+            'ground_truth': num_gt,
+            'threshold': threshold,
+            'ap50': average_precision(recall_curve, precision_curve),
+            'recall': hits / num_gt
+        }
+
+    map50 = float(np.mean([c['ap50'] for c in per_class.values()])) if per_class else None
+    return {'map50_proxy': map50, 'per_class': per_class}
+
+
+def evaluate(name, model_path, fp32_path, int8_path, eval_frames, imgsz, class_thresholds):
+    """Đánh giá FP32 vs INT8 trên tập frame đánh giá"""
+    print(f"📊 Đang đánh giá {name}...")
+    fp32_model = YOLO(fp32_path, task='detect')
+    int8_model = YOLO(int8_path, task='detect')
+
+    fp32_preds, fp32_fps = run_predictions(fp32_model, eval_frames, imgsz)
+    int8_preds, int8_fps = run_predictions(int8_model, eval_frames, imgsz)
+
+    # Một ngưỡng chung -> áp dụng cho mọi class FP32 phát hiện được
+    if not isinstance(class_thresholds, dict):
+        classes = np.unique(np.concatenate([p[p[:, 4] >= class_thresholds, 5] for p in fp32_preds]))
+        class_thresholds = {int(cls): class_thresholds for cls in classes}
+
+    comparison = compare_predictions(fp32_preds, int8_preds, class_thresholds)
+    names = fp32_model.names
+    for cls, metrics in comparison['per_class'].items():
+        metrics['name'] = names.get(cls, str(cls)) if isinstance(names, dict) else str(cls)
+
+    return {
+        'model': model_path,
+        'fp32_path': fp32_path,
+        'int8_path': int8_path,
+        'fp32_size_mb': round(os.path.getsize(fp32_path) / 1e6, 2),
+        'int8_size_mb': round(os.path.getsize(int8_path) / 1e6, 2),
+        'fp32_fps': round(fp32_fps, 2),
+        'int8_fps': round(int8_fps, 2),
+        'speedup': round(int8_fps / max(fp32_fps, 1e-9), 2),
+        **comparison
+    }
+
+
+def write_report(report, output_dir):
+    """Ghi báo cáo JSON + Markdown"""
+    os.makedirs(output_dir, exist_ok=True)
+    json_path = os.path.join(output_dir, 'quantization_report.json')
+    md_path = os.path.join(output_dir, 'quantization_report.md')
+
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    lines = [
+        '# Báo cáo quantize INT8',
+        '',
+        f"- Thời gian: {report['created_at']}",
+        f"- imgsz: {report['imgsz']}",
+        f"- Frame calibration / đánh giá: {report['calib_frames']} / {report['eval_frames']}",
+        '- mAP proxy: AP@0.5 của INT8 so với FP32 (FP32 tại ngưỡng cấu hình làm ground truth)',
+        '',
+    ]
+    for name, result in report['models'].items():
+        lines += [
+            f"## {name}",
+            '',
+            f"- FP32: {result['fp32_fps']} FPS, {result['fp32_size_mb']} MB",
+            f"- INT8: {result['int8_fps']} FPS, {result['int8_size_mb']} MB (x{result['speedup']})",
+            f"- mAP proxy: {result['map50_proxy']:.3f}" if result['map50_proxy'] is not None
+            else '- mAP proxy: không có ground truth',
+            '',
+            '| Class | Ngưỡng | GT | AP@0.5 | Recall |',
+            '|---|---|---|---|---|',
+        ]
+        for metrics in result['per_class'].values():
+            lines.append(
+                f"| {metrics['name']} | {metrics['threshold']} | {metrics['ground_truth']} "
+                f"| {metrics['ap50']:.3f} | {metrics['recall']:.3f} |"
+            )
+        lines.append('')
+
+    with open(md_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+
+    print(f"📝 Báo cáo: {json_path}, {md_path}")
+
+
+def get_model_targets(config):
+    """
+    Danh sách model cần quantize và ngưỡng từng class
+
+    Returns:
+        Dict name -> (model_path, {class_id: threshold} hoặc một ngưỡng chung)
+    """
+    det = config['detection']
+    thresholds = {cls: det['person_confidence'] for cls in det['person_classes']}
+    thresholds.update({cls: det['vehicle_confidence'] for cls in det['vehicle_classes']})
+
+    person_model = det['person_model'] if os.path.exists(det['person_model']) else 'yolo11n.pt'
+    targets = {'person': (person_model, thresholds)}
+
+    # Model biển số mà YOLOLicensePlateDetector đang dùng
+    plate_model = get_plate_model_path(config)
+    if plate_model and os.path.exists(plate_model):
+        targets['plate'] = (plate_model, det.get('plate_confidence', 0.25))
+    return targets
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Quantize YOLO models sang INT8 cho CPU')
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--videos', default='videos', help='Thư mục video để lấy frame calibration')
+    parser.add_argument('--models', nargs='+', default=['person', 'plate'], help='person, plate')
+    parser.add_argument('--calib-frames', type=int, default=100)
+    parser.add_argument('--eval-frames', type=int, default=100)
+    parser.add_argument('--imgsz', type=int, default=None)
+    parser.add_argument('--output', default='models', help='Thư mục ghi báo cáo')
+    args = parser.parse_args()
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+
+    imgsz = args.imgsz or config.get('performance', {}).get('imgsz', 640)
+    calib_frames = sample_frames(args.videos, args.calib_frames, offset=0.0)
+    eval_frames = sample_frames(args.videos, args.eval_frames, offset=0.5)
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'imgsz': imgsz,
+        'calib_frames': len(calib_frames),
+        'eval_frames': len(eval_frames),
+        'models': {}
+    }
+
+    targets = get_model_targets(config)
+    for name in args.models:
+        if name not in targets:
+            print(f"⚠️  Bỏ qua {name}: không tìm thấy model")
+            continue
+        model_path, thresholds = targets[name]
+        fp32_path, int8_path = quantize_model(model_path, calib_frames, imgsz, DEFAULT_CACHE_DIR)
+        report['models'][name] = evaluate(
+            name, model_path, fp32_path, int8_path, eval_frames, imgsz, thresholds
+        )
+
+    write_report(report, args.output)
+    print('\n✅ Xong! Đặt performance.precision: "int8" trong config.yaml để dùng model INT8')
+
+
+if __name__ == '__main__':
+    main()
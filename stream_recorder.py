@@ -0,0 +1,164 @@
+"""
+Stream Recorder Module
+Ghi video bằng FFMPEG stream-copy (không decode/encode) thành các segment xoay vòng
+"""
+import os
+import subprocess
+import threading
+import time
+
+
+def cleanup_old_recordings(save_path, retention_days, prefix='recording_'):
+    """
+    Xóa các file ghi hình cũ hơn retention_days ngày
+
+    Args:
+        save_path: Thư mục chứa video
+        retention_days: Số ngày giữ lại (<= 0 hoặc None = không xóa)
+        prefix: Tiền tố tên file video
+
+    Returns:
+        Số file đã xóa
+    """
+    if not retention_days or retention_days <= 0 or not os.path.isdir(save_path):
+        return 0
+
+    cutoff = time.time() - retention_days * 86400
+    removed = 0
+    for name in os.listdir(save_path):
+        if not name.startswith(prefix):
+            continue
+        path = os.path.join(save_path, name)
+        try:
+            if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError as e:
+            print(f"⚠️  Không xóa được {path}: {e}")
+
+    if removed:
+        print(f"🗑️  Đã xóa {removed} video cũ hơn {retention_days} ngày")
+    return removed
+
+
+class StreamRecorder:
+    """Ghi stream H.264 gốc của camera ra segment MP4/TS bằng ffmpeg -c copy"""
+
+    def __init__(self, source, save_path, segment_seconds=300, segment_format='mp4',
+                 retention_days=7, check_interval=60):
+        """
+        Khởi tạo Stream Recorder
+
+        Args:
+            source: RTSP URL của camera
+            save_path: Thư mục lưu segment
+            segment_seconds: Độ dài mỗi segment (giây)
+            segment_format: 'mp4' hoặc 'ts'
+            retention_days: Xóa segment cũ hơn N ngày
+            check_interval: Chu kỳ kiểm tra process/retention (giây)
+        """
+        self.source = source
+        self.save_path = save_path
+        self.segment_seconds = segment_seconds
+        self.segment_format = segment_format if segment_format in ('mp4', 'ts') else 'mp4'
+        self.retention_days = retention_days
+        self.check_interval = check_interval
+
+        self.process = None
+        self.is_running = False
+        self.watch_thread = None
+        self._stop_event = threading.Event()
+
+    def _build_command(self):
+        """Tạo command FFMPEG stream-copy + segment"""
+        output = os.path.join(
+            self.save_path,
+            f"recording_%Y%m%d_%H%M%S.{self.segment_format}"
+        )
+
+        cmd = [
+            'ffmpeg',
+            '-hide_banner',
+            '-loglevel', 'warning',
+        ]
+        if isinstance(self.source, str) and self.source.startswith('rtsp://'):
+            cmd += ['-rtsp_transport', 'tcp']
+        cmd += [
+            '-i', self.source,
+            '-map', '0:v',  # Chỉ lấy video
+            '-c', 'copy',  # Không decode/encode
+            '-f', 'segment',
+            '-segment_time', str(self.segment_seconds),
+            '-segment_format', self.segment_format,
+            '-reset_timestamps', '1',
+            '-strftime', '1',
+        ]
+        if self.segment_format == 'mp4':
+            cmd += ['-segment_format_options', 'movflags=+faststart']
+        cmd.append(output)
+        return cmd
+
+    def _spawn(self):
+        """Chạy process FFMPEG"""
+        self.process = subprocess.Popen(
+            self._build_command(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+    def start(self):
+        """Bắt đầu ghi"""
+        if self.is_running:
+            return True
+
+        os.makedirs(self.save_path, exist_ok=True)
+        cleanup_old_recordings(self.save_path, self.retention_days)
+
+        try:
+            self._spawn()
+        except Exception as e:
+            print(f"❌ Lỗi khởi động FFMPEG recorder: {e}")
+            return False
+
+        self.is_running = True
+        self._stop_event.clear()
+        self.watch_thread = threading.Thread(target=self._watch_loop, daemon=True)
+        self.watch_thread.start()
+
+        print(f"🎥 Bắt đầu ghi (stream copy, {self.segment_seconds}s/segment): {self.save_path}")
+        return True
+
+    def _watch_loop(self):
+        """Khởi động lại FFMPEG nếu bị dừng và dọn video cũ định kỳ"""
+        while not self._stop_event.wait(self.check_interval):
+            if self.process and self.process.poll() is not None:
+                print(f"⚠️  FFMPEG recorder đã dừng (code {self.process.returncode}), khởi động lại...")
+                try:
+                    self._spawn()
+                except Exception as e:
+                    print(f"❌ Lỗi khởi động lại FFMPEG recorder: {e}")
+            cleanup_old_recordings(self.save_path, self.retention_days)
+
+    def stop(self):
+        """Dừng ghi (gửi 'q' để FFMPEG đóng segment cuối đúng chuẩn)"""
+        self.is_running = False
+        self._stop_event.set()
+        if self.watch_thread:
+            self.watch_thread.join(timeout=2)
+            self.watch_thread = None
+
+        if self.process:
+            try:
+                self.process.stdin.write(b'q')
+                self.process.stdin.flush()
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.terminate()
+                try:
+                    self.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+            self.process = None
+
+        print("🧹 Stream recorder đã dừng")
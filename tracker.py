@@ -0,0 +1,277 @@
+"""
+Tracker Module
+Theo dõi đối tượng qua nhiều frame (kiểu ByteTrack): Kalman filter + ghép IoU hai bước
+"""
+import numpy as np
+
+from box_utils import box_iou
+
+
+def xyxy_to_xyah(bbox):
+    """(x1, y1, x2, y2) -> (cx, cy, tỷ lệ w/h, h)"""
+    x1, y1, x2, y2 = bbox
+    w = max(x2 - x1, 1e-3)
+    h = max(y2 - y1, 1e-3)
+    return np.array([x1 + w / 2, y1 + h / 2, w / h, h], dtype=np.float64)
+
+
+def xyah_to_xyxy(xyah):
+    """(cx, cy, tỷ lệ w/h, h) -> (x1, y1, x2, y2)"""
+    cx, cy, a, h = xyah[:4]
+    w = a * h
+    return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], dtype=np.float32)
+
+
+class KalmanBoxFilter:
+    """Kalman filter vận tốc không đổi trên (cx, cy, a, h), giống ByteTrack/SORT"""
+
+    std_weight_position = 1.0 / 20
+    std_weight_velocity = 1.0 / 160
+
+    def __init__(self):
+        self._motion_mat = np.eye(8)
+        for i in range(4):
+            self._motion_mat[i, 4 + i] = 1.0
+        self._update_mat = np.eye(4, 8)
+
+    def initiate(self, measurement):
+        """Khởi tạo state từ measurement đầu tiên"""
+        mean = np.r_[measurement, np.zeros(4)]
+        h = measurement[3]
+        std = [
+            2 * self.std_weight_position * h,
+            2 * self.std_weight_position * h,
+            1e-2,
+            2 * self.std_weight_position * h,
+            10 * self.std_weight_velocity * h,
+            10 * self.std_weight_velocity * h,
+            1e-5,
+            10 * self.std_weight_velocity * h
+        ]
+        return mean, np.diag(np.square(std))
+
+    def predict(self, mean, covariance):
+        """Dự đoán state ở frame tiếp theo"""
+        h = mean[3]
+        std = [
+            self.std_weight_position * h,
+            self.std_weight_position * h,
+            1e-2,
+            self.std_weight_position * h,
+            self.std_weight_velocity * h,
+            self.std_weight_velocity * h,
+            1e-5,
+            self.std_weight_velocity * h
+        ]
+        motion_cov = np.diag(np.square(std))
+        mean = self._motion_mat @ mean
+        covariance = self._motion_mat @ covariance @ self._motion_mat.T + motion_cov
+        return mean, covariance
+
+    def update(self, mean, covariance, measurement):
+        """Cập nhật state với measurement mới"""
+        h = mean[3]
+        std = [
+            self.std_weight_position * h,
+            self.std_weight_position * h,
+            1e-1,
+            self.std_weight_position * h
+        ]
+        innovation_cov = (self._update_mat @ covariance @ self._update_mat.T
+                          + np.diag(np.square(std)))
+        gain = np.linalg.solve(innovation_cov, self._update_mat @ covariance).T
+        mean = mean + gain @ (measurement - self._update_mat @ mean)
+        covariance = covariance - gain @ innovation_cov @ gain.T
+        return mean, covariance
+
+
+class Track:
+    """Một đối tượng đang được theo dõi"""
+
+    TENTATIVE = 'tentative'
+    CONFIRMED = 'confirmed'
+    LOST = 'lost'
+
+    def __init__(self, track_id, bbox, confidence, cls, kalman):
+        self.track_id = track_id
+        self.kalman = kalman
+        self.mean, self.covariance = kalman.initiate(xyxy_to_xyah(bbox))
+        self.confidence = confidence
+        self.cls = cls
+        self.state = Track.TENTATIVE
+
+        self.hits = 1
+        self.age = 1
+        self.time_since_update = 0
+
+    @property
+    def bbox(self):
+        """Box hiện tại (x1, y1, x2, y2)"""
+        return xyah_to_xyxy(self.mean)
+
+    def predict(self):
+        """Dự đoán vị trí ở frame hiện tại"""
+        if self.state != Track.CONFIRMED:
+            # Track chưa ổn định/đã mất: không ngoại suy thay đổi chiều cao
+            self.mean[7] = 0
+        self.mean, self.covariance = self.kalman.predict(self.mean, self.covariance)
+        self.age += 1
+        self.time_since_update += 1
+
+    def update(self, bbox, confidence, cls):
+        """Cập nhật với detection đã ghép"""
+        self.mean, self.covariance = self.kalman.update(
+            self.mean, self.covariance, xyxy_to_xyah(bbox)
+        )
+        self.confidence = confidence
+        self.cls = cls
+        self.hits += 1
+        self.time_since_update = 0
+
+
+def greedy_match(iou_matrix, threshold):
+    """
+    Ghép track-detection theo IoU giảm dần (mỗi bên dùng tối đa một lần)
+
+    Returns:
+        (matches [(track_idx, det_idx)], unmatched_tracks, unmatched_dets)
+    """
+    num_tracks, num_dets = iou_matrix.shape
+    matches = []
+    if num_tracks and num_dets:
+        rows, cols = np.nonzero(iou_matrix >= threshold)
+        order = np.argsort(-iou_matrix[rows, cols])
+        used_tracks = set()
+        used_dets = set()
+        for r, c in zip(rows[order].tolist(), cols[order].tolist()):
+            if r in used_tracks or c in used_dets:
+                continue
+            used_tracks.add(r)
+            used_dets.add(c)
+            matches.append((r, c))
+
+    matched_tracks = {r for r, _ in matches}
+    matched_dets = {c for _, c in matches}
+    unmatched_tracks = [i for i in range(num_tracks) if i not in matched_tracks]
+    unmatched_dets = [i for i in range(num_dets) if i not in matched_dets]
+    return matches, unmatched_tracks, unmatched_dets
+
+
+class ObjectTracker:
+    """
+    Tracker kiểu ByteTrack cho một nhóm đối tượng (vd: người hoặc xe của một camera)
+
+    Bước 1: ghép track với detection confidence cao.
+    Bước 2: track còn lại ghép với detection confidence thấp (bị che khuất,
+    mờ...) để không mất ID. Detection cao không ghép được -> track mới.
+    """
+
+    def __init__(self, high_threshold=0.5, low_threshold=0.1, match_iou=0.3,
+                 low_match_iou=0.5, max_age=30, min_hits=2):
+        """
+        Args:
+            high_threshold: Ngưỡng confidence của detection "cao"
+            low_threshold: Detection dưới ngưỡng này bị bỏ qua
+            match_iou: IoU tối thiểu khi ghép với detection cao
+            low_match_iou: IoU tối thiểu khi ghép với detection thấp
+            max_age: Số frame giữ track khi không còn thấy đối tượng
+            min_hits: Số frame liên tiếp để track được xác nhận
+        """
+        self.high_threshold = high_threshold
+        self.low_threshold = low_threshold
+        self.match_iou = match_iou
+        self.low_match_iou = low_match_iou
+        self.max_age = max_age
+        self.min_hits = min_hits
+
+        self.kalman = KalmanBoxFilter()
+        self.tracks = []
+        self.next_id = 1
+        self.frame_count = 0
+
+        # ID các track bị xóa ở lần update gần nhất (để dọn state theo track)
+        self.removed_ids = []
+
+    def update(self, boxes, confidences, classes):
+        """
+        Cập nhật tracker với detections của frame mới
+
+        Args:
+            boxes: Array (N, 4) x1, y1, x2, y2
+            confidences: Array (N,)
+            classes: Array (N,)
+
+        Returns:
+            (track_ids, new_flags) - array (N,): track ID của từng detection
+            (-1 nếu không thuộc track nào) và True nếu track vừa được xác nhận
+        """
+        self.frame_count += 1
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        confidences = np.asarray(confidences, dtype=np.float32)
+        classes = np.asarray(classes)
+
+        track_ids = np.full(len(boxes), -1, dtype=np.int64)
+        new_flags = np.zeros(len(boxes), dtype=bool)
+
+        for track in self.tracks:
+            track.predict()
+
+        high_idx = np.where(confidences >= self.high_threshold)[0]
+        low_idx = np.where((confidences >= self.low_threshold) & (confidences < self.high_threshold))[0]
+
+        # Bước 1: mọi track vs detection cao
+        track_boxes = np.array([t.bbox for t in self.tracks], dtype=np.float32).reshape(-1, 4)
+        matches, unmatched_tracks, unmatched_high = greedy_match(
+            box_iou(track_boxes, boxes[high_idx]), self.match_iou
+        )
+        for t, d in matches:
+            self._assign(self.tracks[t], high_idx[d], boxes, confidences, classes, track_ids, new_flags)
+
+        # Bước 2: track đã xác nhận còn lại vs detection thấp
+        remaining = [t for t in unmatched_tracks if self.tracks[t].state != Track.TENTATIVE]
+        matches_low, _, _ = greedy_match(
+            box_iou(track_boxes[remaining], boxes[low_idx]), self.low_match_iou
+        )
+        for t, d in matches_low:
+            self._assign(self.tracks[remaining[t]], low_idx[d], boxes, confidences, classes,
+                         track_ids, new_flags)
+
+        # Track không được ghép -> mất dấu
+        for track in self.tracks:
+            if track.time_since_update > 0 and track.state == Track.CONFIRMED:
+                track.state = Track.LOST
+
+        # Detection cao không ghép được -> track mới
+        for d in unmatched_high:
+            det = high_idx[d]
+            track = Track(self.next_id, boxes[det], float(confidences[det]), classes[det], self.kalman)
+            self.next_id += 1
+            # Frame đầu tiên của tracker: xác nhận ngay
+            if self.min_hits <= 1 or self.frame_count == 1:
+                track.state = Track.CONFIRMED
+                new_flags[det] = True
+            self.tracks.append(track)
+            track_ids[det] = track.track_id
+
+        # Xóa track quá cũ (track tentative mất ngay khi không ghép được)
+        kept = []
+        self.removed_ids = []
+        for track in self.tracks:
+            expired = (track.time_since_update > self.max_age
+                       or (track.state == Track.TENTATIVE and track.time_since_update > 0))
+            if expired:
+                self.removed_ids.append(track.track_id)
+            else:
+                kept.append(track)
+        self.tracks = kept
+
+        return track_ids, new_flags
+
+    def _assign(self, track, det, boxes, confidences, classes, track_ids, new_flags):
+        """Cập nhật track với detection và đánh dấu kết quả"""
+        track.update(boxes[det], float(confidences[det]), classes[det])
+        if track.state != Track.CONFIRMED and track.hits >= self.min_hits:
+            if track.state == Track.TENTATIVE:
+                new_flags[det] = True
+            track.state = Track.CONFIRMED
+        track_ids[det] = track.track_id